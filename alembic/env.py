@@ -8,7 +8,7 @@ from sqlalchemy import pool
 # Подключаем app
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.config import engine, Base
+from app.config import engines, Base
 from app import models  # Важно для обнаружения всех моделей при autogenerate
 
 # Alembic Config
@@ -36,14 +36,18 @@ def run_migrations_offline() -> None:
 
 
 def run_migrations_online() -> None:
-    """Миграции в онлайн-режиме (с реальным подключением к БД)."""
-    with engine.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-        )
-        with context.begin_transaction():
-            context.run_migrations()
+    """Миграции в онлайн-режиме (с реальным подключением к БД).
+
+    При шардировании миграции применяются к каждому шарду по очереди.
+    """
+    for engine in engines:
+        with engine.connect() as connection:
+            context.configure(
+                connection=connection,
+                target_metadata=target_metadata,
+            )
+            with context.begin_transaction():
+                context.run_migrations()
 
 
 if context.is_offline_mode():
@@ -0,0 +1,39 @@
+"""add due_at and remind_at to tasks
+
+Revision ID: 7c2f4a9e1b63
+Revises: 5b7e1d2c9a40
+Create Date: 2026-10-19 15:21:07.402316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2f4a9e1b63'
+down_revision: Union[str, Sequence[str], None] = '5b7e1d2c9a40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('due_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('tasks', sa.Column('remind_at', sa.DateTime(timezone=True), nullable=True))
+    # Ближайшие напоминания: планировщик читает диапазон по времени, а не всю таблицу
+    op.create_index(
+        'ix_tasks_remind_at', 'tasks', ['remind_at'], unique=False,
+        sqlite_where=sa.text('remind_at IS NOT NULL AND deleted_at IS NULL'),
+        postgresql_where=sa.text('remind_at IS NOT NULL AND deleted_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_remind_at', table_name='tasks')
+    # Без batch_alter_table: пересборка таблицы потеряла бы выражения и частичные
+    # индексы (ix_tasks_done_at и др.). SQLite удаляет колонку сам с версии 3.35
+    op.drop_column('tasks', 'remind_at')
+    op.drop_column('tasks', 'due_at')
@@ -0,0 +1,43 @@
+"""add deleted_at to tasks
+
+Revision ID: 992c6309e8c2
+Revises: bbacfff63bdc
+Create Date: 2026-10-19 10:12:40.118532
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '992c6309e8c2'
+down_revision: Union[str, Sequence[str], None] = 'bbacfff63bdc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    # Частичные индексы: активные задачи пользователя и корзина
+    op.create_index(
+        'ix_tasks_user_id_active', 'tasks', ['user_id'], unique=False,
+        sqlite_where=sa.text('deleted_at IS NULL'),
+        postgresql_where=sa.text('deleted_at IS NULL')
+    )
+    op.create_index(
+        'ix_tasks_deleted_at', 'tasks', ['deleted_at'], unique=False,
+        sqlite_where=sa.text('deleted_at IS NOT NULL'),
+        postgresql_where=sa.text('deleted_at IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_deleted_at', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_active', table_name='tasks')
+    op.execute('DELETE FROM tasks WHERE deleted_at IS NOT NULL')
+    with op.batch_alter_table("tasks", schema=None) as batch_op:
+        batch_op.drop_column('deleted_at')
@@ -0,0 +1,41 @@
+"""create change outbox table
+
+Revision ID: a6d4e9f1c352
+Revises: f3a9c6d20b71
+Create Date: 2026-10-20 10:12:44.208913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d4e9f1c352'
+down_revision: Union[str, Sequence[str], None] = 'f3a9c6d20b71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Изменения задач для других процессов (app/event_relay.py)
+    op.create_table('change_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('origin', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('task', sa.Text(), nullable=False),
+    sa.Column('ts', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    op.create_index(op.f('ix_change_outbox_created_at'), 'change_outbox', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_change_outbox_created_at'), table_name='change_outbox')
+    op.drop_table('change_outbox')
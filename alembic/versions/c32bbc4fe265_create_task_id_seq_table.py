@@ -0,0 +1,33 @@
+"""create task_id_seq table
+
+Revision ID: c32bbc4fe265
+Revises: 992c6309e8c2
+Create Date: 2026-10-19 11:03:27.640215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c32bbc4fe265'
+down_revision: Union[str, Sequence[str], None] = '992c6309e8c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Счетчик локальных номеров задач для глобальных ID при шардировании
+    op.create_table('task_id_seq',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('task_id_seq')
@@ -0,0 +1,67 @@
+"""add position to tasks
+
+Revision ID: c5e8b2d17f94
+Revises: a41d83f0c2e7
+Create Date: 2026-10-19 17:55:31.284417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.online_migration import backfill
+from app.ordering import key_between
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e8b2d17f94'
+down_revision: Union[str, Sequence[str], None] = 'a41d83f0c2e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tasks', sa.Column('position', sa.String(), nullable=True))
+
+    # Текущий порядок списков - порядок добавления задач. Заполнение идет короткими
+    # транзакциями по возрастанию id, чтобы не блокировать tasks на все время
+    last_keys: dict = {}
+
+    def positions(rows):
+        params = []
+        for task_id, user_id in rows:
+            key = key_between(last_keys.get(user_id), None)
+            last_keys[user_id] = key
+            params.append({'task_id': task_id, 'key': key})
+        return params
+
+    with op.get_context().autocommit_block():
+        backfill(
+            op.get_bind(), 'tasks', ['user_id'],
+            update_sql='UPDATE tasks SET position = :key WHERE id = :task_id',
+            compute=positions, chunk_size=BACKFILL_BATCH_SIZE,
+        )
+
+    op.create_index(
+        'ix_tasks_user_id_position', 'tasks', ['user_id', 'position'], unique=False,
+        sqlite_where=sa.text('deleted_at IS NULL'),
+        postgresql_where=sa.text('deleted_at IS NULL')
+    )
+    op.create_index(
+        'ix_tasks_long_position', 'tasks', ['user_id'], unique=False,
+        sqlite_where=sa.text('length(position) > 12 AND deleted_at IS NULL'),
+        postgresql_where=sa.text('length(position) > 12 AND deleted_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_long_position', table_name='tasks')
+    op.drop_index('ix_tasks_user_id_position', table_name='tasks')
+    # Без batch_alter_table: пересборка таблицы потеряла бы выражения и частичные
+    # индексы (ix_tasks_done_at и др.). SQLite удаляет колонку сам с версии 3.35
+    op.drop_column('tasks', 'position')
@@ -0,0 +1,76 @@
+"""make task ids autoincrement
+
+Revision ID: c8f2a7d4e915
+Revises: b9e3f5a27d14
+Create Date: 2026-10-20 14:21:09.318245
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.online_migration import OnlineTableRebuild
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f2a7d4e915'
+down_revision: Union[str, Sequence[str], None] = 'b9e3f5a27d14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TASKS_SQL = (
+    "CREATE TABLE {table} ("
+    "id INTEGER NOT NULL PRIMARY KEY%s, "
+    "title VARCHAR NOT NULL, "
+    "done BOOLEAN, "
+    "user_id INTEGER, "
+    "created_at DATETIME DEFAULT (CURRENT_TIMESTAMP), "
+    "updated_at DATETIME, "
+    "done_by VARCHAR, "
+    "deleted_at DATETIME, "
+    "due_at DATETIME, "
+    "remind_at DATETIME, "
+    "position VARCHAR)"
+)
+TASK_COLUMNS = [
+    'id', 'title', 'done', 'user_id', 'created_at', 'updated_at',
+    'done_by', 'deleted_at', 'due_at', 'remind_at', 'position',
+]
+
+
+def _rebuild_tasks(autoincrement: bool):
+    OnlineTableRebuild(
+        op.get_bind(), 'tasks',
+        create_sql=TASKS_SQL % (' AUTOINCREMENT' if autoincrement else ''),
+        columns={column: column for column in TASK_COLUMNS},
+    ).run()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Без AUTOINCREMENT SQLite выдает max(id) + 1, и ID удаленной или перенесенной в архив
+    # задачи получает новая задача - вместе с чужой историей и конфликтом в tasks_archive.
+    # В PostgreSQL номера выдает последовательность и не повторяет их.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    with op.get_context().autocommit_block():
+        _rebuild_tasks(autoincrement=True)
+        # Номера, уже занятые архивом и историей, тоже не выдаются
+        op.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'tasks'"))
+        op.execute(sa.text(
+            "INSERT INTO sqlite_sequence (name, seq) SELECT 'tasks', max("
+            "(SELECT coalesce(max(id), 0) FROM tasks), "
+            "(SELECT coalesce(max(id), 0) FROM tasks_archive), "
+            "(SELECT coalesce(max(task_id), 0) FROM task_events))"
+        ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    with op.get_context().autocommit_block():
+        _rebuild_tasks(autoincrement=False)
@@ -0,0 +1,47 @@
+"""create tasks_archive table
+
+Revision ID: de6f16adb222
+Revises: c32bbc4fe265
+Create Date: 2026-10-19 12:21:05.493170
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'de6f16adb222'
+down_revision: Union[str, Sequence[str], None] = 'c32bbc4fe265'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tasks_archive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('done', sa.Boolean(), nullable=True),
+    sa.Column('done_by', sa.String(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tasks_archive_user_id_archived_at', 'tasks_archive', ['user_id', 'archived_at'], unique=False)
+    # Поиск кандидатов в архив: выполненные активные задачи по времени выполнения
+    op.create_index(
+        'ix_tasks_done_at', 'tasks', [sa.text('coalesce(updated_at, created_at)')], unique=False,
+        sqlite_where=sa.text('done = 1 AND deleted_at IS NULL'),
+        postgresql_where=sa.text('done AND deleted_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tasks_done_at', table_name='tasks')
+    op.drop_index('ix_tasks_archive_user_id_archived_at', table_name='tasks_archive')
+    op.drop_table('tasks_archive')
@@ -0,0 +1,74 @@
+"""create task stats tables
+
+Revision ID: e2b7f41c8d06
+Revises: c5e8b2d17f94
+Create Date: 2026-10-19 21:12:47.305118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7f41c8d06'
+down_revision: Union[str, Sequence[str], None] = 'c5e8b2d17f94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('task_daily_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('reopened', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'user_id')
+    )
+    op.create_index('ix_task_daily_stats_user_id_day', 'task_daily_stats', ['user_id', 'day'], unique=False)
+    op.create_table('task_completer_stats',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('done_by', sa.String(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'done_by')
+    )
+
+    # Сводки по существующим задачам: выполнение - по времени последнего изменения
+    op.execute("""
+        INSERT INTO task_daily_stats (day, user_id, created, completed, reopened)
+        SELECT day, user_id, sum(created), sum(completed), 0 FROM (
+            SELECT date(created_at) AS day, user_id, 1 AS created, 0 AS completed
+            FROM tasks WHERE created_at IS NOT NULL AND user_id IS NOT NULL
+            UNION ALL
+            SELECT date(coalesce(updated_at, created_at)), user_id, 0, 1
+            FROM tasks WHERE done = TRUE AND created_at IS NOT NULL AND user_id IS NOT NULL
+            UNION ALL
+            SELECT date(created_at), user_id, 1, 0
+            FROM tasks_archive WHERE created_at IS NOT NULL AND user_id IS NOT NULL
+            UNION ALL
+            SELECT date(coalesce(updated_at, created_at)), user_id, 0, 1
+            FROM tasks_archive WHERE done = TRUE AND created_at IS NOT NULL AND user_id IS NOT NULL
+        ) AS events
+        GROUP BY day, user_id
+    """)
+    op.execute("""
+        INSERT INTO task_completer_stats (day, done_by, completed)
+        SELECT day, done_by, count(*) FROM (
+            SELECT date(coalesce(updated_at, created_at)) AS day, done_by
+            FROM tasks WHERE done = TRUE AND done_by IS NOT NULL AND created_at IS NOT NULL
+            UNION ALL
+            SELECT date(coalesce(updated_at, created_at)), done_by
+            FROM tasks_archive WHERE done = TRUE AND done_by IS NOT NULL AND created_at IS NOT NULL
+        ) AS events
+        GROUP BY day, done_by
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('task_completer_stats')
+    op.drop_index('ix_task_daily_stats_user_id_day', table_name='task_daily_stats')
+    op.drop_table('task_daily_stats')
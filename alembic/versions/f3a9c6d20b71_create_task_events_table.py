@@ -0,0 +1,38 @@
+"""create task events table
+
+Revision ID: f3a9c6d20b71
+Revises: e2b7f41c8d06
+Create Date: 2026-10-19 22:31:05.617342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c6d20b71'
+down_revision: Union[str, Sequence[str], None] = 'e2b7f41c8d06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('task_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('changes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_events_task_id_id', 'task_events', ['task_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_task_events_task_id_id', table_name='task_events')
+    op.drop_table('task_events')
@@ -0,0 +1,132 @@
+"""Сводки по выполнению задач: дневные таблицы task_daily_stats и task_completer_stats.
+
+Сводки обновляются в той же транзакции, что и задача (создание, выполнение,
+повторное открытие), поэтому отчеты читают только их, а не таблицу tasks.
+Учитываются события: удаление задачи или перенос в архив сводок не меняют.
+Дни - по UTC. При шардировании строки сводок лежат в шарде пользователя,
+отчеты суммируют результаты шардов.
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+from typing import Iterable, Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from .config import engine, shard_router
+from .models import TaskCompleterStats, TaskDailyStats
+
+CREATED = "created"
+COMPLETED = "completed"
+REOPENED = "reopened"
+
+upsert = postgresql_insert if engine.dialect.name == "postgresql" else sqlite_insert
+
+
+def statements(events: Iterable[tuple[int, str, Optional[str]]], day: Optional[date] = None) -> list[tuple]:
+    """Upsert-запросы (запрос, строки) сводок для событий (user_id, событие, done_by) одной базы"""
+    day = day or datetime.now(timezone.utc).date()
+    daily: dict[int, Counter] = defaultdict(Counter)
+    completers: Counter = Counter()
+    for user_id, event, done_by in events:
+        daily[user_id][event] += 1
+        if event == COMPLETED and done_by is not None:
+            completers[done_by] += 1
+
+    result = []
+    if daily:
+        # Запросы к таблице, а не к модели: ORM не поддерживает пакетную вставку в шардированной сессии
+        table = TaskDailyStats.__table__
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day", "user_id"],
+            set_={column: table.c[column] + stmt.excluded[column] for column in (CREATED, COMPLETED, REOPENED)}
+        )
+        result.append((stmt, [
+            {"day": day, "user_id": user_id,
+             CREATED: counts[CREATED], COMPLETED: counts[COMPLETED], REOPENED: counts[REOPENED]}
+            for user_id, counts in daily.items()
+        ]))
+    if completers:
+        table = TaskCompleterStats.__table__
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["day", "done_by"],
+            set_={COMPLETED: table.c.completed + stmt.excluded.completed}
+        )
+        result.append((stmt, [{"day": day, "done_by": done_by, COMPLETED: count}
+                              for done_by, count in completers.items()]))
+    return result
+
+
+def record(db: Session, events: Iterable[tuple[Optional[int], str, Optional[str]]]):
+    """Учитывает события (user_id, событие, done_by) в сводках; фиксирует вызывающий код"""
+    by_shard: dict[Optional[str], list] = defaultdict(list)
+    for event in events:
+        if event[0] is not None:
+            by_shard[shard_router.shard_for_user(event[0]) if shard_router else None].append(event)
+    for shard_id, shard_events in by_shard.items():
+        for stmt, rows in statements(shard_events):
+            db.execute(stmt, rows, bind_arguments={"shard_id": shard_id} if shard_id else None)
+
+
+def _rate(created: int, completed: int) -> Optional[float]:
+    return round(completed / created, 3) if created else None
+
+
+def get_daily(db: Session, since: date, until: date, user_id: Optional[int] = None) -> list[dict]:
+    """Сводка по дням (всех пользователей или одного)"""
+    query = (
+        select(TaskDailyStats.day, func.sum(TaskDailyStats.created),
+               func.sum(TaskDailyStats.completed), func.sum(TaskDailyStats.reopened))
+        .where(TaskDailyStats.day >= since, TaskDailyStats.day <= until)
+        .group_by(TaskDailyStats.day)
+    )
+    if user_id is not None:
+        query = query.where(TaskDailyStats.user_id == user_id)
+
+    # Каждый шард возвращает свои суммы по дням: складываем их
+    totals: dict[date, list[int]] = defaultdict(lambda: [0, 0, 0])
+    for day, created, completed, reopened in db.execute(query):
+        row = totals[day]
+        row[0] += created
+        row[1] += completed
+        row[2] += reopened
+    return [
+        {"day": day, "created": created, "completed": completed, "reopened": reopened,
+         "completion_rate": _rate(created, completed)}
+        for day, (created, completed, reopened) in sorted(totals.items())
+    ]
+
+
+def get_top_users(db: Session, since: date, until: date, limit: int) -> list[dict]:
+    """Пользователи с наибольшим числом выполненных задач за период"""
+    query = (
+        select(TaskDailyStats.user_id, func.sum(TaskDailyStats.created), func.sum(TaskDailyStats.completed))
+        .where(TaskDailyStats.day >= since, TaskDailyStats.day <= until)
+        .group_by(TaskDailyStats.user_id)
+        .order_by(func.sum(TaskDailyStats.completed).desc(), TaskDailyStats.user_id)
+        .limit(limit)
+    )
+    # Пользователь лежит в одном шарде: достаточно объединить топы шардов и отрезать заново
+    rows = sorted(db.execute(query).all(), key=lambda row: (-row[2], row[0]))[:limit]
+    return [
+        {"user_id": user_id, "created": created, "completed": completed,
+         "completion_rate": _rate(created, completed)}
+        for user_id, created, completed in rows
+    ]
+
+
+def get_completers(db: Session, since: date, until: date, limit: int) -> list[dict]:
+    """Кто выполняет задачи (done_by) за период, по убыванию числа выполненных"""
+    query = (
+        select(TaskCompleterStats.done_by, func.sum(TaskCompleterStats.completed))
+        .where(TaskCompleterStats.day >= since, TaskCompleterStats.day <= until)
+        .group_by(TaskCompleterStats.done_by)
+    )
+    # done_by встречается в разных шардах: суммируем полные группы, топ - после слияния
+    totals: Counter = Counter()
+    for done_by, completed in db.execute(query):
+        totals[done_by] += completed
+    rows = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{"done_by": done_by, "completed": completed} for done_by, completed in rows]
@@ -0,0 +1,45 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from . import crud, leases
+from .config import SessionLocal, get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+# Сколько конфликтующих ID показывать в логе
+CONFLICTS_LOG_LIMIT = 20
+
+
+def archive_done_tasks() -> int:
+    """Переносит старые выполненные задачи в архив пачками с паузами между ними"""
+    done_before = datetime.now(timezone.utc) - timedelta(days=settings.archive_after_days)
+    total = 0
+    while True:
+        with SessionLocal() as db:
+            archived = crud.archive_done_tasks(db, done_before, settings.archive_batch_size)
+        total += archived
+        if archived < settings.archive_batch_size:
+            break
+        time.sleep(settings.archive_batch_pause)
+
+    with SessionLocal() as db:
+        conflicts = crud.get_archive_conflicts(db, done_before, CONFLICTS_LOG_LIMIT)
+    if conflicts:
+        logger.warning("Задачи не перенесены в архив: ID уже заняты в tasks_archive: %s", conflicts)
+    return total
+
+
+async def run_archiving():
+    """Фоновый перенос выполненных задач в архив"""
+    while True:
+        await asyncio.sleep(settings.archive_interval_minutes * 60)
+        try:
+            archived = await leases.run_exclusive("archiving", archive_done_tasks)
+            if archived:
+                logger.info("В архив перенесено задач: %d", archived)
+        except Exception:
+            logger.exception("Ошибка переноса задач в архив")
@@ -0,0 +1,287 @@
+"""Резервные копии SQLite-баз без остановки бота и API.
+
+Снимок снимается online backup API небольшими шагами по backup_step_pages
+страниц с паузой между шагами, поэтому писатели не ждут окончания копирования.
+Снимки образуют цепочки: первый - полная копия базы (обычный файл SQLite),
+следующие хранят только страницы, изменившиеся с предыдущего снимка (сравнение
+по хешам страниц). Каждые backup_full_every снимков начинается новая цепочка,
+хранятся последние backup_keep_chains цепочек.
+
+Восстановление собирает базу из полной копии и изменений до выбранного снимка,
+сверяет SHA-256 с записанным при снятии и проверяет PRAGMA integrity_check;
+только после этого файл заменяет целевой.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import struct
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import Engine
+from . import leases
+from .config import engines, get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+MANIFEST = "manifest.json"
+KIND_FULL = "full"
+KIND_DELTA = "delta"
+DELTA_MAGIC = b"TDDELTA1"
+DELTA_HEADER = struct.Struct(">8sIII")  # магия, размер страницы, страниц в базе, изменено страниц
+PAGE_NUMBER = struct.Struct(">I")
+DIGEST_SIZE = 16
+
+
+class BackupError(Exception):
+    """Снимок не найден или не прошел проверку"""
+
+
+def sqlite_path(engine: Engine) -> Optional[str]:
+    """Путь к файлу базы; None - не SQLite или база в памяти"""
+    if engine.dialect.name != "sqlite" or engine.url.database in (None, "", ":memory:"):
+        return None
+    return os.path.abspath(engine.url.database)
+
+
+def backup_dir_for(db_path: str, root: str) -> str:
+    return os.path.join(root, os.path.splitext(os.path.basename(db_path))[0])
+
+
+def load_manifest(backup_dir: str) -> list[dict]:
+    path = os.path.join(backup_dir, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_manifest(backup_dir: str, snapshots: list[dict]):
+    path = os.path.join(backup_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshots, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _online_copy(source_path: str, target_path: str):
+    """Копия базы шагами по backup_step_pages страниц; между шагами база свободна для записи"""
+    last_remaining, restarts = None, 0
+
+    def pause(status, remaining, total):
+        nonlocal last_remaining, restarts
+        # Запись в базу между шагами начинает копирование заново (или шаг ждал блокировку)
+        if last_remaining is not None and remaining >= last_remaining:
+            restarts += 1
+            if restarts > settings.backup_max_restarts:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        time.sleep(settings.backup_step_pause)
+
+    source = sqlite3.connect(source_path, isolation_level=None)
+    target = sqlite3.connect(target_path)
+    try:
+        if source.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            # Открытая транзакция чтения фиксирует снимок базы: копирование не начинается
+            # заново, а писатели в режиме WAL ее не ждут
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        try:
+            source.backup(target, pages=settings.backup_step_pages, progress=pause)
+        except _TooManyRestarts:
+            # Без WAL при постоянной записи шаги не успевают: копируем за один шаг,
+            # писатели ждут только время копирования
+            logger.warning("Снимок %s перезапускался %d раз, копирование одним шагом", source_path, restarts)
+            source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _scan(path: str) -> tuple[int, list[bytes], str]:
+    """Размер страницы, хеши страниц и SHA-256 файла базы"""
+    # with sqlite3.connect() только завершает транзакцию, соединение закрывает closing
+    with closing(sqlite3.connect(path)) as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    digests = []
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        while page := f.read(page_size):
+            digests.append(hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest())
+            file_hash.update(page)
+    return page_size, digests, file_hash.hexdigest()
+
+
+def _read_digests(path: str) -> list[bytes]:
+    with open(path, "rb") as f:
+        data = f.read()
+    return [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)]
+
+
+def _write_delta(image_path: str, delta_path: str, page_size: int, pages: list[int], page_count: int):
+    with open(image_path, "rb") as image, open(delta_path, "wb") as delta:
+        delta.write(DELTA_HEADER.pack(DELTA_MAGIC, page_size, page_count, len(pages)))
+        for page_no in pages:
+            image.seek(page_no * page_size)
+            delta.write(PAGE_NUMBER.pack(page_no))
+            delta.write(image.read(page_size))
+        delta.flush()
+        os.fsync(delta.fileno())
+
+
+def _apply_delta(image_path: str, delta_path: str):
+    with open(delta_path, "rb") as delta, open(image_path, "r+b") as image:
+        magic, page_size, page_count, changed = DELTA_HEADER.unpack(delta.read(DELTA_HEADER.size))
+        if magic != DELTA_MAGIC:
+            raise BackupError(f"Поврежденный файл изменений: {delta_path}")
+        for _ in range(changed):
+            (page_no,) = PAGE_NUMBER.unpack(delta.read(PAGE_NUMBER.size))
+            page = delta.read(page_size)
+            if len(page) != page_size:
+                raise BackupError(f"Обрезанный файл изменений: {delta_path}")
+            image.seek(page_no * page_size)
+            image.write(page)
+        image.truncate(page_count * page_size)
+
+
+def snapshot(db_path: str, root: str) -> dict:
+    """Снимает снимок базы: полный или только изменившиеся страницы"""
+    backup_dir = backup_dir_for(db_path, root)
+    os.makedirs(backup_dir, exist_ok=True)
+    snapshots = load_manifest(backup_dir)
+    created_at = datetime.now(timezone.utc)
+    name = created_at.strftime("%Y%m%dT%H%M%S%fZ")
+    staging = os.path.join(backup_dir, name + ".tmp")
+
+    started = time.monotonic()
+    try:
+        _online_copy(db_path, staging)
+        page_size, digests, sha256 = _scan(staging)
+    except BaseException:
+        if os.path.exists(staging):
+            os.remove(staging)
+        raise
+
+    last = snapshots[-1] if snapshots else None
+    chain_length = sum(1 for s in snapshots if last and s["base"] == last["base"])
+    previous_digests = None
+    if last and chain_length < settings.backup_full_every and last["page_size"] == page_size:
+        hashes_path = os.path.join(backup_dir, last["name"] + ".hashes")
+        if os.path.exists(hashes_path):
+            previous_digests = _read_digests(hashes_path)
+
+    if previous_digests is None:
+        kind, base, file_name = KIND_FULL, name, name + ".db"
+        changed = len(digests)
+        os.replace(staging, os.path.join(backup_dir, file_name))
+    else:
+        kind, base, file_name = KIND_DELTA, last["base"], name + ".delta"
+        pages = [
+            page_no for page_no, digest in enumerate(digests)
+            if page_no >= len(previous_digests) or previous_digests[page_no] != digest
+        ]
+        changed = len(pages)
+        _write_delta(staging, os.path.join(backup_dir, file_name), page_size, pages, len(digests))
+        os.remove(staging)
+
+    with open(os.path.join(backup_dir, name + ".hashes"), "wb") as f:
+        f.write(b"".join(digests))
+
+    entry = {
+        "name": name, "kind": kind, "base": base, "file": file_name,
+        "created_at": created_at.isoformat(), "page_size": page_size,
+        "page_count": len(digests), "changed_pages": changed, "sha256": sha256,
+    }
+    snapshots, expired = _split_expired(snapshots + [entry])
+    _save_manifest(backup_dir, snapshots)
+
+    # Файлы удаляются после записи манифеста: он не ссылается на отсутствующие снимки
+    for s in expired:
+        path = os.path.join(backup_dir, s["file"])
+        if os.path.exists(path):
+            os.remove(path)
+    # Хеши нужны только последнему снимку - с ним сравнивается следующий
+    for file_name in os.listdir(backup_dir):
+        if file_name.endswith(".hashes") and file_name != name + ".hashes":
+            os.remove(os.path.join(backup_dir, file_name))
+
+    logger.info(
+        "Снимок %s базы %s (%s): %d из %d страниц за %.1f с",
+        name, db_path, kind, changed, len(digests), time.monotonic() - started
+    )
+    return entry
+
+
+def _split_expired(snapshots: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Снимки последних backup_keep_chains цепочек и устаревшие"""
+    bases = list(dict.fromkeys(s["base"] for s in snapshots))
+    expired = set(bases[:-settings.backup_keep_chains]) if settings.backup_keep_chains > 0 else set()
+    return [s for s in snapshots if s["base"] not in expired], [s for s in snapshots if s["base"] in expired]
+
+
+def restore(backup_dir: str, name: str, target_path: str):
+    """Собирает базу на момент снимка name, проверяет ее и заменяет target_path"""
+    snapshots = load_manifest(backup_dir)
+    entry = next((s for s in snapshots if s["name"] == name), None)
+    if entry is None:
+        raise BackupError(f"Снимок {name} не найден в {backup_dir}")
+    chain = [s for s in snapshots if s["base"] == entry["base"] and s["name"] <= name]
+
+    image = target_path + ".restore"
+    try:
+        shutil.copyfile(os.path.join(backup_dir, chain[0]["file"]), image)
+        for delta in chain[1:]:
+            _apply_delta(image, os.path.join(backup_dir, delta["file"]))
+
+        _, _, sha256 = _scan(image)
+        if sha256 != entry["sha256"]:
+            raise BackupError(f"Контрольная сумма снимка {name} не совпадает")
+        # Соединение закрывается до замены файла: иначе рядом остаются image-wal и image-shm
+        with closing(sqlite3.connect(image)) as conn:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise BackupError(f"Снимок {name} не прошел integrity_check: {result}")
+
+        # Журнал от старой базы применился бы к восстановленной
+        for suffix in ("-journal", "-wal", "-shm"):
+            if os.path.exists(target_path + suffix):
+                os.remove(target_path + suffix)
+        os.replace(image, target_path)
+    finally:
+        for path in (image, image + "-journal", image + "-wal", image + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def backup_all(root: str) -> list[dict]:
+    """Снимки всех SQLite-баз приложения (шардов) в каталог root"""
+    entries = []
+    for engine in engines:
+        path = sqlite_path(engine)
+        if path is None:
+            logger.warning("Резервное копирование пропущено для %s: поддерживается только SQLite", engine.url)
+            continue
+        entries.append(snapshot(path, root))
+    return entries
+
+
+async def run_backups():
+    """Фоновые снимки баз раз в backup_interval_minutes"""
+    while True:
+        await asyncio.sleep(settings.backup_interval_minutes * 60)
+        try:
+            await leases.run_exclusive("backups", lambda: backup_all(settings.backup_dir))
+        except Exception:
+            logger.exception("Ошибка резервного копирования")
@@ -0,0 +1,138 @@
+"""Контрольные точки рассылок (таблица broadcasts).
+
+Строка (kind, key) одна на рассылку и служит арендой: ее ведет процесс-владелец,
+пока обновляет updated_at. Прогресс сохраняется после каждой пачки пользователей;
+если владелец пропал дольше чем на BROADCAST_LEASE_SECONDS, рассылку перехватывает
+другой процесс (или тот же после перезапуска) и продолжает с last_user_id.
+"""
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from .config import engine, get_settings
+from .crud import as_utc
+from .models import Broadcast
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+
+
+class BroadcastLeaseLost(Exception):
+    """Рассылку перехватил другой процесс"""
+
+
+def get_broadcast(broadcast_id: int) -> Optional[dict]:
+    with engine.connect() as conn:
+        row = conn.execute(select(Broadcast).where(Broadcast.id == broadcast_id)).mappings().first()
+    return dict(row) if row else None
+
+
+def find_broadcast(kind: str, key: str) -> Optional[dict]:
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(Broadcast).where(Broadcast.kind == kind, Broadcast.key == key)
+        ).mappings().first()
+    return dict(row) if row else None
+
+
+def list_broadcasts(limit: int) -> list[dict]:
+    """Последние рассылки, сначала новые"""
+    with engine.connect() as conn:
+        rows = conn.execute(select(Broadcast).order_by(Broadcast.id.desc()).limit(limit)).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def claim(kind: str, key: str) -> Optional[dict]:
+    """Создает рассылку или перехватывает брошенную; None - завершена или ее ведет другой процесс"""
+    now = datetime.now(timezone.utc)
+    owner = f"{os.getpid()}-{os.urandom(4).hex()}"
+    existing = find_broadcast(kind, key)
+
+    with engine.begin() as conn:
+        if existing is None:
+            try:
+                conn.execute(insert(Broadcast).values(
+                    kind=kind, key=key, status=STATUS_RUNNING, owner=owner,
+                    total=0, processed=0, sent=0, failed=0, started_at=now, updated_at=now
+                ))
+            except IntegrityError:
+                return None
+        else:
+            stale_before = now - timedelta(seconds=settings.broadcast_lease_seconds)
+            if existing["status"] == STATUS_DONE or as_utc(existing["updated_at"]) > stale_before:
+                return None
+            # Перехват: только если никто не успел раньше
+            taken = conn.execute(
+                update(Broadcast)
+                .where(Broadcast.id == existing["id"], Broadcast.owner == existing["owner"],
+                       Broadcast.updated_at == existing["updated_at"])
+                .values(owner=owner, updated_at=now)
+            ).rowcount
+            if not taken:
+                return None
+            logger.warning("Рассылка %s %s продолжается с пользователя %s", kind, key, existing["last_user_id"])
+
+    return find_broadcast(kind, key)
+
+
+def _update_owned(broadcast: dict, **values):
+    with engine.begin() as conn:
+        updated = conn.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast["id"], Broadcast.owner == broadcast["owner"])
+            .values(updated_at=datetime.now(timezone.utc), **values)
+        ).rowcount
+    if not updated:
+        raise BroadcastLeaseLost(broadcast["id"])
+
+
+def set_total(broadcast: dict, total: int):
+    _update_owned(broadcast, total=total)
+
+
+def save_progress(broadcast: dict, last_user_id: int, processed: int, sent: int, failed: int):
+    """Контрольная точка после пачки; продлевает аренду"""
+    _update_owned(
+        broadcast,
+        last_user_id=last_user_id,
+        processed=Broadcast.processed + processed,
+        sent=Broadcast.sent + sent,
+        failed=Broadcast.failed + failed
+    )
+
+
+def finish(broadcast: dict):
+    _update_owned(broadcast, status=STATUS_DONE, finished_at=datetime.now(timezone.utc))
+
+
+def progress(broadcast: dict) -> dict:
+    """Состояние рассылки со скоростью и оценкой оставшегося времени"""
+    started_at = as_utc(broadcast["started_at"])
+    updated_at = as_utc(broadcast["updated_at"])
+    finished_at = as_utc(broadcast["finished_at"])
+    total, processed = broadcast["total"], broadcast["processed"]
+
+    elapsed = ((finished_at or updated_at) - started_at).total_seconds()
+    rate = processed / elapsed if elapsed > 0 else None
+    if broadcast["status"] == STATUS_DONE:
+        eta = 0.0
+    elif rate:
+        eta = max(total - processed, 0) / rate
+    else:
+        eta = None
+
+    return {
+        **{key: value for key, value in broadcast.items() if key != "owner"},
+        "started_at": started_at,
+        "updated_at": updated_at,
+        "finished_at": finished_at,
+        "percent": round(100 * processed / total, 1) if total else (100.0 if finished_at else 0.0),
+        "rate_per_second": round(rate, 2) if rate else None,
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+    }
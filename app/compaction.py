@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from . import crud, leases
+from .config import SessionLocal, engines, get_settings
+from .idempotency import idempotency_store
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+SQLITE_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def in_offpeak_window(now: datetime) -> bool:
+    """Попадает ли время в окно низкой нагрузки (окно может переходить через полночь)"""
+    start, end = settings.compaction_window_start_hour, settings.compaction_window_end_hour
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+def purge_trash() -> int:
+    """Удаляет старые задачи из корзины небольшими пачками, давая писателям захватить БД между ними"""
+    deleted_before = datetime.now(timezone.utc) - timedelta(days=settings.trash_retention_days)
+    total = 0
+    while True:
+        with SessionLocal() as db:
+            purged = crud.purge_deleted_tasks(db, deleted_before, settings.compaction_batch_size)
+        total += purged
+        if purged < settings.compaction_batch_size:
+            return total
+        time.sleep(settings.compaction_batch_pause)
+
+
+def vacuum():
+    """Возвращает освободившиеся страницы SQLite файловой системе"""
+    for engine in engines:
+        if engine.dialect.name != "sqlite":
+            continue
+
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode == SQLITE_AUTO_VACUUM_INCREMENTAL:
+                conn.exec_driver_sql(f"PRAGMA incremental_vacuum({settings.compaction_vacuum_pages})")
+            else:
+                # Полный VACUUM блокирует базу на все время перезаписи файла: только вручную
+                logger.warning(
+                    "БД %s не в режиме auto_vacuum=INCREMENTAL, место не освобождается; "
+                    "выполните tools/enable_auto_vacuum.py при остановленных боте и API",
+                    engine.url
+                )
+
+
+def compact() -> int:
+    purged = purge_trash()
+    idempotency_store.purge_expired()
+    vacuum()
+    return purged
+
+
+async def run_compaction():
+    """Фоновое уплотнение: очистка корзины и vacuum только в окно низкой нагрузки"""
+    while True:
+        await asyncio.sleep(settings.compaction_interval_minutes * 60)
+        if not in_offpeak_window(datetime.now(timezone.utc)):
+            continue
+
+        try:
+            purged = await leases.run_exclusive("compaction", compact)
+            if purged is None:
+                continue
+            logger.info("Уплотнение БД завершено, удалено задач из корзины: %d", purged)
+        except Exception:
+            logger.exception("Ошибка уплотнения БД")
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from typing import Literal
+from sqlalchemy import create_engine, event, Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pydantic_settings import BaseSettings
@@ -7,8 +8,158 @@ from functools import lru_cache
 
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./todolist.db"
+    # Шардирование задач по хешу user_id: список URL баз (JSON-массив),
+    # при пустом списке используется одна база database_url
+    shard_urls: list[str] = []
+    # Реплики для чтения (JSON-массив URL): списки и карточки задач читаются с них,
+    # изменения и чтения после изменений - с database_url
+    database_replica_urls: list[str] = []
+    replica_health_check_seconds: float = 5.0
+    # Журнал WAL для SQLite: чтения и резервное копирование не блокируют запись
+    sqlite_wal: bool = True
     telegram_bot_token: str
     telegram_chat_id: str | None = None
+    # Адрес Bot API (например, tools/fake_telegram.py для нагрузочных тестов); по умолчанию api.telegram.org
+    telegram_api_base: str | None = None
+
+    # Режим запуска: combined - API и бот в одном процессе (для разработки),
+    # api - только API, бот запускается отдельно (python -m app.telegram_bot.worker)
+    app_mode: Literal["combined", "api"] = "combined"
+
+    # Бот-воркер
+    bot_mode: Literal["polling", "webhook"] = "polling"
+    # Одновременно обрабатываемых обновлений всех чатов (обновления одного чата - по очереди)
+    bot_max_concurrent_updates: int = 64
+    bot_update_queue_size: int = 1000  # ждущих приема в обработку; полная очередь останавливает поллинг
+    bot_max_pending_updates: int = 1000  # принятых в обработку; сверх лимита - отказ пользователю
+    bot_chat_max_pending: int = 10  # то же для одного чата
+    webhook_url: str | None = None
+    webhook_path: str = "/telegram/webhook"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8081
+    webhook_secret: str | None = None
+
+    # Общее хранилище FSM для нескольких процессов бота (нужен пакет redis)
+    fsm_redis_url: str | None = None
+
+    # Отложенная запись отметок выполнения из бота
+    toggle_write_behind: bool = False
+    toggle_flush_interval_ms: int = 200
+    toggle_flush_max_items: int = 100
+
+    # История изменений задач пишется пачками вне запроса: раз в history_flush_interval_ms
+    # или при накоплении history_flush_max_items событий; при history_max_buffer событий
+    # в буфере запись идет сразу в вызывающем потоке
+    history_flush_interval_ms: int = 500
+    history_flush_max_items: int = 500
+    history_max_buffer: int = 10000
+
+    # Поток изменений задач (SSE / WebSocket)
+    events_replay_size: int = 1000
+    events_subscriber_buffer: int = 100
+    events_keepalive_seconds: float = 15.0
+    # Пересылка изменений между процессами (API и отдельный бот) через таблицу change_outbox;
+    # по умолчанию включена в режиме api и выключена в combined
+    events_relay: bool | None = None
+    events_relay_interval_ms: int = 200
+    events_relay_batch_size: int = 500
+    events_relay_retention_seconds: float = 300.0
+
+    # Задержка перед обновлением сообщений в Telegram после изменений через API: отсчитывается
+    # от последнего изменения чата, но не больше live_sync_max_delay_ms от первого
+    live_sync_debounce_ms: int = 500
+    live_sync_max_delay_ms: int = 2000
+
+    # Корзина: удаление только помечает задачу, старые удаленные задачи
+    # окончательно удаляются фоновым заданием в окно низкой нагрузки (часы UTC)
+    soft_delete: bool = True
+    trash_retention_days: int = 30
+    # Фоновые задания обслуживания БД (корзина, архив, перенумерация, резервные копии);
+    # по умолчанию - только в режиме combined. Если они включены в нескольких процессах,
+    # каждое задание выполняет один процесс под арендой на job_lease_seconds
+    run_background_jobs: bool | None = None
+    job_lease_seconds: float = 3600.0
+    compaction_interval_minutes: int = 30
+    compaction_batch_size: int = 500
+    compaction_batch_pause: float = 0.5
+    compaction_window_start_hour: int = 3
+    compaction_window_end_hour: int = 5
+    compaction_vacuum_pages: int = 1000
+
+    # Архив: выполненные задачи старше archive_after_days переносятся в tasks_archive
+    archive_after_days: int = 30
+    archive_interval_minutes: int = 60
+    archive_batch_size: int = 500
+    archive_batch_pause: float = 0.5
+
+    # Резервные копии SQLite: снимки шагами по backup_step_pages страниц с паузой между шагами;
+    # цепочка - полная копия и до backup_full_every - 1 снимков только с изменившимися страницами
+    backup_enabled: bool = False
+    backup_dir: str = "./backups"
+    backup_interval_minutes: int = 60
+    backup_full_every: int = 24
+    backup_keep_chains: int = 7
+    backup_step_pages: int = 256
+    backup_step_pause: float = 0.05
+    backup_max_restarts: int = 10  # без WAL: после стольких перезапусков копирование идет одним шагом
+
+    # Ручной порядок задач: фоновая перенумерация списков с длинными ключами position
+    position_rebalance_interval_minutes: int = 60
+    position_rebalance_batch_size: int = 100  # списков за проход
+    position_rebalance_batch_pause: float = 0.5
+
+    # Идемпотентность: повторы POST /tasks/ с Idempotency-Key и повторные обновления Telegram
+    idempotency_ttl_seconds: float = 86400.0
+    idempotency_cache_size: int = 10000
+    idempotency_db: bool = False  # хранить ключи в таблице idempotency_keys (общей для процессов)
+    # Повторно доставленные обновления бота (по update_id) - в памяти процесса
+    bot_update_dedup_size: int = 10000
+    bot_update_dedup_ttl_seconds: float = 3600.0
+
+    # Сжатие ответов API (brotli и zstd - при установленных пакетах brotli и zstandard)
+    compression_enabled: bool = True
+    compression_min_size: int = 1024  # байт; меньшие ответы отдаются как есть
+    compression_encodings: list[str] = ["zstd", "br", "gzip"]  # в порядке предпочтения
+
+    # Логирование
+    log_level: str = "INFO"
+    log_format: Literal["json", "text"] = "json"
+    log_repeat_limit: int = 5  # одинаковых предупреждений/ошибок за окно, 0 - без ограничения
+    log_repeat_window_seconds: float = 60.0
+
+    # Трассировка: экспортируются трассы не короче tracing_slow_ms
+    tracing_enabled: bool = False
+    tracing_slow_ms: float = 200.0
+    tracing_exporter: Literal["file", "otlp"] = "file"
+    tracing_file: str = "traces.jsonl"
+    tracing_otlp_url: str = "http://localhost:4318/v1/traces"
+
+    # Сроки и напоминания: в памяти держатся только напоминания ближайшего окна,
+    # окно перечитывается по индексу пачками раз в reminder_refresh_seconds
+    reminder_window_seconds: float = 600.0
+    reminder_refresh_seconds: float = 60.0
+    reminder_batch_size: int = 500
+    reminder_max_scheduled: int = 100000
+    bot_timezone: str = "Europe/Moscow"  # для ввода сроков в боте
+
+    # Ограничение частоты отправки сообщений ботом (лимиты Telegram: ~30 в секунду, 1 в секунду на чат)
+    bot_send_rate: float = 25.0
+    bot_chat_send_interval: float = 1.0
+    bot_send_max_retries: int = 3
+
+    # Утренний дайджест: сводка открытых задач каждому пользователю в digest_hour (BOT_TIMEZONE)
+    digest_enabled: bool = False
+    digest_hour: int = 9
+    digest_chunk_size: int = 500  # пользователей в пачке; после каждой пачки - контрольная точка
+    digest_concurrency: int = 20  # одновременных отправок
+    # Рассылку без прогресса дольше этого времени продолжает другой процесс (или тот же после перезапуска)
+    broadcast_lease_seconds: float = 300.0
+
+    @property
+    def background_jobs(self) -> bool:
+        if self.run_background_jobs is not None:
+            return self.run_background_jobs
+        return self.app_mode == "combined"
 
     class Config:
         env_file = ".env"
@@ -22,11 +173,49 @@ def get_settings():
     return Settings()
 
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
-)
+def create_db_engine(url: str) -> Engine:
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {}
+    )
+    if url.startswith("sqlite") and settings.sqlite_wal:
+        @event.listens_for(engine, "connect")
+        def enable_wal(dbapi_connection, connection_record):
+            dbapi_connection.execute("PRAGMA journal_mode=WAL")
+    return engine
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+if settings.shard_urls and settings.database_replica_urls:
+    raise ValueError("Шардирование и реплики для чтения одновременно не поддерживаются")
+
+if settings.shard_urls:
+    from app.sharding import ShardRouter
+
+    shard_router = ShardRouter(settings.shard_urls, create_db_engine)
+    replica_pool = None
+    shard_router.install_id_generator(Base)
+    engines = list(shard_router.engines.values())
+    engine = engines[0]
+    SessionLocal = shard_router.session_factory(autocommit=False, autoflush=False)
+elif settings.database_replica_urls:
+    from app.replicas import ReplicaPool, RoutingSession
+
+    shard_router = None
+    engine = create_db_engine(settings.database_url)
+    engines = [engine]
+    replica_pool = ReplicaPool(
+        [create_db_engine(url) for url in settings.database_replica_urls],
+        settings.replica_health_check_seconds
+    )
+    SessionLocal = sessionmaker(
+        class_=RoutingSession, primary=engine, replicas=replica_pool,
+        autocommit=False, autoflush=False
+    )
+else:
+    shard_router = None
+    replica_pool = None
+    engine = create_db_engine(settings.database_url)
+    engines = [engine]
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
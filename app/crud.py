@@ -1,66 +1,599 @@
+import json
+import threading
+from datetime import datetime, timezone
 from typing import Optional
+from sqlalchemy import and_, func, insert, literal_column, or_, select, true, update
 from sqlalchemy.orm import Session
-from .models import Task
-from . import schemas
+from .config import get_settings
+from .history import history_writer
+from .models import Task, TaskArchive, TaskEvent
+from . import analytics, ordering, schemas
+from .replicas import USE_PRIMARY, primary_pinned
+from .singleflight import single_flight
+from .events import change_bus, TASK_CREATED, TASK_UPDATED, TASK_DELETED, TASK_RESTORED, TASK_ARCHIVED, \
+    TASK_DONE, TASK_UNDONE, TASK_MOVED, TASK_PURGED
+
+settings = get_settings()
+
+# Поколение записей пользователя: растет после каждой фиксации изменений его задач
+_write_generations: dict[int, int] = {}
+_write_generations_lock = threading.Lock()
+
+
+def _for_write(db: Session):
+    """Чтения перед изменением идут на primary, а не на реплику"""
+    db.info[USE_PRIMARY] = True
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Приводит время к UTC; время без часового пояса считается временем UTC.
+
+    SQLite хранит время без пояса, поэтому в БД все сроки записываются в UTC.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
 
 
 def get_task(db: Session, task_id: int) -> Optional[Task]:
-    return db.query(Task).filter(Task.id == task_id).first()
+    return db.query(Task).filter(Task.id == task_id, Task.deleted_at.is_(None)).first()
 
 
 def get_tasks(db: Session, user_id: int) -> list[Task]:
-    return db.query(Task).filter(Task.user_id == user_id).all()
+    return (
+        db.query(Task)
+        .filter(Task.user_id == user_id, Task.deleted_at.is_(None))
+        .order_by(Task.position, Task.id)
+        .all()
+    )
+
+
+TASK_VIEW_COLUMNS = (Task.id, Task.title, Task.done, Task.done_by, Task.due_at, Task.position)
+
+
+def get_task_view(db: Session, task_id: int) -> Optional[schemas.TaskView]:
+    row = db.execute(
+        select(*TASK_VIEW_COLUMNS).where(Task.id == task_id, Task.deleted_at.is_(None))
+    ).first()
+    return schemas.TaskView._make(row) if row else None
+
+
+def get_task_views(db: Session, user_id: int) -> list[schemas.TaskView]:
+    rows = db.execute(
+        select(*TASK_VIEW_COLUMNS)
+        .where(Task.user_id == user_id, Task.deleted_at.is_(None))
+        .order_by(Task.position, Task.id)
+    ).all()
+    return [schemas.TaskView._make(row) for row in rows]
+
+
+# Поля TaskInDB, доступные для выборки fields=
+TASK_FIELDS = {
+    name: getattr(Task, name)
+    for name in ("id", "title", "done", "done_by", "due_at", "remind_at", "position")
+}
+
+
+def get_task_fields(db: Session, task_ids: list[int], fields: tuple[str, ...]) -> list[dict]:
+    """Выбранные поля задач по списку ID одним запросом IN; порядок - как в task_ids"""
+    rows = db.execute(
+        select(*(TASK_FIELDS[name] for name in fields))
+        .where(Task.id.in_(task_ids), Task.deleted_at.is_(None))
+    ).all()
+    by_id = {row.id: row._asdict() for row in rows}
+    return [by_id[task_id] for task_id in dict.fromkeys(task_ids) if task_id in by_id]
+
+
+def get_tasks_fields(db: Session, user_id: int, fields: tuple[str, ...]) -> list[dict]:
+    """Выбранные поля задач пользователя в порядке списка"""
+    rows = db.execute(
+        select(*(TASK_FIELDS[name] for name in fields))
+        .where(Task.user_id == user_id, Task.deleted_at.is_(None))
+        .order_by(Task.position, Task.id)
+    ).all()
+    return [row._asdict() for row in rows]
+
+
+def _bump_write_generation(user_id: Optional[int]):
+    with _write_generations_lock:
+        _write_generations[user_id] = _write_generations.get(user_id, 0) + 1
+
+
+def _publish(event_type: str, task: Task | schemas.TaskInDB, user_id: Optional[int] = None):
+    """Публикует изменение после commit; следующие чтения списка пользователя не объединяются с прежними"""
+    _bump_write_generation(user_id if user_id is not None else getattr(task, "user_id", None))
+    change_bus.publish(event_type, task, user_id=user_id)
+
+
+def _tasks_flight_key(db: Session, user_id: int, fields: Optional[tuple[str, ...]] = None) -> tuple:
+    # Чтения с primary и с реплик не объединяем, чтобы не потерять read-your-writes;
+    # поколение записей - чтобы не присоединиться к чтению, начатому до своей записи
+    pinned = bool(db.info.get(USE_PRIMARY) or primary_pinned())
+    return "get_tasks", user_id, _write_generations.get(user_id, 0), pinned, fields
+
+
+def get_tasks_coalesced(db: Session, user_id: int) -> list[schemas.TaskView]:
+    """get_task_views с объединением одновременных одинаковых запросов (результат общий и неизменяемый)"""
+    return single_flight.do(_tasks_flight_key(db, user_id), lambda: get_task_views(db, user_id))
+
+
+def get_tasks_fields_coalesced(db: Session, user_id: int, fields: tuple[str, ...]) -> list[dict]:
+    """get_tasks_fields с объединением одновременных одинаковых запросов (результат общий, не изменять)"""
+    return single_flight.do(_tasks_flight_key(db, user_id, fields), lambda: get_tasks_fields(db, user_id, fields))
+
+
+async def get_tasks_async(db: Session, user_id: int) -> list[schemas.TaskView]:
+    """Асинхронный get_tasks_coalesced: запрос выполняется в пуле потоков"""
+    return await single_flight.do_async(_tasks_flight_key(db, user_id), lambda: get_task_views(db, user_id))
+
+
+def get_upcoming_reminders(db: Session, until: datetime, limit: int,
+                           after: Optional[tuple[datetime, int]] = None) -> list[tuple[int, datetime]]:
+    """Пачка напоминаний не позже until по индексу ix_tasks_remind_at: (task_id, remind_at).
+
+    after - последнее напоминание предыдущей пачки; remind_at возвращается как в БД,
+    чтобы по нему можно было занять напоминание в claim_reminders.
+    """
+    query = (
+        select(Task.id, Task.remind_at)
+        .where(Task.remind_at.is_not(None), Task.deleted_at.is_(None), Task.remind_at <= until)
+        .order_by(Task.remind_at, Task.id)
+        .limit(limit)
+    )
+    if after is not None:
+        after_at, after_id = after
+        query = query.where(or_(Task.remind_at > after_at, and_(Task.remind_at == after_at, Task.id > after_id)))
+    rows = db.execute(query).all()
+    # При шардировании строки приходят от каждого шарда: порядок и лимит восстанавливаем здесь
+    rows.sort(key=lambda row: (as_utc(row.remind_at), row.id))
+    return [(row.id, row.remind_at) for row in rows[:limit]]
+
+
+def claim_reminders(db: Session, due: list[tuple[int, datetime]]) -> list[schemas.Reminder]:
+    """Сбрасывает remind_at у наступивших напоминаний и возвращает те, что нужно отправить.
+
+    Напоминание занимается, только если remind_at не изменился с момента загрузки,
+    поэтому несколько процессов бота не отправят его дважды. Для выполненных задач
+    напоминание сбрасывается без отправки.
+    """
+    if not due:
+        return []
+    _for_write(db)
+    claimed = [
+        task_id for task_id, remind_at in due
+        if db.query(Task)
+        .filter(Task.id == task_id, Task.remind_at == remind_at, Task.deleted_at.is_(None))
+        .update({Task.remind_at: None}, synchronize_session=False)
+    ]
+    rows = db.execute(
+        select(Task.id, Task.user_id, Task.title, Task.due_at)
+        .where(Task.id.in_(claimed), Task.done.is_not(true()))
+    ).all() if claimed else []
+    db.commit()
+    return [schemas.Reminder._make(row) for row in rows]
+
+
+def count_users_with_open_tasks(db: Session) -> int:
+    """Число пользователей с невыполненными задачами (при шардировании - сумма по шардам)"""
+    counts = db.execute(
+        select(func.count(func.distinct(Task.user_id)))
+        .where(Task.deleted_at.is_(None), Task.done.is_not(true()))
+    ).scalars().all()
+    return sum(counts)
+
+
+def get_open_task_counts(db: Session, after_user_id: Optional[int], limit: int) -> list[tuple[int, int]]:
+    """Пачка (user_id, число невыполненных задач) по возрастанию user_id - один сгруппированный запрос"""
+    query = (
+        select(Task.user_id, func.count())
+        .where(Task.deleted_at.is_(None), Task.done.is_not(true()), Task.user_id.is_not(None))
+        .group_by(Task.user_id)
+        .order_by(Task.user_id)
+        .limit(limit)
+    )
+    if after_user_id is not None:
+        query = query.where(Task.user_id > after_user_id)
+    # Задачи пользователя лежат на одном шарде, поэтому группы не пересекаются; порядок восстанавливаем здесь
+    rows = sorted(db.execute(query).all())
+    return [(user_id, count) for user_id, count in rows[:limit]]
+
+
+def get_deleted_task(db: Session, task_id: int) -> Optional[Task]:
+    return db.query(Task).filter(Task.id == task_id, Task.deleted_at.is_not(None)).first()
+
+
+def get_deleted_tasks(db: Session, user_id: int, limit: Optional[int] = None) -> list[Task]:
+    """Задачи пользователя в корзине, сначала недавно удаленные"""
+    query = (
+        db.query(Task)
+        .filter(Task.user_id == user_id, Task.deleted_at.is_not(None))
+        .order_by(Task.deleted_at.desc())
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
 
 
 def create_task(db: Session, task: schemas.TaskCreate) -> Task:
-    db_task = Task(title=task.title, user_id=task.user_id)
+    db_task = Task(
+        title=task.title, user_id=task.user_id,
+        due_at=as_utc(task.due_at), remind_at=as_utc(task.remind_at),
+        position=ordering.key_between(_last_position(db, task.user_id), None)
+    )
     db.add(db_task)
+    analytics.record(db, [(task.user_id, analytics.CREATED, None)])
     db.commit()
     db.refresh(db_task)
+    _publish(TASK_CREATED, db_task)
+    history_writer.record(db_task.id, db_task.user_id, TASK_CREATED, {
+        field: (None, getattr(db_task, field))
+        for field in ("title", "due_at", "remind_at") if getattr(db_task, field) is not None
+    })
     return db_task
 
 
 def update_task(db: Session, task_id: int, data: schemas.TaskUpdate) -> Optional[Task]:
+    _for_write(db)
     task = get_task(db, task_id)
-    if task and data.title is not None:
-        task.title = data.title
+    changes = {}
+    if data.title is not None:
+        changes["title"] = data.title
+    for field in ("due_at", "remind_at"):
+        if field in data.model_fields_set:
+            changes[field] = as_utc(getattr(data, field))
+    if task and changes:
+        # Старые значения - для истории; время сравниваем в UTC (SQLite возвращает его без пояса)
+        history = {}
+        for field, value in changes.items():
+            old = getattr(task, field) if field == "title" else as_utc(getattr(task, field))
+            if old != value:
+                history[field] = (old, value)
+        for field, value in changes.items():
+            setattr(task, field, value)
         db.commit()
         db.refresh(task)
+        _publish(TASK_UPDATED, task)
+        if history:
+            history_writer.record(task.id, task.user_id, TASK_UPDATED, history)
+    return task
+
+
+def _last_position(db: Session, user_id: int) -> Optional[str]:
+    return db.execute(
+        select(func.max(Task.position)).where(Task.user_id == user_id, Task.deleted_at.is_(None))
+    ).scalar()
+
+
+def _neighbor(db: Session, task: Task, before: bool) -> Optional[Task]:
+    """Соседняя задача в списке: предыдущая (before) или следующая, по (position, id)"""
+    query = db.query(Task).filter(Task.user_id == task.user_id, Task.deleted_at.is_(None), Task.id != task.id)
+    if before:
+        query = query.filter(or_(Task.position < task.position,
+                                 and_(Task.position == task.position, Task.id < task.id)))
+        return query.order_by(Task.position.desc(), Task.id.desc()).first()
+    query = query.filter(or_(Task.position > task.position,
+                             and_(Task.position == task.position, Task.id > task.id)))
+    return query.order_by(Task.position, Task.id).first()
+
+
+def _position_near(db: Session, task: Task, anchor: Task, before: bool) -> Optional[str]:
+    """Позиция соседа anchor с нужной стороны, не считая перемещаемую задачу"""
+    query = select(Task.position).where(
+        Task.user_id == anchor.user_id, Task.deleted_at.is_(None), Task.id != task.id
+    )
+    if before:
+        query = query.where(Task.position < anchor.position).order_by(Task.position.desc())
+    else:
+        query = query.where(Task.position > anchor.position).order_by(Task.position)
+    return db.execute(query.limit(1)).scalar()
+
+
+def move_task(db: Session, task_id: int, after_id: Optional[int] = None,
+              before_id: Optional[int] = None) -> Optional[Task]:
+    """Ставит задачу после after_id и/или перед before_id: меняется только ее position.
+
+    ValueError - соседние задачи не найдены, из другого списка или идут не по порядку.
+    """
+    _for_write(db)
+    task = get_task(db, task_id)
+    if task is None:
+        return None
+
+    anchors = {}
+    for name, anchor_id in (("after", after_id), ("before", before_id)):
+        if anchor_id is None:
+            continue
+        anchor = get_task(db, anchor_id)
+        if anchor is None or anchor.user_id != task.user_id or anchor.id == task.id:
+            raise ValueError(f"Задача {anchor_id} не найдена в списке")
+        anchors[name] = anchor
+    if not anchors:
+        raise ValueError("Нужно указать after_id или before_id")
+
+    for attempt in range(2):
+        after, before = anchors.get("after"), anchors.get("before")
+        low = after.position if after else _position_near(db, task, before, before=True)
+        high = before.position if before else _position_near(db, task, after, before=False)
+        if low is None or high is None or low < high:
+            break
+        if after and before:
+            raise ValueError("after_id должна стоять раньше before_id")
+        # Одинаковые ключи (одновременное добавление): перенумеровываем список и повторяем
+        rebalance_positions(db, task.user_id)
+        for anchor in anchors.values():
+            db.refresh(anchor)
+
+    task.position = ordering.key_between(low, high)
+    db.commit()
+    db.refresh(task)
+    _publish(TASK_MOVED, task)
     return task
 
 
-def delete_task(db: Session, task_id: int) -> Optional[Task]:
+def move_task_step(db: Session, task_id: int, up: bool) -> Optional[tuple[Task, Task]]:
+    """Меняет задачу местами с соседней сверху или снизу; None - задачи нет или она крайняя.
+
+    Возвращает (задача, сосед).
+    """
+    _for_write(db)
     task = get_task(db, task_id)
-    if task:
+    neighbor = _neighbor(db, task, before=up) if task else None
+    if neighbor is None:
+        return None
+    if up:
+        task = move_task(db, task_id, before_id=neighbor.id)
+    else:
+        task = move_task(db, task_id, after_id=neighbor.id)
+    return task, neighbor
+
+
+def get_users_with_long_positions(db: Session, length: int, limit: int) -> list[int]:
+    """Пользователи, в списках которых есть ключи порядка длиннее length (по ix_tasks_long_position)"""
+    # Число - литералом: SQLite использует частичный индекс, только если условие совпадает с его WHERE
+    rows = db.execute(
+        select(Task.user_id).distinct()
+        .where(func.length(Task.position) > literal_column(str(int(length))), Task.deleted_at.is_(None))
+        .limit(limit)
+    ).scalars().all()
+    return list(rows)[:limit]
+
+
+def rebalance_positions(db: Session, user_id: int) -> int:
+    """Перенумеровывает список пользователя короткими ключами в текущем порядке"""
+    _for_write(db)
+    ids = db.execute(
+        select(Task.id, Task.position)
+        .where(Task.user_id == user_id, Task.deleted_at.is_(None))
+        .order_by(Task.position, Task.id)
+    ).all()
+    changes = [
+        {"id": task_id, "position": key}
+        for (task_id, position), key in zip(ids, ordering.sequential_keys(len(ids)))
+        if position != key
+    ]
+    if changes:
+        db.execute(update(Task), changes)
+    db.commit()
+    if changes:
+        _bump_write_generation(user_id)
+    return len(changes)
+
+
+def delete_task(db: Session, task_id: int) -> Optional[tuple[schemas.TaskInDB, Optional[int]]]:
+    """Удаляет задачу: в режиме soft_delete только помечает ее удаленной (корзина).
+
+    Возвращает (снимок задачи до удаления, user_id владельца); None - задачи нет.
+    """
+    _for_write(db)
+    task = get_task(db, task_id)
+    if task is None:
+        return None
+    # Снимок до удаления: после commit атрибуты объекта уже не загрузить
+    snapshot, user_id = schemas.TaskInDB.model_validate(task), task.user_id
+    if settings.soft_delete:
+        task.deleted_at = datetime.now(timezone.utc)
+    else:
         db.delete(task)
+    db.commit()
+    _publish(TASK_DELETED, snapshot, user_id=user_id)
+    history_writer.record(snapshot.id, user_id, TASK_DELETED)
+    return snapshot, user_id
+
+
+def restore_task(db: Session, task_id: int) -> Optional[Task]:
+    """Восстанавливает задачу из корзины"""
+    _for_write(db)
+    task = get_deleted_task(db, task_id)
+    if task:
+        task.deleted_at = None
         db.commit()
+        db.refresh(task)
+        _publish(TASK_RESTORED, task)
+        history_writer.record(task.id, task.user_id, TASK_RESTORED)
     return task
 
 
+def purge_deleted_tasks(db: Session, deleted_before: datetime, batch_size: int) -> int:
+    """Окончательно удаляет одну пачку задач, лежащих в корзине дольше срока"""
+    _for_write(db)
+    rows = (
+        db.query(Task.id, Task.user_id)
+        .filter(Task.deleted_at.is_not(None), Task.deleted_at < deleted_before)
+        .limit(batch_size)
+        .all()
+    )
+    if not rows:
+        return 0
+    db.query(Task).filter(Task.id.in_([task_id for task_id, _ in rows])).delete(synchronize_session=False)
+    db.commit()
+    # История остается: задача удалена навсегда - последнее событие в ней
+    for task_id, user_id in rows:
+        history_writer.record(task_id, user_id, TASK_PURGED)
+    return len(rows)
+
+
+def _done_changes(task: Task, done: bool, done_by: Optional[str]) -> dict[str, tuple]:
+    """Изменившиеся done и done_by для истории"""
+    changes = {}
+    if bool(task.done) != done:
+        changes["done"] = (bool(task.done), done)
+    if task.done_by != done_by:
+        changes["done_by"] = (task.done_by, done_by)
+    return changes
+
+
 def mark_done(db: Session, task_id: int, done: bool) -> Optional[Task]:
+    _for_write(db)
     task = get_task(db, task_id)
     if task:
+        was_done = bool(task.done)
+        if was_done != done:
+            analytics.record(db, [(task.user_id, analytics.COMPLETED if done else analytics.REOPENED, None)])
         task.done = done
         db.commit()
         db.refresh(task)
+        _publish(TASK_DONE if done else TASK_UNDONE, task)
+        if was_done != done:
+            history_writer.record(task.id, task.user_id, TASK_DONE if done else TASK_UNDONE, {"done": (was_done, done)})
     return task
 
 
-def mark_task_done(db: Session, task_id: int, done_by: str) -> Optional[Task]:
+def mark_task_done(db: Session, task_id: int, done_by: Optional[str] = None) -> Optional[Task]:
+    _for_write(db)
     task = get_task(db, task_id)
     if task:
+        history = _done_changes(task, True, done_by)
+        if not task.done:
+            analytics.record(db, [(task.user_id, analytics.COMPLETED, done_by)])
         task.done = True
         task.done_by = done_by
         db.commit()
         db.refresh(task)
+        _publish(TASK_DONE, task)
+        if history:
+            history_writer.record(task.id, task.user_id, TASK_DONE, history)
     return task
 
 
 def mark_task_undone(db: Session, task_id: int) -> Optional[Task]:
+    _for_write(db)
     task = get_task(db, task_id)
     if task:
+        history = _done_changes(task, False, None)
+        if task.done:
+            analytics.record(db, [(task.user_id, analytics.REOPENED, None)])
         task.done = False
         task.done_by = None
         db.commit()
         db.refresh(task)
+        _publish(TASK_UNDONE, task)
+        if history:
+            history_writer.record(task.id, task.user_id, TASK_UNDONE, history)
     return task
+
+
+def apply_toggles(db: Session, toggles: dict[int, tuple[bool, Optional[str]]]) -> list[Task]:
+    """Применяет пачку отметок выполнения (task_id -> (done, done_by)) одной транзакцией"""
+    if not toggles:
+        return []
+    _for_write(db)
+    tasks = db.query(Task).filter(Task.id.in_(toggles.keys()), Task.deleted_at.is_(None)).all()
+    events, history = [], {}
+    for task in tasks:
+        done, done_by = toggles[task.id]
+        if bool(task.done) != done:
+            events.append((task.user_id, analytics.COMPLETED if done else analytics.REOPENED, done_by))
+        history[task.id] = _done_changes(task, done, done_by)
+        task.done, task.done_by = done, done_by
+    analytics.record(db, events)
+    snapshots = [(schemas.TaskInDB.model_validate(task), task.user_id) for task in tasks]
+    db.commit()
+    for snapshot, user_id in snapshots:
+        event_type = TASK_DONE if snapshot.done else TASK_UNDONE
+        _publish(event_type, snapshot, user_id=user_id)
+        if history[snapshot.id]:
+            history_writer.record(snapshot.id, user_id, event_type, history[snapshot.id])
+    return tasks
+
+
+def get_archived_task(db: Session, task_id: int) -> Optional[TaskArchive]:
+    return db.query(TaskArchive).filter(TaskArchive.id == task_id).first()
+
+
+def get_archived_tasks(db: Session, user_id: int, limit: int = 50, offset: int = 0) -> list[TaskArchive]:
+    """Архив пользователя, сначала недавно перенесенные"""
+    return (
+        db.query(TaskArchive)
+        .filter(TaskArchive.user_id == user_id)
+        .order_by(TaskArchive.archived_at.desc(), TaskArchive.id.desc())
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+
+
+def archive_done_tasks(db: Session, done_before: datetime, batch_size: int) -> int:
+    """Переносит одну пачку задач, выполненных раньше done_before, в tasks_archive"""
+    _for_write(db)
+    done_at = func.coalesce(Task.updated_at, Task.created_at)
+    tasks = (
+        db.query(Task)
+        .filter(Task.done == true(), Task.deleted_at.is_(None), done_at < done_before)
+        # ID уже есть в архиве (выдан повторно до перехода на AUTOINCREMENT): такие задачи не переносим
+        .filter(~select(TaskArchive.id).where(TaskArchive.id == Task.id).exists())
+        .order_by(done_at, Task.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not tasks:
+        return 0
+
+    ids = [task.id for task in tasks]
+    snapshots = [(schemas.TaskInDB.model_validate(task), task.user_id) for task in tasks]
+    columns = ["id", "title", "done", "done_by", "user_id", "created_at", "updated_at"]
+    db.execute(
+        insert(TaskArchive).from_select(
+            columns,
+            select(*(getattr(Task, column) for column in columns)).where(Task.id.in_(ids))
+        )
+    )
+    db.query(Task).filter(Task.id.in_(ids)).delete(synchronize_session=False)
+    db.commit()
+
+    for snapshot, user_id in snapshots:
+        _publish(TASK_ARCHIVED, snapshot, user_id=user_id)
+        history_writer.record(snapshot.id, user_id, TASK_ARCHIVED)
+    return len(ids)
+
+
+def get_archive_conflicts(db: Session, done_before: datetime, limit: int) -> list[int]:
+    """ID задач-кандидатов в архив, которые уже заняты в tasks_archive"""
+    done_at = func.coalesce(Task.updated_at, Task.created_at)
+    return list(db.scalars(
+        select(Task.id)
+        .join(TaskArchive, TaskArchive.id == Task.id)
+        .where(Task.done == true(), Task.deleted_at.is_(None), done_at < done_before)
+        .order_by(Task.id)
+        .limit(limit)
+    ))
+
+
+def get_task_events(db: Session, task_id: int, user_id: int, limit: int,
+                    before_id: Optional[int] = None) -> list[dict]:
+    """История задачи пользователя, сначала новые события; before_id - продолжение со следующей страницы"""
+    query = (
+        select(TaskEvent)
+        .where(TaskEvent.task_id == task_id, TaskEvent.user_id == user_id)
+        .order_by(TaskEvent.id.desc())
+        .limit(limit)
+    )
+    if before_id is not None:
+        query = query.where(TaskEvent.id < before_id)
+    return [
+        {"id": event.id, "type": event.type, "user_id": event.user_id,
+         "changes": json.loads(event.changes) if event.changes else None,
+         "created_at": as_utc(event.created_at)}
+        for event in db.execute(query).scalars()
+    ]
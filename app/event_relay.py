@@ -0,0 +1,167 @@
+"""Пересылка изменений задач между процессами через таблицу change_outbox.
+
+ChangeBus работает внутри процесса, а при APP_MODE=api бот - отдельный процесс:
+без пересылки изменения из бота не доходят до /tasks/events и /tasks/ws, а
+удаления через API - до планировщика напоминаний бота. Каждый процесс пачками
+раз в interval записывает свои события в change_outbox основной базы и читает
+оттуда события остальных процессов. Строки старше retention удаляются.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import delete, func, insert, select
+from .config import engine, get_settings
+from .events import ChangeBus, ChangeEvent, change_bus
+from .models import ChangeOutbox
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Номера строк в PostgreSQL выдаются до фиксации, поэтому строка с меньшим id может
+# стать видна позже: перечитываем последние LOOKBACK_IDS номеров и пропускаем уже виденные
+LOOKBACK_IDS = 100
+CLEANUP_INTERVAL = 60.0
+
+
+def relay_enabled() -> bool:
+    if settings.events_relay is not None:
+        return settings.events_relay
+    return settings.app_mode == "api"
+
+
+class ChangeRelay:
+    def __init__(self, bus: ChangeBus, interval: float, batch_size: int, retention: float):
+        self.bus = bus
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retention = retention
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._buffer: list[dict] = []
+        self._lock = threading.Lock()  # send вызывается из потоков threadpool
+        self._last_id: Optional[int] = None
+        self._seen: set[int] = set()
+        self._next_cleanup = 0.0
+        self._task: asyncio.Task | None = None
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    def send(self, event: ChangeEvent):
+        """Ставит событие этого процесса в очередь на запись"""
+        row = {
+            "origin": self.origin, "type": event.type, "user_id": event.user_id,
+            "task": json.dumps(event.task, ensure_ascii=False), "ts": event.ts,
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self._buffer.append(row)
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(ChangeOutbox.__table__), rows)
+        except Exception:
+            # Поток изменений - подсказка клиентам, а не источник данных: не копим события при сбое БД
+            self.dropped += len(rows)
+            logger.exception("Не удалось записать %d событий в change_outbox", len(rows))
+            return
+        self.sent += len(rows)
+
+    def poll(self) -> list:
+        """Новые события других процессов по возрастанию id"""
+        table = ChangeOutbox.__table__
+        with engine.connect() as conn:
+            if self._last_id is None:
+                # Старт: прошлые события не повторяем
+                self._last_id = conn.execute(select(func.max(table.c.id))).scalar() or 0
+                self._seen = set(conn.execute(
+                    select(table.c.id).where(table.c.id > self._last_id - LOOKBACK_IDS)
+                ).scalars())
+                return []
+            rows = conn.execute(
+                select(table.c.id, table.c.origin, table.c.type, table.c.user_id, table.c.task, table.c.ts)
+                .where(table.c.id > self._last_id - LOOKBACK_IDS)
+                .order_by(table.c.id)
+                .limit(self.batch_size + LOOKBACK_IDS)
+            ).all()
+
+        new_rows = [row for row in rows if row.id not in self._seen]
+        if new_rows:
+            self._seen.update(row.id for row in new_rows)
+            self._last_id = max(self._last_id, new_rows[-1].id)
+            self._seen = {row_id for row_id in self._seen if row_id > self._last_id - LOOKBACK_IDS}
+        return [row for row in new_rows if row.origin != self.origin]
+
+    def cleanup(self):
+        expired = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+        with engine.begin() as conn:
+            conn.execute(delete(ChangeOutbox.__table__).where(ChangeOutbox.__table__.c.created_at < expired))
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "received": self.received, "dropped": self.dropped}
+
+    async def start(self):
+        if self._task is None:
+            await asyncio.to_thread(self.poll)
+            self.bus.relay = self
+            self._task = asyncio.create_task(self._run(), name="change-relay")
+
+    async def stop(self):
+        """Останавливает пересылку и записывает оставшиеся события"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.bus.relay = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await asyncio.to_thread(self.flush)
+                for row in await asyncio.to_thread(self.poll):
+                    self.bus.deliver(row.type, row.user_id, json.loads(row.task), ts=row.ts)
+                    self.received += 1
+                if time.monotonic() >= self._next_cleanup:
+                    self._next_cleanup = time.monotonic() + CLEANUP_INTERVAL
+                    await asyncio.to_thread(self.cleanup)
+            except Exception:
+                logger.exception("Ошибка пересылки изменений задач")
+
+
+change_relay = ChangeRelay(
+    change_bus,
+    interval=settings.events_relay_interval_ms / 1000,
+    batch_size=settings.events_relay_batch_size,
+    retention=settings.events_relay_retention_seconds
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Пересылка изменений между процессами (если включена)"""
+    if not relay_enabled():
+        yield
+        return
+    await change_relay.start()
+    try:
+        yield
+    finally:
+        await change_relay.stop()
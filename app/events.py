@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+from . import schemas
+from .config import get_settings
+from .models import Task
+
+settings = get_settings()
+
+# Типы событий
+TASK_CREATED = "created"
+TASK_UPDATED = "updated"
+TASK_DELETED = "deleted"
+TASK_RESTORED = "restored"
+TASK_ARCHIVED = "archived"
+TASK_DONE = "done"
+TASK_UNDONE = "undone"
+TASK_MOVED = "moved"
+TASK_PURGED = "purged"  # только в истории: задача удалена из корзины навсегда
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    id: int
+    type: str
+    user_id: Optional[int]
+    task: dict
+    ts: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "type": self.type, "user_id": self.user_id, "task": self.task, "ts": self.ts}
+
+
+class Subscription:
+    """Подписка на изменения с ограниченным буфером (при переполнении теряются самые старые события)"""
+
+    def __init__(self, user_id: Optional[int], maxsize: int, loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.buffer: deque[ChangeEvent] = deque(maxlen=maxsize)
+        self.dropped = 0
+        self.gap = False  # запрошенный event id уже вышел из окна повтора
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def matches(self, event: ChangeEvent) -> bool:
+        return self.user_id is None or self.user_id == event.user_id
+
+    def push(self, event: ChangeEvent):
+        # Может вызываться из потоков threadpool, поэтому будим цикл потокобезопасно
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(event)
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    async def get(self) -> ChangeEvent:
+        while True:
+            if self.buffer:
+                return self.buffer.popleft()
+            self._ready.clear()
+            if not self.buffer:
+                await self._ready.wait()
+
+
+class ChangeBus:
+    """Шина изменений задач внутри процесса с окном повтора последних событий.
+
+    relay (app/event_relay.py) пересылает опубликованные события другим процессам
+    и доставляет их события подписчикам этого процесса через deliver.
+    """
+
+    def __init__(self, replay_size: int, subscriber_buffer: int):
+        self.subscriber_buffer = subscriber_buffer
+        self.relay = None
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._history: deque[ChangeEvent] = deque(maxlen=replay_size)
+        self._subscribers: set[Subscription] = set()
+
+    def publish(self, event_type: str, task: Task | schemas.TaskInDB,
+                user_id: Optional[int] = None) -> ChangeEvent:
+        """Публикует изменение; task может быть снимком, сделанным до commit"""
+        snapshot = schemas.TaskInDB.model_validate(task).model_dump(mode="json")
+        if user_id is None:
+            user_id = getattr(task, "user_id", None)
+
+        event = self.deliver(event_type, user_id, snapshot)
+        relay = self.relay
+        if relay is not None:
+            relay.send(event)
+        return event
+
+    def deliver(self, event_type: str, user_id: Optional[int], snapshot: dict,
+                ts: Optional[float] = None) -> ChangeEvent:
+        """Передает событие подписчикам этого процесса (в том числе полученное из другого процесса)"""
+        with self._lock:
+            event = ChangeEvent(id=self._next_id, type=event_type, user_id=user_id, task=snapshot,
+                                ts=ts if ts is not None else time.time())
+            self._next_id += 1
+            self._history.append(event)
+            for subscriber in self._subscribers:
+                if subscriber.matches(event):
+                    subscriber.push(event)
+        return event
+
+    def subscribe(self, user_id: Optional[int] = None, last_event_id: Optional[int] = None) -> Subscription:
+        subscriber = Subscription(user_id, self.subscriber_buffer, asyncio.get_running_loop())
+
+        with self._lock:
+            if last_event_id is not None:
+                oldest_id = self._history[0].id if self._history else self._next_id
+                if last_event_id + 1 < oldest_id or last_event_id >= self._next_id:
+                    subscriber.gap = True
+                for event in self._history:
+                    if event.id > last_event_id and subscriber.matches(event):
+                        subscriber.push(event)
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+change_bus = ChangeBus(
+    replay_size=settings.events_replay_size,
+    subscriber_buffer=settings.events_subscriber_buffer
+)
@@ -0,0 +1,150 @@
+"""История изменений задач (таблица task_events, только добавление).
+
+crud после фиксации изменения кладет событие в буфер в памяти, фоновая задача
+записывает буфер пачками одним INSERT раз в flush_interval секунд или при
+накоплении max_items событий, поэтому запрос не ждет записи истории. Буфер
+ограничен: при max_buffer событий запись идет сразу в вызывающем потоке. Без
+запущенной фоновой задачи (утилиты, скрипты) события пишутся сразу. При
+остановке приложения остаток буфера записывается.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import insert
+from .config import engine, get_settings, shard_router
+from .models import TaskEvent
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        # SQLite возвращает время без пояса; в БД оно хранится в UTC
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    return value
+
+
+class HistoryWriter:
+    def __init__(self, flush_interval: float, max_items: int, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.max_items = max_items
+        self.max_buffer = max_buffer
+        self._buffer: list[dict] = []
+        # crud вызывается из потоков threadpool, поэтому блокировки - потоковые
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # пачки пишутся по одной, в порядке событий
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, task_id: int, user_id: Optional[int], event_type: str,
+               changes: Optional[dict[str, tuple]] = None):
+        """Добавляет событие; changes - {поле: (старое значение, новое)}"""
+        event = {
+            "task_id": task_id,
+            "user_id": user_id,
+            "type": event_type,
+            "changes": json.dumps(
+                {field: [_json_value(old), _json_value(new)] for field, (old, new) in changes.items()},
+                ensure_ascii=False
+            ) if changes else None,
+            "created_at": datetime.now(timezone.utc),
+        }
+        with self._lock:
+            self._buffer.append(event)
+            size = len(self._buffer)
+
+        if self._task is None or size >= self.max_buffer:
+            self.flush()
+        elif size >= self.max_items:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def flush(self) -> int:
+        """Записывает буфер; возвращает число записанных событий"""
+        with self._write_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if not events:
+                return 0
+            try:
+                self._write(events)
+            except Exception:
+                logger.exception("Ошибка записи %d событий истории задач", len(events))
+                with self._lock:
+                    self._buffer[:0] = events
+                    overflow = len(self._buffer) - self.max_buffer
+                    if overflow > 0:
+                        # БД недоступна дольше, чем вмещает буфер: теряем самые старые события
+                        del self._buffer[:overflow]
+                        self.dropped += overflow
+                return 0
+            self.written += len(events)
+            return len(events)
+
+    @staticmethod
+    def _write(events: list[dict]):
+        # Событие - в шард задачи (шард закодирован в ID)
+        by_engine = defaultdict(list)
+        for event in events:
+            shard_id = shard_router.shard_for_task(event["task_id"]) if shard_router else None
+            by_engine[shard_router.engines[shard_id] if shard_id else engine].append(event)
+        for target, rows in by_engine.items():
+            with target.begin() as conn:
+                conn.execute(insert(TaskEvent.__table__), rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {"buffered": buffered, "written": self.written, "dropped": self.dropped}
+
+    async def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run(), name="history-writer")
+
+    async def stop(self):
+        """Останавливает фоновую запись и записывает остаток буфера"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+
+history_writer = HistoryWriter(
+    flush_interval=settings.history_flush_interval_ms / 1000,
+    max_items=settings.history_flush_max_items,
+    max_buffer=settings.history_max_buffer
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Фоновая запись истории задач; при остановке сбрасывает буфер"""
+    await history_writer.start()
+    try:
+        yield
+    finally:
+        await history_writer.stop()
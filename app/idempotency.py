@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .config import engine, get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+upsert = postgresql_insert if engine.dialect.name == "postgresql" else sqlite_insert
+
+# status_code строки, которую захватил еще выполняющийся запрос
+PENDING_STATUS = 0
+# Захват, не завершенный за это время, считается брошенным (процесс упал посреди запроса)
+PENDING_TIMEOUT = 60.0
+
+
+class IdempotencyKeyInUse(Exception):
+    """Запрос с этим ключом еще выполняется"""
+
+
+class IdempotencyKeyMismatch(Exception):
+    """Ключ уже использован для запроса с другим содержимым"""
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    body: str
+    expires_at: float = 0.0
+
+
+def fingerprint(payload: str) -> str:
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """Ответы на выполненные запросы по ключу: LRU в памяти с TTL и, по желанию, таблица в БД.
+
+    begin() либо возвращает сохраненный ответ, либо захватывает ключ до complete()/release().
+    В БД ключ захватывается атомарно (INSERT ... ON CONFLICT DO NOTHING) до выполнения
+    запроса, поэтому одновременные повторы в разных процессах не выполняются дважды.
+    """
+
+    def __init__(self, max_size: int, ttl: float, use_db: bool):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.use_db = use_db
+        self._entries: OrderedDict[str, StoredResponse] = OrderedDict()
+        self._pending: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, request_fingerprint: str = "") -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._get_cached(key)
+            if stored is None and key in self._pending:
+                raise IdempotencyKeyInUse(key)
+            if stored is None:
+                self._pending[key] = request_fingerprint
+
+        if stored is None and self.use_db:
+            try:
+                stored = self._claim(key, request_fingerprint)
+            except IdempotencyKeyInUse:
+                self._release_pending(key)
+                raise
+            if stored is not None:
+                with self._lock:
+                    self._pending.pop(key, None)
+                    self._cache(key, stored)
+
+        if stored is not None and stored.fingerprint != request_fingerprint:
+            raise IdempotencyKeyMismatch(key)
+        return stored
+
+    def complete(self, key: str, request_fingerprint: str, status_code: int, body: str = ""):
+        stored = StoredResponse(request_fingerprint, status_code, body)
+        with self._lock:
+            self._pending.pop(key, None)
+            self._cache(key, stored)
+        if self.use_db:
+            self._save(key, stored)
+
+    def release(self, key: str):
+        """Освобождает ключ после неудачного запроса, чтобы повтор выполнился заново"""
+        self._release_pending(key)
+        if self.use_db:
+            self._unclaim(key)
+
+    def _release_pending(self, key: str):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _get_cached(self, key: str) -> Optional[StoredResponse]:
+        stored = self._entries.get(key)
+        if stored is None:
+            return None
+        if stored.expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return stored
+
+    def _cache(self, key: str, stored: StoredResponse):
+        stored.expires_at = time.monotonic() + self.ttl
+        self._entries[key] = stored
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _claim(self, key: str, request_fingerprint: str) -> Optional[StoredResponse]:
+        """Захватывает ключ в БД; сохраненный ответ - запрос уже выполнен"""
+        from .models import IdempotencyKey
+        table = IdempotencyKey.__table__
+        now = datetime.now(timezone.utc)
+        try:
+            with engine.begin() as conn:
+                # Ответ с истекшим TTL и брошенный захват ключ не держат
+                conn.execute(delete(table).where(table.c.key == key, or_(
+                    table.c.created_at < now - timedelta(seconds=self.ttl),
+                    and_(table.c.status_code == PENDING_STATUS,
+                         table.c.created_at < now - timedelta(seconds=PENDING_TIMEOUT))
+                )))
+                claimed = conn.execute(
+                    upsert(table).values(
+                        key=key, fingerprint=request_fingerprint, status_code=PENDING_STATUS,
+                        response="", created_at=now
+                    ).on_conflict_do_nothing(index_elements=["key"])
+                ).rowcount
+                row = None if claimed else conn.execute(
+                    select(table.c.fingerprint, table.c.status_code, table.c.response).where(table.c.key == key)
+                ).first()
+        except Exception:
+            # Без БД защищает только кэш процесса
+            logger.exception("Не удалось захватить ключ идемпотентности %s", key)
+            return None
+        if claimed:
+            return None
+        if row is None or row.status_code == PENDING_STATUS:
+            raise IdempotencyKeyInUse(key)
+        return StoredResponse(*row)
+
+    def _unclaim(self, key: str):
+        from .models import IdempotencyKey
+        table = IdempotencyKey.__table__
+        try:
+            with engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.key == key, table.c.status_code == PENDING_STATUS))
+        except Exception:
+            logger.exception("Не удалось освободить ключ идемпотентности %s", key)
+
+    def _save(self, key: str, stored: StoredResponse):
+        from .models import IdempotencyKey
+        table = IdempotencyKey.__table__
+        values = {
+            "fingerprint": stored.fingerprint,
+            "status_code": stored.status_code,
+            "response": stored.body,
+            "created_at": datetime.now(timezone.utc),
+        }
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    upsert(table).values(key=key, **values)
+                    .on_conflict_do_update(index_elements=["key"], set_=values)
+                )
+        except Exception:
+            logger.exception("Не удалось сохранить ключ идемпотентности %s", key)
+
+    def purge_expired(self) -> int:
+        """Удаляет из БД ключи с истекшим TTL"""
+        if not self.use_db:
+            return 0
+        from .models import IdempotencyKey
+        created_before = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        with engine.begin() as conn:
+            return conn.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < created_before)).rowcount
+
+
+# Idempotency-Key запросов API
+idempotency_store = IdempotencyStore(
+    max_size=settings.idempotency_cache_size,
+    ttl=settings.idempotency_ttl_seconds,
+    use_db=settings.idempotency_db
+)
+
+# update_id обновлений бота: отдельная граница, чтобы поток обновлений не вытеснял ключи API,
+# и только память - проверка идет в цикле событий бота
+update_dedup_store = IdempotencyStore(
+    max_size=settings.bot_update_dedup_size,
+    ttl=settings.bot_update_dedup_ttl_seconds,
+    use_db=False
+)
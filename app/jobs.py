@@ -0,0 +1,32 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from .archive import run_archiving
+from .backups import run_backups
+from .compaction import run_compaction
+from .config import get_settings
+from .ordering import run_rebalancing
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Запускает фоновые задания обслуживания БД"""
+    jobs = [
+        asyncio.create_task(run_compaction(), name="compaction"),
+        asyncio.create_task(run_archiving(), name="archiving"),
+        asyncio.create_task(run_rebalancing(), name="position-rebalancing"),
+    ]
+    if settings.backup_enabled:
+        jobs.append(asyncio.create_task(run_backups(), name="backups"))
+    logger.info("Background jobs started: %s", ", ".join(job.get_name() for job in jobs))
+
+    try:
+        yield
+    finally:
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
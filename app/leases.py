@@ -0,0 +1,62 @@
+"""Аренда фоновых заданий (таблица job_leases).
+
+Задания обслуживания БД (уплотнение, архив, перенумерация, резервные копии)
+могут быть включены в нескольких процессах API. Перед запуском задание берет
+аренду по имени: строку владеет один процесс, пока не истек expires_at, остальные
+пропускают запуск. После завершения аренда снимается; если процесс пропал,
+аренду через job_lease_seconds перехватывает другой.
+"""
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, TypeVar
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from .config import engine, get_settings
+from .models import JobLease
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+T = TypeVar("T")
+
+
+def acquire(name: str, seconds: float) -> Optional[str]:
+    """Берет аренду; возвращает владельца или None, если задание выполняет другой процесс"""
+    now = datetime.now(timezone.utc)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{os.urandom(4).hex()}"
+    expires_at = now + timedelta(seconds=seconds)
+    with engine.begin() as conn:
+        taken = conn.execute(
+            update(JobLease)
+            .where(JobLease.name == name, JobLease.expires_at < now)
+            .values(owner=owner, expires_at=expires_at)
+        ).rowcount
+        if taken:
+            return owner
+    try:
+        with engine.begin() as conn:
+            conn.execute(insert(JobLease).values(name=name, owner=owner, expires_at=expires_at))
+    except IntegrityError:
+        return None
+    return owner
+
+
+def release(name: str, owner: str):
+    with engine.begin() as conn:
+        conn.execute(delete(JobLease).where(JobLease.name == name, JobLease.owner == owner))
+
+
+async def run_exclusive(name: str, job: Callable[[], T]) -> Optional[T]:
+    """Выполняет job в пуле потоков под арендой name; None - аренду держит другой процесс"""
+    owner = await asyncio.to_thread(acquire, name, settings.job_lease_seconds)
+    if owner is None:
+        logger.debug("Задание %s выполняет другой процесс", name)
+        return None
+    try:
+        return await asyncio.to_thread(job)
+    finally:
+        await asyncio.to_thread(release, name, owner)
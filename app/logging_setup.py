@@ -0,0 +1,142 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from .config import get_settings
+
+# Поля, которые добавляются к каждой записи лога в текущем контексте (обновление бота, HTTP-запрос)
+CONTEXT_FIELDS = ("chat_id", "user_id", "task_id", "update_id")
+
+log_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+_listener: Optional[QueueListener] = None
+
+
+def bind_log_context(**fields):
+    """Добавляет поля к записям лога до конца текущего контекста"""
+    fields = {key: value for key, value in fields.items() if value is not None}
+    if fields:
+        log_context.set({**log_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Копирует поля контекста в запись (выполняется в потоке, где пишется лог)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context.get().items():
+            setattr(record, key, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Пропускает не больше limit одинаковых предупреждений и ошибок за window секунд.
+
+    Одинаковыми считаются записи с тем же логгером, уровнем и шаблоном сообщения
+    (до подстановки аргументов). Число пропущенных записей добавляется к следующей
+    пропущенной в лог.
+    """
+
+    def __init__(self, limit: int, window: float):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._counters: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.limit <= 0:
+            return True
+
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None or now - counter[0] >= self.window:
+                suppressed = counter[2] if counter else 0
+                self._counters[key] = [now, 1, 0]
+                if len(self._counters) > 10000:
+                    self._counters = {key: self._counters[key]}
+            elif counter[1] < self.limit:
+                counter[1] += 1
+                suppressed = 0
+            else:
+                counter[2] += 1
+                return False
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS + ("suppressed",):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(
+            f"{key}={getattr(record, key)}"
+            for key in CONTEXT_FIELDS + ("suppressed",)
+            if getattr(record, key, None) is not None
+        )
+        return f"{line} [{fields}]" if fields else line
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке: форматирует поток QueueListener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging():
+    """Настраивает логирование один раз на процесс.
+
+    Записи проходят фильтры (контекст, ограничение повторов) в вызывающем потоке
+    и через очередь передаются фоновому потоку, который форматирует и пишет их.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    settings = get_settings()
+    output = logging.StreamHandler()
+    output.setFormatter(
+        JsonFormatter() if settings.log_format == "json"
+        else TextFormatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    )
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _DeferredQueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+    handler.addFilter(RateLimitFilter(settings.log_repeat_limit, settings.log_repeat_window_seconds))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(settings.log_level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
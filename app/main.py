@@ -1,6 +1,68 @@
+from contextlib import asynccontextmanager, AsyncExitStack
 from fastapi import FastAPI
-from app.telegram_bot.runner import lifespan
-from app.routers import tasks
+from app.compression import CompressionMiddleware
+from app.config import get_settings, replica_pool
+from app.event_relay import lifespan as relay_lifespan
+from app.history import lifespan as history_lifespan
+from app.logging_setup import setup_logging
+from app.tracing import fastapi_middleware, setup_tracing
+from app.routers import analytics, broadcasts, stats, tasks
 
-app = FastAPI(lifespan=lifespan)
-app.include_router(tasks.router)
\ No newline at end of file
+
+def create_app(with_bot: bool | None = None) -> FastAPI:
+    """Создает приложение API.
+
+    По умолчанию бот запускается в том же процессе только в режиме combined
+    (APP_MODE), в режиме api бот работает отдельным воркером.
+    """
+    settings = get_settings()
+    setup_logging()
+    if with_bot is None:
+        with_bot = settings.app_mode == "combined"
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        async with AsyncExitStack() as stack:
+            # Первой запускается и последней останавливается: сбрасывает историю после бота и заданий
+            await stack.enter_async_context(history_lifespan(app))
+            await stack.enter_async_context(relay_lifespan(app))
+            if replica_pool is not None:
+                await stack.enter_async_context(replica_pool.monitor())
+            if settings.background_jobs:
+                from app.jobs import lifespan as jobs_lifespan
+                await stack.enter_async_context(jobs_lifespan(app))
+            if with_bot:
+                from app.telegram_bot.runner import lifespan as bot_lifespan
+                await stack.enter_async_context(bot_lifespan(app))
+            else:
+                from app.telegram_bot.live_sync import lifespan as live_sync_lifespan
+                await stack.enter_async_context(live_sync_lifespan(app))
+            yield
+
+    app = FastAPI(lifespan=lifespan)
+    if settings.tracing_enabled:
+        setup_tracing()
+        app.middleware("http")(fastapi_middleware)
+    if replica_pool is not None:
+        from app.replicas import ReadScopeMiddleware
+        app.add_middleware(ReadScopeMiddleware)
+    if settings.compression_enabled:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.compression_min_size,
+            encodings=settings.compression_encodings
+        )
+    # До tasks: иначе /tasks/{task_id} перехватит /tasks/analytics/...
+    app.include_router(analytics.router)
+    app.include_router(tasks.router)
+    app.include_router(stats.router)
+    app.include_router(broadcasts.router)
+    return app
+
+
+def create_api_app() -> FastAPI:
+    """Приложение только с API: uvicorn app.main:create_api_app --factory"""
+    return create_app(with_bot=False)
+
+
+app = create_app()
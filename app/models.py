@@ -1,10 +1,49 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Float, Index, Text, UniqueConstraint, text
 from sqlalchemy.sql import func  # для CURRENT_TIMESTAMP
 from .config import Base
 
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        # Частичные индексы: активные задачи пользователя и корзина
+        Index(
+            "ix_tasks_user_id_active", "user_id",
+            sqlite_where=text("deleted_at IS NULL"),
+            postgresql_where=text("deleted_at IS NULL")
+        ),
+        Index(
+            "ix_tasks_deleted_at", "deleted_at",
+            sqlite_where=text("deleted_at IS NOT NULL"),
+            postgresql_where=text("deleted_at IS NOT NULL")
+        ),
+        # Кандидаты в архив: выполненные активные задачи по времени выполнения
+        Index(
+            "ix_tasks_done_at", text("coalesce(updated_at, created_at)"),
+            sqlite_where=text("done = 1 AND deleted_at IS NULL"),
+            postgresql_where=text("done AND deleted_at IS NULL")
+        ),
+        # Ближайшие напоминания: планировщик читает диапазон по времени, а не всю таблицу
+        Index(
+            "ix_tasks_remind_at", "remind_at",
+            sqlite_where=text("remind_at IS NOT NULL AND deleted_at IS NULL"),
+            postgresql_where=text("remind_at IS NOT NULL AND deleted_at IS NULL")
+        ),
+        # Ручной порядок: список пользователя читается по индексу уже отсортированным
+        Index(
+            "ix_tasks_user_id_position", "user_id", "position",
+            sqlite_where=text("deleted_at IS NULL"),
+            postgresql_where=text("deleted_at IS NULL")
+        ),
+        # Списки с длинными ключами порядка для перенумерации (длина - ordering.REBALANCE_KEY_LENGTH)
+        Index(
+            "ix_tasks_long_position", "user_id",
+            sqlite_where=text("length(position) > 12 AND deleted_at IS NULL"),
+            postgresql_where=text("length(position) > 12 AND deleted_at IS NULL")
+        ),
+        # ID удаленных и перенесенных в архив задач не выдаются повторно: по ним хранятся история и архив
+        {"sqlite_autoincrement": True},
+    )
 
 
     id = Column(Integer, primary_key=True, index=True)
@@ -15,3 +54,127 @@ class Task(Base):
     user_id = Column(Integer, index=True)  # Telegram user ID
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # задача в корзине
+    due_at = Column(DateTime(timezone=True), nullable=True)  # срок выполнения
+    remind_at = Column(DateTime(timezone=True), nullable=True)  # время напоминания; после отправки сбрасывается
+    position = Column(String, nullable=True)  # ключ ручного порядка (app/ordering.py)
+
+
+class TaskArchive(Base):
+    """Выполненные задачи, перенесенные из горячей таблицы tasks"""
+    __tablename__ = "tasks_archive"
+    __table_args__ = (
+        Index("ix_tasks_archive_user_id_archived_at", "user_id", "archived_at"),
+    )
+
+    id = Column(Integer, primary_key=True)  # ID задачи сохраняется при переносе
+    title = Column(String, nullable=False)
+    done = Column(Boolean, default=True)
+    done_by = Column(String, nullable=True)
+
+    user_id = Column(Integer)
+    created_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class IdempotencyKey(Base):
+    """Сохраненные ответы на запросы с ключом идемпотентности"""
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class Broadcast(Base):
+    """Рассылки с контрольной точкой: после перезапуска продолжаются с last_user_id"""
+    __tablename__ = "broadcasts"
+    __table_args__ = (
+        UniqueConstraint("kind", "key", name="uq_broadcasts_kind_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # например, digest
+    key = Column(String, nullable=False)  # например, дата дайджеста
+    status = Column(String, nullable=False)  # running / done
+    owner = Column(String, nullable=True)  # процесс, который ведет рассылку
+    last_user_id = Column(Integer, nullable=True)  # все пользователи до него включительно обработаны
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class TaskDailyStats(Base):
+    """Дневная сводка пользователя (UTC): создано, выполнено и снова открыто задач"""
+    __tablename__ = "task_daily_stats"
+    __table_args__ = (
+        Index("ix_task_daily_stats_user_id_day", "user_id", "day"),
+    )
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+    created = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    reopened = Column(Integer, nullable=False, default=0)
+
+
+class TaskCompleterStats(Base):
+    """Сколько задач за день (UTC) выполнил каждый done_by"""
+    __tablename__ = "task_completer_stats"
+
+    day = Column(Date, primary_key=True)
+    done_by = Column(String, primary_key=True)
+    completed = Column(Integer, nullable=False, default=0)
+
+
+class TaskEvent(Base):
+    """История изменений задачи: строки только добавляются (app/history.py) и остаются после удаления задачи"""
+    __tablename__ = "task_events"
+    __table_args__ = (
+        Index("ix_task_events_task_id_id", "task_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    type = Column(String, nullable=False)  # тип события из app/events.py
+    changes = Column(Text, nullable=True)  # JSON: {"поле": [старое значение, новое]}
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ChangeOutbox(Base):
+    """Изменения задач для других процессов (app/event_relay.py); старые строки удаляются"""
+    __tablename__ = "change_outbox"
+    __table_args__ = {"sqlite_autoincrement": True}  # номера не переиспользуются: по ним читают новые строки
+
+    id = Column(Integer, primary_key=True)
+    origin = Column(String, nullable=False)  # процесс-источник: свои события он не перечитывает
+    type = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    task = Column(Text, nullable=False)  # JSON-снимок задачи
+    ts = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class JobLease(Base):
+    """Аренда фонового задания: выполняет тот процесс, чья аренда не истекла (app/leases.py)"""
+    __tablename__ = "job_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class TaskIdSequence(Base):
+    """Счетчик локальных номеров задач шарда (используется только при шардировании)"""
+    __tablename__ = "task_id_seq"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
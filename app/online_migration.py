@@ -0,0 +1,275 @@
+"""Онлайн-миграции больших таблиц.
+
+batch_alter_table пересобирает таблицу одной транзакцией и блокирует БД на все
+время копирования. Здесь копирование идет короткими транзакциями по диапазонам
+первичного ключа, изменения исходной таблицы во время копирования переносятся
+триггерами, а блокировка нужна только на финальную замену таблиц (только SQLite).
+Заполнение новой колонки (backfill) так же идет короткими транзакциями и работает
+на SQLite и PostgreSQL.
+
+Использование в миграции alembic:
+
+    from app.online_migration import OnlineTableRebuild
+
+    def upgrade():
+        with op.get_context().autocommit_block():
+            OnlineTableRebuild(
+                op.get_bind(), "tasks",
+                create_sql="CREATE TABLE {table} (id INTEGER NOT NULL PRIMARY KEY, title VARCHAR NOT NULL, ...)",
+                columns={"id": "id", "title": "title", "priority": "0"},
+            ).run()
+"""
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Sequence, Union
+from sqlalchemy import Connection, Engine, Row, text
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MigrationProgress:
+    table: str
+    stage: str
+    copied: int = 0
+    total: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def percent(self) -> float:
+        return 100.0 * self.copied / self.total if self.total else 100.0
+
+
+ProgressCallback = Callable[[MigrationProgress], None]
+
+
+def log_progress(progress: MigrationProgress):
+    logger.info(
+        "%s: %s %d/%d (%.1f%%) за %.1f с",
+        progress.table, progress.stage, progress.copied, progress.total, progress.percent, progress.elapsed
+    )
+
+
+class _Executor:
+    """Выполнение SQL на соединении в autocommit-режиме с явными транзакциями"""
+
+    def __init__(self, bind: Union[Engine, Connection]):
+        if isinstance(bind, Engine):
+            self.conn = bind.connect().execution_options(isolation_level="AUTOCOMMIT")
+            self.owned = True
+        else:
+            # В autocommit_block() alembic соединение уже в AUTOCOMMIT, повторно уровень не меняется
+            if bind.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+                bind = bind.execution_options(isolation_level="AUTOCOMMIT")
+            self.conn = bind
+            self.owned = False
+
+    def execute(self, sql: str, params: Union[dict, list[dict], None] = None):
+        return self.conn.execute(text(sql), params or {})
+
+    def transaction(self, statements: list[str], params: Union[dict, list[dict], None] = None) -> int:
+        """Выполняет операторы одной транзакцией, возвращает rowcount последнего.
+
+        В SQLite транзакция берет блокировку записи сразу (BEGIN IMMEDIATE).
+        Список params выполняет каждый оператор для всех наборов параметров.
+        """
+        self.execute("BEGIN IMMEDIATE" if self.conn.dialect.name == "sqlite" else "BEGIN")
+        try:
+            rowcount = 0
+            for statement in statements:
+                rowcount = self.execute(statement, params).rowcount
+            self.execute("COMMIT")
+            return rowcount
+        except Exception:
+            self.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        if self.owned:
+            self.conn.close()
+
+
+class OnlineTableRebuild:
+    """Перестройка таблицы через теневую копию.
+
+    1. Создается теневая таблица с новой схемой (create_sql с {table}).
+    2. Триггеры на исходной таблице переносят в тень каждую вставку, изменение и удаление.
+    3. Существующие строки копируются пачками по chunk_size с паузой pause между ними.
+    4. Одной транзакцией удаляются триггеры и индексы, таблицы меняются местами,
+       индексы и триггеры других модулей пересоздаются на новой таблице.
+       Переименование идет с legacy_alter_table=ON и выключенными внешними ключами:
+       иначе SQLite перепишет ссылки других таблиц и триггеров на старую таблицу.
+
+    columns - колонка теневой таблицы -> SQL-выражение над строкой исходной
+    (так же делается заполнение новых колонок). indexes - SQL создания индексов
+    новой таблицы; по умолчанию повторяются индексы исходной.
+    """
+
+    def __init__(self, bind: Union[Engine, Connection], table: str, create_sql: str, columns: dict[str, str],
+                 pk: str = "id", indexes: Optional[list[str]] = None, chunk_size: int = 1000,
+                 pause: float = 0.05, progress: ProgressCallback = log_progress):
+        self.bind = bind
+        self.table = table
+        self.shadow = f"_{table}_new"
+        self.old = f"_{table}_old"
+        self.create_sql = create_sql
+        self.columns = columns
+        self.pk = pk
+        self.indexes = indexes
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.progress = progress
+        self._trigger_names = [f"_{table}_online_{kind}" for kind in ("insert", "update", "delete")]
+
+    def run(self):
+        db = _Executor(self.bind)
+        started = time.monotonic()
+        try:
+            self._create_shadow(db)
+            self._copy(db, started)
+            self._swap(db, started)
+        finally:
+            db.close()
+
+    def _column_lists(self) -> tuple[str, str]:
+        return ", ".join(self.columns), ", ".join(self.columns.values())
+
+    def _create_shadow(self, db: _Executor):
+        target_columns, source_exprs = self._column_lists()
+        copy_row = (
+            f"INSERT OR REPLACE INTO {self.shadow} ({target_columns}) "
+            f"SELECT {source_exprs} FROM {self.table} WHERE {self.pk} = NEW.{self.pk};"
+        )
+        insert_trigger, update_trigger, delete_trigger = self._trigger_names
+
+        db.transaction([
+            # Остатки прерванного запуска
+            *(f"DROP TRIGGER IF EXISTS {name}" for name in self._trigger_names),
+            f"DROP TABLE IF EXISTS {self.shadow}",
+            self.create_sql.format(table=self.shadow),
+            f"CREATE TRIGGER {insert_trigger} AFTER INSERT ON {self.table} BEGIN {copy_row} END",
+            f"CREATE TRIGGER {update_trigger} AFTER UPDATE ON {self.table} BEGIN "
+            f"DELETE FROM {self.shadow} WHERE {self.pk} = OLD.{self.pk} AND OLD.{self.pk} != NEW.{self.pk}; "
+            f"{copy_row} END",
+            f"CREATE TRIGGER {delete_trigger} AFTER DELETE ON {self.table} BEGIN "
+            f"DELETE FROM {self.shadow} WHERE {self.pk} = OLD.{self.pk}; END",
+        ])
+
+    def _copy(self, db: _Executor, started: float):
+        bounds = db.execute(f"SELECT MIN({self.pk}), MAX({self.pk}), COUNT(*) FROM {self.table}").one()
+        low, high, total = bounds
+        progress = MigrationProgress(self.table, "copy", total=total)
+        if low is None:
+            return
+
+        target_columns, source_exprs = self._column_lists()
+        next_chunk = (
+            f"SELECT MAX({self.pk}), COUNT(*) FROM (SELECT {self.pk} FROM {self.table} "
+            f"WHERE {self.pk} > :after ORDER BY {self.pk} LIMIT :limit)"
+        )
+        # OR IGNORE: строки, уже перенесенные триггером, свежее копируемых
+        copy_chunk = (
+            f"INSERT OR IGNORE INTO {self.shadow} ({target_columns}) "
+            f"SELECT {source_exprs} FROM {self.table} WHERE {self.pk} > :after AND {self.pk} <= :upto"
+        )
+
+        # Строки новее high переносят триггеры
+        after = low - 1
+        while after < high:
+            upto, count = db.execute(next_chunk, {"after": after, "limit": self.chunk_size}).one()
+            if upto is None:
+                break
+            db.transaction([copy_chunk], {"after": after, "upto": upto})
+            progress.copied = min(progress.copied + count, total)
+            after = upto
+
+            progress.elapsed = time.monotonic() - started
+            self.progress(progress)
+            time.sleep(self.pause)
+
+    def _swap(self, db: _Executor, started: float):
+        schema = db.execute(
+            "SELECT type, name, sql FROM sqlite_master "
+            "WHERE tbl_name = :table AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+            {"table": self.table}
+        ).all()
+        old_indexes = [(name, sql) for kind, name, sql in schema if kind == "index"]
+        other_triggers = [
+            (name, sql) for kind, name, sql in schema
+            if kind == "trigger" and name not in self._trigger_names
+        ]
+        indexes = self.indexes if self.indexes is not None else [sql for _, sql in old_indexes]
+
+        progress = MigrationProgress(self.table, "swap", elapsed=time.monotonic() - started)
+        self.progress(progress)
+
+        # Прагмы не меняются внутри транзакции, поэтому выставляются вокруг нее
+        foreign_keys = db.execute("PRAGMA foreign_keys").scalar()
+        db.execute("PRAGMA foreign_keys = OFF")
+        db.execute("PRAGMA legacy_alter_table = ON")
+        try:
+            db.transaction(
+                [f"DROP TRIGGER IF EXISTS {name}" for name in self._trigger_names]
+                + [f"DROP TRIGGER IF EXISTS {name}" for name, _ in other_triggers]
+                + [f"DROP INDEX IF EXISTS {name}" for name, _ in old_indexes]
+                + [
+                    f"ALTER TABLE {self.table} RENAME TO {self.old}",
+                    f"ALTER TABLE {self.shadow} RENAME TO {self.table}",
+                ]
+                + indexes
+                + [sql for _, sql in other_triggers]
+            )
+            db.transaction([f"DROP TABLE {self.old}"])
+        finally:
+            db.execute("PRAGMA legacy_alter_table = OFF")
+            db.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+        progress.stage = "done"
+        progress.elapsed = time.monotonic() - started
+        self.progress(progress)
+
+
+
+def backfill(bind: Union[Engine, Connection], table: str, columns: list[str], update_sql: str,
+             compute: Callable[[Sequence[Row]], list[dict[str, Any]]], pk: str = "id",
+             chunk_size: int = 1000, pause: float = 0.05, progress: ProgressCallback = log_progress) -> int:
+    """Заполняет колонки существующих строк короткими транзакциями; возвращает число строк.
+
+    Строки читаются пачками по первичному ключу (pk > :after ORDER BY pk LIMIT chunk_size):
+    pk и columns. compute по строкам пачки возвращает параметры update_sql, и пачка
+    обновляется отдельной транзакцией. compute вызывается по порядку pk, поэтому
+    может хранить состояние между пачками.
+    """
+    db = _Executor(bind)
+    started = time.monotonic()
+    try:
+        total = db.execute(f"SELECT COUNT(*) FROM {table}").scalar()
+        result = MigrationProgress(table, "backfill", total=total)
+        select_chunk = (
+            f"SELECT {', '.join([pk, *columns])} FROM {table} "
+            f"WHERE {pk} > :after ORDER BY {pk} LIMIT :limit"
+        )
+        low = db.execute(f"SELECT MIN({pk}) FROM {table}").scalar()
+        if low is None:
+            return 0
+
+        after = low - 1
+        while True:
+            rows = db.execute(select_chunk, {"after": after, "limit": chunk_size}).all()
+            if not rows:
+                break
+            params = compute(rows)
+            if params:
+                db.transaction([update_sql], params)
+            result.copied = min(result.copied + len(rows), total)
+            after = rows[-1][0]
+
+            result.elapsed = time.monotonic() - started
+            progress(result)
+            if len(rows) < chunk_size:
+                break
+            time.sleep(pause)
+        return result.copied
+    finally:
+        db.close()
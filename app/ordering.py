@@ -0,0 +1,189 @@
+"""Ручной порядок задач: дробные строковые ключи position.
+
+Ключ - целая часть (первый символ задает ее длину и знак) и дробная часть в
+системе счисления по основанию 36. Ключи сравниваются как строки, поэтому
+между любыми двумя всегда есть третий, и перемещение задачи - обновление одной
+строки. Добавление в конец увеличивает целую часть (длина растет логарифмически),
+частые вставки в одно место удлиняют дробную часть - такие списки фоновое
+задание перенумеровывает короткими ключами.
+
+Алфавит только из цифр и строчных букв: порядок одинаков и в SQLite, и в
+локалях PostgreSQL.
+"""
+import asyncio
+import logging
+import time
+from typing import Optional
+from . import leases
+from .config import SessionLocal, get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+INTEGER_ZERO = "n0"
+SMALLEST_INTEGER = "a" + DIGITS[0] * 13
+# Ключи длиннее перенумеровываются; то же число - в частичном индексе ix_tasks_long_position
+REBALANCE_KEY_LENGTH = 12
+
+
+def _integer_length(head: str) -> int:
+    if "n" <= head <= "z":
+        return ord(head) - ord("n") + 2
+    if "a" <= head <= "m":
+        return ord("m") - ord(head) + 2
+    raise ValueError(f"Неверный ключ порядка: {head!r}")
+
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Неверный ключ порядка: {key!r}")
+    return key[:length]
+
+
+def _validate(key: str):
+    if key == SMALLEST_INTEGER:
+        raise ValueError(f"Неверный ключ порядка: {key!r}")
+    integer = _integer_part(key)
+    if key[len(integer):].endswith(DIGITS[0]):
+        raise ValueError(f"Неверный ключ порядка: {key!r}")
+
+
+def _increment_integer(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[i]) + 1
+        if digit < BASE:
+            digits[i] = DIGITS[digit]
+            return head + "".join(digits)
+        digits[i] = DIGITS[0]
+
+    if head == "m":
+        return INTEGER_ZERO
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "n":
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _decrement_integer(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        digit = DIGITS.index(digits[i]) - 1
+        if digit >= 0:
+            digits[i] = DIGITS[digit]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+
+    if head == "n":
+        return "m" + DIGITS[-1]
+    if head == "a":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "m":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """Дробная часть строго между a и b (b=None - без верхней границы)"""
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else BASE
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def key_between(a: Optional[str], b: Optional[str]) -> str:
+    """Ключ строго между a и b; None - начало или конец списка"""
+    if a is not None:
+        _validate(a)
+    if b is not None:
+        _validate(b)
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"Ключи порядка не по возрастанию: {a!r} >= {b!r}")
+
+    if a is None:
+        if b is None:
+            return INTEGER_ZERO
+        integer = _integer_part(b)
+        fraction = b[len(integer):]
+        if integer == SMALLEST_INTEGER:
+            return integer + _midpoint("", fraction)
+        if integer < b:
+            return integer
+        decremented = _decrement_integer(integer)
+        if decremented is None:
+            raise ValueError("Нет ключа перед наименьшим")
+        return decremented
+
+    integer = _integer_part(a)
+    fraction = a[len(integer):]
+    if b is None:
+        incremented = _increment_integer(integer)
+        return incremented if incremented is not None else integer + _midpoint(fraction, None)
+
+    integer_b = _integer_part(b)
+    if integer == integer_b:
+        return integer + _midpoint(fraction, b[len(integer_b):])
+    incremented = _increment_integer(integer)
+    if incremented is not None and incremented < b:
+        return incremented
+    return integer + _midpoint(fraction, None)
+
+
+def sequential_keys(count: int) -> list[str]:
+    """count коротких возрастающих ключей (для перенумерации)"""
+    keys = []
+    key = INTEGER_ZERO
+    for _ in range(count):
+        keys.append(key)
+        key = _increment_integer(key)
+    return keys
+
+
+def rebalance_positions() -> int:
+    """Перенумеровывает списки пользователей с длинными ключами; возвращает число списков"""
+    from . import crud
+
+    total = 0
+    while True:
+        with SessionLocal() as db:
+            user_ids = crud.get_users_with_long_positions(db, REBALANCE_KEY_LENGTH, settings.position_rebalance_batch_size)
+        for user_id in user_ids:
+            with SessionLocal() as db:
+                crud.rebalance_positions(db, user_id)
+        total += len(user_ids)
+        if len(user_ids) < settings.position_rebalance_batch_size:
+            return total
+        time.sleep(settings.position_rebalance_batch_pause)
+
+
+async def run_rebalancing():
+    """Фоновая перенумерация длинных ключей порядка"""
+    while True:
+        await asyncio.sleep(settings.position_rebalance_interval_minutes * 60)
+        try:
+            rebalanced = await leases.run_exclusive("position-rebalancing", rebalance_positions)
+            if rebalanced:
+                logger.info("Перенумерованы списки задач: %d", rebalanced)
+        except Exception:
+            logger.exception("Ошибка перенумерации порядка задач")
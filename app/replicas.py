@@ -0,0 +1,195 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import Engine, Select, event, text
+from sqlalchemy.orm import Session
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class ReadScope:
+    """Чтения одного HTTP-запроса или обновления бота.
+
+    После записи в любой сессии области все следующие чтения идут на primary,
+    чтобы пользователь сразу видел свои изменения. Область - изменяемый объект:
+    контекстные переменные копируются в потоки threadpool и задачи, и флаг,
+    выставленный в копии, иначе не виден остальному запросу.
+    """
+
+    __slots__ = ("pinned",)
+
+    def __init__(self, pinned: bool = False):
+        self.pinned = pinned
+
+
+current_read_scope: ContextVar[Optional[ReadScope]] = ContextVar("current_read_scope", default=None)
+
+
+# Флаг в Session.info: сессия изменяет данные и читает их только с primary
+USE_PRIMARY = "use_primary"
+
+
+def primary_pinned() -> bool:
+    scope = current_read_scope.get()
+    return scope is not None and scope.pinned
+
+
+@contextmanager
+def read_scope():
+    """Открывает область read-your-writes (HTTP-запрос, обновление бота)"""
+    token = current_read_scope.set(ReadScope())
+    try:
+        yield
+    finally:
+        current_read_scope.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока идут на primary"""
+    token = current_read_scope.set(ReadScope(pinned=True))
+    try:
+        yield
+    finally:
+        current_read_scope.reset(token)
+
+
+class ReadScopeMiddleware:
+    """ASGI-middleware: одна область read-your-writes на HTTP-запрос или WebSocket"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        with read_scope():
+            await self.app(scope, receive, send)
+
+
+class ReplicaPool:
+    """Реплики для чтения: round-robin по живым.
+
+    Реплика исключается при ошибке соединения в запросе и возвращается после
+    успешной проверки, которую фоновая задача (monitor) выполняет раз в check_interval.
+    """
+
+    def __init__(self, engines: list[Engine], check_interval: float):
+        self.engines = engines
+        self.check_interval = check_interval
+        self._healthy = {engine: True for engine in engines}
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+        self._counter = itertools.count()
+        self._monitor: asyncio.Task | None = None
+        for engine in engines:
+            event.listen(engine, "handle_error", self._on_error)
+
+    def choose(self) -> Optional[Engine]:
+        if self._monitor is None:
+            # Без фоновой проверки (скрипты tools/) проверяем по ходу чтений
+            self._maybe_check()
+        healthy = [engine for engine in self.engines if self._healthy[engine]]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    def mark_failed(self, engine: Engine):
+        if self._healthy.get(engine):
+            logger.warning("Реплика %s недоступна", engine.url)
+        self._healthy[engine] = False
+
+    def check(self):
+        """Проверяет все реплики; один поток за раз, остальные не ждут"""
+        if not self._check_lock.acquire(blocking=False):
+            return
+        try:
+            for engine in self.engines:
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text("SELECT 1"))
+                    if not self._healthy[engine]:
+                        logger.info("Реплика %s снова доступна", engine.url)
+                    self._healthy[engine] = True
+                except Exception:
+                    self.mark_failed(engine)
+            self._checked_at = time.monotonic()
+        finally:
+            self._check_lock.release()
+
+    def _maybe_check(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            self.check()
+
+    def _on_error(self, context):
+        # Ошибки SQL (синтаксис, ограничения) - не повод исключать реплику
+        dbapi = context.dialect.loaded_dbapi
+        if context.is_disconnect or isinstance(context.original_exception, dbapi.OperationalError):
+            self.mark_failed(context.engine)
+
+    async def _run_monitor(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.check)
+            except Exception:
+                logger.exception("Ошибка проверки реплик")
+            await asyncio.sleep(self.check_interval)
+
+    @asynccontextmanager
+    async def monitor(self):
+        """Фоновая проверка здоровья реплик на время работы приложения или бота"""
+        if self._monitor is not None:
+            yield
+            return
+        self._monitor = asyncio.create_task(self._run_monitor(), name="replica-health")
+        try:
+            yield
+        finally:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+
+
+class RoutingSession(Session):
+    """Сессия, отправляющая чтения на реплики, а запись - на primary.
+
+    После первой записи сессия и текущая область чтений (ReadScope)
+    закрепляются за primary.
+    """
+
+    def __init__(self, primary: Engine, replicas: ReplicaPool, **kwargs):
+        kwargs["bind"] = primary
+        super().__init__(**kwargs)
+        self.primary = primary
+        self.replicas = replicas
+        self.wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.wrote or self._flushing or self.info.get(USE_PRIMARY) or primary_pinned():
+            return self.primary
+        if not isinstance(clause, Select):
+            # INSERT/UPDATE/DELETE и произвольный SQL
+            self._pin()
+            return self.primary
+        return self.replicas.choose() or self.primary
+
+    def _pin(self):
+        self.wrote = True
+        scope = current_read_scope.get()
+        if scope is not None:
+            scope.pinned = True
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _pin_after_flush(session, flush_context):
+    session._pin()
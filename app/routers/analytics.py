@@ -0,0 +1,55 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app import analytics, schemas
+from app.routers.tasks import get_db
+
+router = APIRouter(
+    prefix="/tasks/analytics",
+    tags=["analytics"]
+)
+
+DEFAULT_PERIOD_DAYS = 30
+MAX_PERIOD_DAYS = 366
+
+
+def parse_period(
+    since: Optional[date] = Query(None, alias="from", description="Первый день (UTC), по умолчанию 30 дней назад"),
+    until: Optional[date] = Query(None, alias="to", description="Последний день (UTC), по умолчанию сегодня")
+) -> tuple[date, date]:
+    until = until or datetime.now(timezone.utc).date()
+    since = since or until - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    if since > until or (until - since).days >= MAX_PERIOD_DAYS:
+        raise HTTPException(status_code=422, detail=f"Период - от 1 до {MAX_PERIOD_DAYS} дней")
+    return since, until
+
+
+@router.get(
+    "/daily",
+    response_model=list[schemas.DailyStats],
+    summary="Создано и выполнено задач по дням"
+)
+def get_daily(period: tuple[date, date] = Depends(parse_period), user_id: Optional[int] = None,
+              db: Session = Depends(get_db)):
+    return analytics.get_daily(db, *period, user_id=user_id)
+
+
+@router.get(
+    "/users",
+    response_model=list[schemas.UserStats],
+    summary="Пользователи с наибольшим числом выполненных задач"
+)
+def get_top_users(period: tuple[date, date] = Depends(parse_period), limit: int = Query(20, ge=1, le=100),
+                  db: Session = Depends(get_db)):
+    return analytics.get_top_users(db, *period, limit=limit)
+
+
+@router.get(
+    "/completers",
+    response_model=list[schemas.CompleterStats],
+    summary="Кто выполняет задачи (done_by)"
+)
+def get_completers(period: tuple[date, date] = Depends(parse_period), limit: int = Query(20, ge=1, le=100),
+                   db: Session = Depends(get_db)):
+    return analytics.get_completers(db, *period, limit=limit)
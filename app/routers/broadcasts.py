@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, Query
+from app import broadcasts, schemas
+
+router = APIRouter(
+    prefix="/broadcasts",
+    tags=["broadcasts"]
+)
+
+
+@router.get(
+    "/",
+    response_model=list[schemas.BroadcastProgress],
+    summary="Последние рассылки с прогрессом"
+)
+def get_broadcasts(limit: int = Query(20, ge=1, le=100)):
+    return [broadcasts.progress(broadcast) for broadcast in broadcasts.list_broadcasts(limit)]
+
+
+@router.get(
+    "/{broadcast_id}",
+    response_model=schemas.BroadcastProgress,
+    summary="Прогресс и оценка времени рассылки"
+)
+def get_broadcast(broadcast_id: int):
+    broadcast = broadcasts.get_broadcast(broadcast_id)
+    if broadcast is None:
+        raise HTTPException(status_code=404, detail="Рассылка не найдена")
+    return broadcasts.progress(broadcast)
@@ -0,0 +1,24 @@
+from fastapi import APIRouter
+from app.event_relay import change_relay, relay_enabled
+from app.history import history_writer
+from app.singleflight import single_flight
+from app.telegram_bot import runner
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"]
+)
+
+
+@router.get(
+    "/",
+    summary="Внутренние метрики сервиса"
+)
+def get_stats():
+    return {
+        "single_flight": single_flight.stats(),
+        "history": history_writer.stats(),
+        "events_relay": change_relay.stats() if relay_enabled() else None,
+        # Бот в этом процессе (режим combined); у отдельного воркера - своя очередь
+        "bot": runner.runtime.stats() if runner.runtime else None,
+    }
@@ -1,11 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.requests import HTTPConnection
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
+from typing import Optional
 from app import crud, schemas
-from app.config import SessionLocal
+from app.config import SessionLocal, get_settings
+from app.events import change_bus
+from app.history import history_writer
+from app.idempotency import IdempotencyKeyInUse, IdempotencyKeyMismatch, fingerprint, idempotency_store
+from app.logging_setup import bind_log_context
+from app.telegram_bot.live_sync import live_sync
+
+settings = get_settings()
+
+BATCH_MAX_IDS = 500
+
+
+async def bind_request_log_context(connection: HTTPConnection):
+    """Добавляет task_id и user_id запроса к записям лога"""
+    task_id = connection.path_params.get("task_id")
+    user_id = connection.query_params.get("user_id")
+    bind_log_context(
+        task_id=int(task_id) if task_id and task_id.isdigit() else None,
+        user_id=int(user_id) if user_id and user_id.isdigit() else None
+    )
+
+
+def parse_fields(
+    fields: Optional[str] = Query(None, description="Поля через запятую, например id,done; id возвращается всегда")
+) -> Optional[tuple[str, ...]]:
+    """Поля для выборки: SELECT читает только их"""
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in crud.TASK_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Неизвестные поля: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(["id", *names]))
+
+
+def parse_ids(ids: list[str] = Query(..., description="ID через запятую или повтором параметра")) -> list[int]:
+    try:
+        task_ids = [int(task_id) for value in ids for task_id in value.split(",") if task_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ID задач должны быть числами")
+    if not task_ids or len(task_ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"Нужно от 1 до {BATCH_MAX_IDS} ID")
+    return task_ids
+
 
 router = APIRouter(
     prefix="/tasks",
-    tags=["tasks"]
+    tags=["tasks"],
+    dependencies=[Depends(bind_request_log_context)]
 )
 
 
@@ -23,17 +73,155 @@ def get_db():
     status_code=status.HTTP_201_CREATED,
     summary="Создать задачу"
 )
-def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db)):
-    return crud.create_task(db, task)
+def create_task(task: schemas.TaskCreate, db: Session = Depends(get_db),
+                idempotency_key: Optional[str] = Header(None, max_length=255)):
+    if idempotency_key is None:
+        return crud.create_task(db, task)
+
+    key = f"POST /tasks/:{idempotency_key}"
+    request_fingerprint = fingerprint(task.model_dump_json())
+    try:
+        stored = idempotency_store.begin(key, request_fingerprint)
+    except IdempotencyKeyInUse:
+        raise HTTPException(status_code=409, detail="Запрос с этим Idempotency-Key еще выполняется")
+    except IdempotencyKeyMismatch:
+        raise HTTPException(status_code=422, detail="Idempotency-Key уже использован для другого запроса")
+
+    if stored is not None:
+        # Повтор: отдаем сохраненный ответ, не создавая задачу
+        return Response(
+            content=stored.body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"}
+        )
+
+    try:
+        created = schemas.TaskInDB.model_validate(crud.create_task(db, task))
+    except Exception:
+        idempotency_store.release(key)
+        raise
+    idempotency_store.complete(key, request_fingerprint, status.HTTP_201_CREATED, created.model_dump_json())
+    return created
 
 
 @router.get(
     "/",
     response_model=list[schemas.TaskInDB],
-    summary="Получить список всех задач"
+    summary="Получить список задач пользователя"
+)
+def get_all_tasks(user_id: int, fields: Optional[tuple[str, ...]] = Depends(parse_fields),
+                  db: Session = Depends(get_db)):
+    if fields:
+        return JSONResponse(jsonable_encoder(crud.get_tasks_fields_coalesced(db, user_id, fields)))
+    return crud.get_tasks_coalesced(db, user_id)
+
+
+@router.get(
+    "/batch",
+    response_model=list[schemas.TaskInDB],
+    summary="Получить несколько задач по ID одним запросом"
+)
+def get_tasks_batch(task_ids: list[int] = Depends(parse_ids),
+                    fields: Optional[tuple[str, ...]] = Depends(parse_fields),
+                    db: Session = Depends(get_db)):
+    """Найденные задачи в порядке ids; отсутствующие пропускаются"""
+    tasks = crud.get_task_fields(db, task_ids, fields or tuple(crud.TASK_FIELDS))
+    return JSONResponse(jsonable_encoder(tasks))
+
+
+@router.get(
+    "/trash",
+    response_model=list[schemas.TaskInDB],
+    summary="Получить задачи в корзине"
+)
+def get_trash(user_id: int, db: Session = Depends(get_db)):
+    return crud.get_deleted_tasks(db, user_id)
+
+
+@router.get(
+    "/archive",
+    response_model=list[schemas.TaskArchived],
+    summary="Получить архив выполненных задач"
+)
+def get_archive(user_id: int, limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0),
+                db: Session = Depends(get_db)):
+    return crud.get_archived_tasks(db, user_id, limit=limit, offset=offset)
+
+
+@router.get(
+    "/archive/{task_id}",
+    response_model=schemas.TaskArchived,
+    summary="Получить задачу из архива по ID"
+)
+def get_archived_task(task_id: int, db: Session = Depends(get_db)):
+    task = crud.get_archived_task(db, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена в архиве")
+    return task
+
+
+@router.get(
+    "/events",
+    summary="Поток изменений задач (Server-Sent Events)"
 )
-def get_all_tasks(db: Session = Depends(get_db)):
-    return crud.get_tasks(db)
+async def stream_events(
+    request: Request,
+    user_id: Optional[int] = None,
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID")
+):
+    subscription = change_bus.subscribe(user_id, last_event_id)
+
+    async def event_stream():
+        try:
+            if subscription.gap:
+                yield "event: reset\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscription.get(), settings.events_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                dropped = subscription.take_dropped()
+                if dropped:
+                    yield f"event: overflow\ndata: {json.dumps({'dropped': dropped})}\n\n"
+                yield f"id: {event.id}\nevent: {event.type}\ndata: {json.dumps(event.to_dict())}\n\n"
+        finally:
+            change_bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def events_websocket(websocket: WebSocket, user_id: Optional[int] = None,
+                           last_event_id: Optional[int] = None):
+    """Поток изменений задач через WebSocket"""
+    await websocket.accept()
+    subscription = change_bus.subscribe(user_id, last_event_id)
+
+    try:
+        if subscription.gap:
+            await websocket.send_json({"type": "reset"})
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.events_keepalive_seconds)
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "ping"})
+                continue
+
+            dropped = subscription.take_dropped()
+            if dropped:
+                await websocket.send_json({"type": "overflow", "dropped": dropped})
+            await websocket.send_json(event.to_dict())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        change_bus.unsubscribe(subscription)
 
 
 @router.get(
@@ -41,20 +229,60 @@ def get_all_tasks(db: Session = Depends(get_db)):
     response_model=schemas.TaskInDB,
     summary="Получить задачу по ID"
 )
-def get_task(task_id: int, db: Session = Depends(get_db)):
+def get_task(task_id: int, fields: Optional[tuple[str, ...]] = Depends(parse_fields),
+             db: Session = Depends(get_db)):
+    if fields:
+        tasks = crud.get_task_fields(db, [task_id], fields)
+        if not tasks:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        return JSONResponse(jsonable_encoder(tasks[0]))
     task = crud.get_task(db, task_id)
     if task is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
     return task
 
 
+@router.get(
+    "/{task_id}/history",
+    response_model=list[schemas.TaskEventOut],
+    summary="История изменений задачи"
+)
+def get_task_history(task_id: int, user_id: int, limit: int = Query(50, ge=1, le=200),
+                     before_id: Optional[int] = None, db: Session = Depends(get_db)):
+    """Сначала новые события; before_id - id последнего события предыдущей страницы"""
+    # События этого процесса, еще не записанные фоновой задачей
+    history_writer.flush()
+    events = crud.get_task_events(db, task_id, user_id, limit, before_id)
+    if not events and before_id is None:
+        task = crud.get_task(db, task_id)
+        if task is None or task.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+    return events
+
+
 @router.patch(
     "/{task_id}",
     response_model=schemas.TaskInDB,
-    summary="Переименовать задачу"
+    summary="Изменить задачу: название, срок, напоминание"
 )
 def update_task(task_id: int, update: schemas.TaskUpdate, db: Session = Depends(get_db)):
     task = crud.update_task(db, task_id, update)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    live_sync.notify(task.user_id, task.id)
+    return task
+
+
+@router.patch(
+    "/{task_id}/move",
+    response_model=schemas.TaskInDB,
+    summary="Переместить задачу в списке"
+)
+def move_task(task_id: int, move: schemas.TaskMove, db: Session = Depends(get_db)):
+    try:
+        task = crud.move_task(db, task_id, after_id=move.after_id, before_id=move.before_id)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     if task is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
     return task
@@ -66,9 +294,11 @@ def update_task(task_id: int, update: schemas.TaskUpdate, db: Session = Depends(
     summary="Удалить задачу"
 )
 def delete_task(task_id: int, db: Session = Depends(get_db)):
-    task = crud.delete_task(db, task_id)
-    if task is None:
+    deleted = crud.delete_task(db, task_id)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    _, user_id = deleted
+    live_sync.notify(user_id, task_id)
     return None
 
 
@@ -78,10 +308,11 @@ def delete_task(task_id: int, db: Session = Depends(get_db)):
     summary="Отметить задачу: выполнено",
     status_code=status.HTTP_200_OK
 )
-def complete_task(task_id: int, db: Session = Depends(get_db)):
-    task = crud.mark_task_done(db, task_id)
+def complete_task(task_id: int, done_by: Optional[str] = None, db: Session = Depends(get_db)):
+    task = crud.mark_task_done(db, task_id, done_by=done_by)
     if task is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    live_sync.notify(task.user_id, task.id)
     return task
 
 
@@ -95,4 +326,18 @@ def undo_task(task_id: int, db: Session = Depends(get_db)):
     task = crud.mark_task_undone(db, task_id)
     if task is None:
         raise HTTPException(status_code=404, detail="Задача не найдена")
+    live_sync.notify(task.user_id, task.id)
+    return task
+
+
+@router.put(
+    "/{task_id}/restore",
+    response_model=schemas.TaskInDB,
+    summary="Восстановить задачу из корзины",
+    status_code=status.HTTP_200_OK
+)
+def restore_task(task_id: int, db: Session = Depends(get_db)):
+    task = crud.restore_task(db, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена в корзине")
     return task
@@ -1,11 +1,14 @@
+from datetime import date, datetime
 from pydantic import BaseModel
-from typing import Optional
+from typing import NamedTuple, Optional
 
 
 class TaskBase(BaseModel):
     title: str
     done: bool = False
     done_by: Optional[str] = None
+    due_at: Optional[datetime] = None
+    remind_at: Optional[datetime] = None
 
 
 class TaskCreate(TaskBase):
@@ -15,10 +18,88 @@ class TaskCreate(TaskBase):
 class TaskUpdate(BaseModel):
     title: Optional[str] = None
     done: Optional[bool] = None
+    # Переданный null снимает срок или напоминание, отсутствующее поле не меняет их
+    due_at: Optional[datetime] = None
+    remind_at: Optional[datetime] = None
 
 
 class TaskInDB(TaskBase):
     id: int
+    position: Optional[str] = None
 
     class Config:
         from_attributes = True
+
+
+class TaskView(NamedTuple):
+    """Задача для отображения: только нужные колонки, без ORM-объекта"""
+    id: int
+    title: str
+    done: bool
+    done_by: Optional[str]
+    due_at: Optional[datetime] = None
+    position: Optional[str] = None
+
+
+class TaskMove(BaseModel):
+    """Новое место задачи: после after_id и/или перед before_id"""
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+
+
+class Reminder(NamedTuple):
+    """Напоминание, которое нужно отправить"""
+    task_id: int
+    user_id: int
+    title: str
+    due_at: Optional[datetime]
+
+
+class TaskArchived(TaskInDB):
+    archived_at: Optional[datetime] = None
+
+
+class BroadcastProgress(BaseModel):
+    id: int
+    kind: str
+    key: str
+    status: str
+    total: int
+    processed: int
+    sent: int
+    failed: int
+    last_user_id: Optional[int] = None
+    started_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+    percent: float
+    rate_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
+
+
+class DailyStats(BaseModel):
+    day: date
+    created: int
+    completed: int
+    reopened: int
+    completion_rate: Optional[float] = None  # выполнено / создано за день
+
+
+class UserStats(BaseModel):
+    user_id: int
+    created: int
+    completed: int
+    completion_rate: Optional[float] = None
+
+
+class CompleterStats(BaseModel):
+    done_by: str
+    completed: int
+
+
+class TaskEventOut(BaseModel):
+    id: int
+    type: str
+    user_id: Optional[int] = None
+    changes: Optional[dict[str, list]] = None  # {"поле": [старое значение, новое]}
+    created_at: datetime
@@ -0,0 +1,142 @@
+import zlib
+from typing import Any, Callable, Iterable, Optional
+from sqlalchemy import Column, Engine, delete, event, insert
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import ORMExecuteState, sessionmaker
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+# Глобальный ID задачи кодирует шард: id = local_seq * MAX_SHARDS + shard_index
+MAX_SHARDS = 1024
+
+# Таблицы, чей первичный ключ - глобальный ID задачи
+SHARDED_ID_TABLES = {"tasks", "tasks_archive"}
+
+
+def make_task_id(local_id: int, shard_index: int) -> int:
+    return local_id * MAX_SHARDS + shard_index
+
+
+def shard_index_of_id(task_id: int) -> int:
+    return task_id % MAX_SHARDS
+
+
+def shard_index_for_user(user_id: int, shard_count: int) -> int:
+    return zlib.crc32(str(user_id).encode()) % shard_count
+
+
+class ShardRouter:
+    """Распределяет задачи по нескольким БД по хешу Telegram user_id.
+
+    Сессии - ShardedSession: запросы по user_id или id задачи уходят в один
+    шард, запросы без этих условий выполняются во всех шардах.
+    """
+
+    def __init__(self, urls: list[str], engine_factory: Callable[[str], Engine]):
+        if not 0 < len(urls) <= MAX_SHARDS:
+            raise ValueError(f"Количество шардов должно быть от 1 до {MAX_SHARDS}")
+        self.engines: dict[str, Engine] = {str(i): engine_factory(url) for i, url in enumerate(urls)}
+        self._index_by_engine = {engine: int(shard_id) for shard_id, engine in self.engines.items()}
+
+    @property
+    def shard_count(self) -> int:
+        return len(self.engines)
+
+    def shard_for_user(self, user_id: int) -> str:
+        return str(shard_index_for_user(user_id, self.shard_count))
+
+    def shard_for_task(self, task_id: int) -> Optional[str]:
+        shard_id = str(shard_index_of_id(task_id))
+        return shard_id if shard_id in self.engines else None
+
+    def engine_for_user(self, user_id: int) -> Engine:
+        return self.engines[self.shard_for_user(user_id)]
+
+    def session_factory(self, **kwargs: Any) -> sessionmaker:
+        return sessionmaker(
+            class_=ShardedSession,
+            shards=self.engines,
+            shard_chooser=self._choose_for_instance,
+            identity_chooser=self._choose_for_identity,
+            execute_chooser=self._choose_for_statement,
+            **kwargs
+        )
+
+    def install_id_generator(self, base):
+        """Назначает глобальные ID новым задачам перед вставкой"""
+
+        @event.listens_for(base, "before_insert", propagate=True)
+        def assign_task_id(mapper, connection, target):
+            if mapper.local_table.name not in SHARDED_ID_TABLES or target.id is not None:
+                return
+            from app.models import TaskIdSequence
+            task_id_seq = TaskIdSequence.__table__
+
+            shard_index = self._index_by_engine[connection.engine]
+            local_id = connection.execute(insert(task_id_seq)).inserted_primary_key[0]
+            # AUTOINCREMENT не переиспользует номера, поэтому прошлые строки счетчика не нужны
+            connection.execute(delete(task_id_seq).where(task_id_seq.c.id < local_id))
+            target.id = make_task_id(local_id, shard_index)
+
+    def _choose_for_instance(self, mapper, instance, clause=None) -> str:
+        user_id = getattr(instance, "user_id", None)
+        if user_id is not None:
+            return self.shard_for_user(user_id)
+        task_id = getattr(instance, "id", None)
+        if task_id is not None and self.shard_for_task(task_id):
+            return self.shard_for_task(task_id)
+        raise ValueError(f"Невозможно выбрать шард для {instance!r}: нет user_id")
+
+    def _choose_for_identity(self, mapper, primary_key, **kwargs) -> list[str]:
+        if mapper.local_table.name in SHARDED_ID_TABLES:
+            shard_id = self.shard_for_task(primary_key[0])
+            if shard_id:
+                return [shard_id]
+        return list(self.engines)
+
+    def _choose_for_statement(self, orm_context: ORMExecuteState) -> Iterable[str]:
+        if orm_context.is_select and orm_context.lazy_loaded_from is not None:
+            return [orm_context.lazy_loaded_from.identity_token]
+
+        comparisons = _comparisons(orm_context.statement)
+        if comparisons is None:
+            return list(self.engines)
+
+        shards: set[str] = set()
+        for column, values in comparisons:
+            if column.key == "user_id":
+                shards.update(self.shard_for_user(value) for value in values)
+            elif (column.key == "id" and column.table.name in SHARDED_ID_TABLES) or column.key == "task_id":
+                shards.update(filter(None, (self.shard_for_task(value) for value in values)))
+            else:
+                continue
+            # Используем первое подходящее условие: остальные могут только сузить выборку
+            break
+        return shards or list(self.engines)
+
+
+def _comparisons(statement) -> Optional[list[tuple[Column, list]]]:
+    """Условия вида column == value и column IN (...) из WHERE запроса.
+
+    Возвращает None, если в условии есть OR: тогда шард по нему не определить.
+    """
+    where = getattr(statement, "whereclause", None)
+    if where is None:
+        return []
+
+    comparisons = []
+    for element in visitors.iterate(where):
+        if isinstance(element, BooleanClauseList) and element.operator is operators.or_:
+            return None
+        if not isinstance(element, BinaryExpression):
+            continue
+        if not isinstance(element.left, Column) or not isinstance(element.right, BindParameter):
+            continue
+        value = element.right.effective_value
+        if value is None:
+            continue
+        if element.operator is operators.eq:
+            comparisons.append((element.left, [value]))
+        elif element.operator is operators.in_op:
+            comparisons.append((element.left, list(value)))
+    return comparisons
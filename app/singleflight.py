@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных запросов.
+
+    Первый вызов с ключом выполняет функцию, остальные вызовы с тем же ключом,
+    пришедшие до ее завершения, ждут и получают тот же результат (или исключение).
+    Синхронные вызовы (пул потоков FastAPI) и асинхронные (бот) делят одни и те же
+    выполняющиеся запросы.
+    """
+
+    def __init__(self):
+        self._flights: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.collapsed = 0
+
+    def _join(self, key: Hashable) -> tuple[Future, bool]:
+        """Возвращает выполняющийся запрос по ключу или регистрирует новый (второй элемент - True)"""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.collapsed += 1
+                return future, False
+            future = Future()
+            self._flights[key] = future
+            self.executed += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, fn: Callable[[], T]) -> T:
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        return self._finish(key, future, fn)
+
+    async def do_async(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Как do(), но функция выполняется в потоке, не блокируя цикл событий"""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        return await asyncio.to_thread(self._finish, key, future, fn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "collapsed": self.collapsed,
+                "in_flight": len(self._flights),
+            }
+
+
+single_flight = SingleFlight()
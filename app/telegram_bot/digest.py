@@ -0,0 +1,127 @@
+"""Утренний дайджест: сводка открытых задач каждому пользователю.
+
+Сводки считаются одним сгруппированным запросом по пачкам пользователей
+(по возрастанию user_id), сообщения пачки отправляются параллельно через общий
+ограничитель частоты. После пачки в таблицу broadcasts пишется контрольная
+точка, поэтому после сбоя рассылка продолжается с места остановки и повторно
+отправляет не больше одной пачки.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+from aiogram import Bot
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from app import broadcasts, crud
+from app.config import SessionLocal, get_settings
+from app.telegram_bot.ratelimit import send_limited
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+DIGEST_KIND = "digest"
+ERROR_RETRY_DELAY = 60.0
+
+
+def digest_text(day: datetime, open_count: int) -> str:
+    return f"📋 <b>Список задач на {day:%d.%m.%Y}:</b> открыто {open_count}"
+
+
+def digest_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="📋 Открыть список", callback_data="list_tasks")
+    ]])
+
+
+def _load_chunk(after_user_id: Optional[int], limit: int) -> list[tuple[int, int]]:
+    with SessionLocal() as db:
+        return crud.get_open_task_counts(db, after_user_id, limit)
+
+
+def _count_users() -> int:
+    with SessionLocal() as db:
+        return crud.count_users_with_open_tasks(db)
+
+
+async def run_digest(bot: Bot, day: datetime) -> Optional[dict]:
+    """Рассылает (или продолжает) дайджест за день; None - рассылку ведет другой процесс или она завершена"""
+    broadcast = await asyncio.to_thread(broadcasts.claim, DIGEST_KIND, day.date().isoformat())
+    if broadcast is None:
+        return None
+    if not broadcast["total"]:
+        await asyncio.to_thread(broadcasts.set_total, broadcast, await asyncio.to_thread(_count_users))
+
+    semaphore = asyncio.Semaphore(settings.digest_concurrency)
+    keyboard = digest_keyboard()
+
+    async def send(user_id: int, open_count: int) -> bool:
+        async with semaphore:
+            return await send_limited(bot, user_id, digest_text(day, open_count), reply_markup=keyboard) is not None
+
+    cursor = broadcast["last_user_id"]
+    while True:
+        chunk = await asyncio.to_thread(_load_chunk, cursor, settings.digest_chunk_size)
+        if not chunk:
+            break
+        results = await asyncio.gather(*(send(user_id, open_count) for user_id, open_count in chunk))
+        cursor = chunk[-1][0]
+        sent = sum(results)
+        await asyncio.to_thread(broadcasts.save_progress, broadcast, cursor, len(chunk), sent, len(chunk) - sent)
+
+    await asyncio.to_thread(broadcasts.finish, broadcast)
+    result = await asyncio.to_thread(broadcasts.get_broadcast, broadcast["id"])
+    logger.info("Дайджест за %s отправлен: %d из %d", day.date(), result["sent"], result["processed"])
+    return result
+
+
+class DigestScheduler:
+    """Запускает дайджест раз в день в digest_hour по часовому поясу бота"""
+
+    def __init__(self, hour: int):
+        self.hour = hour
+        self._task: asyncio.Task | None = None
+
+    async def start(self, bot: Bot):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(bot), name="digest")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, bot: Bot):
+        from app.telegram_bot.handlers import BOT_TZ
+
+        while True:
+            now = datetime.now(BOT_TZ)
+            start_at = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+            if now < start_at:
+                await asyncio.sleep((start_at - now).total_seconds())
+                continue
+
+            try:
+                await run_digest(bot, now)
+            except broadcasts.BroadcastLeaseLost:
+                logger.warning("Дайджест за %s продолжил другой процесс", now.date())
+            except Exception:
+                logger.exception("Ошибка рассылки дайджеста")
+                await asyncio.sleep(ERROR_RETRY_DELAY)
+                continue
+
+            state = await asyncio.to_thread(broadcasts.find_broadcast, DIGEST_KIND, now.date().isoformat())
+            next_day = start_at + timedelta(days=1)
+            if state and state["status"] != broadcasts.STATUS_DONE:
+                # Рассылку ведет другой процесс: проверим, не брошена ли она, после истечения аренды
+                delay = min(settings.broadcast_lease_seconds, (next_day - now).total_seconds())
+            else:
+                delay = (next_day - datetime.now(BOT_TZ)).total_seconds()
+            await asyncio.sleep(max(delay, 1.0))
+
+
+digest_scheduler = DigestScheduler(settings.digest_hour)
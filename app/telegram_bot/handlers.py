@@ -1,5 +1,8 @@
 import asyncio
-from datetime import datetime
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
 from aiogram import Router, types
 from aiogram.filters import Command, BaseFilter
 from aiogram.fsm.context import FSMContext
@@ -8,15 +11,17 @@ from html import escape
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 import logging
 from app import crud, schemas
-from app.config import SessionLocal
+from app.config import SessionLocal, get_settings
+from app.telegram_bot.task_messages import task_message_store
+from app.telegram_bot.write_behind import toggle_queue
 from aiogram.exceptions import TelegramBadRequest, TelegramAPIError
 from time import time
 from typing import Optional
 
 router = Router()
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+settings = get_settings()
+
 logger = logging.getLogger(__name__)
 
 # Константы
@@ -24,6 +29,20 @@ SPAM_PROTECTION_TIMEOUT = 1.0
 MESSAGE_CLEANUP_TIMEOUT = 3.0
 CONFIRMATION_DISPLAY_TIME = 1.5
 MAX_TASK_TITLE_LENGTH = 200
+TRASH_PAGE_SIZE = 20
+TRASH_BUTTON_TITLE_LENGTH = 40
+ARCHIVE_PAGE_SIZE = 15
+ARCHIVE_TITLE_LENGTH = 100
+RENDER_CACHE_SIZE = 4096
+DEFAULT_DUE_TIME = (9, 0)  # время срока, если указана только дата
+
+BOT_TZ = ZoneInfo(settings.bot_timezone)
+
+# Форматы ввода срока: "25.12 18:00", "25.12.2026", "18:00", "завтра 10:00", "через 2 ч"
+DUE_DATE_PATTERN = re.compile(r"^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?(?:\s+(\d{1,2}):(\d{2}))?$")
+DUE_TIME_PATTERN = re.compile(r"^(?:(сегодня|завтра)\s*)?(\d{1,2}):(\d{2})$|^(сегодня|завтра)$")
+DUE_DELTA_PATTERN = re.compile(r"^через\s+(\d+)\s*(мин[а-я]*|м|час[а-я]*|ч|д(?:ень|ня|ней)?)$")
+DUE_DELTA_UNITS = {"м": "minutes", "ч": "hours", "д": "days"}  # по первой букве единицы
 
 
 class PrivateChatFilter(BaseFilter):
@@ -44,12 +63,17 @@ class EditTaskStates(StatesGroup):
     waiting_for_new_title = State()
 
 
+class DueTaskStates(StatesGroup):
+    waiting_for_due = State()
+
+
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """Создает основную клавиатуру бота"""
     keyboard = ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="📋 Список задач")],
-            [KeyboardButton(text="➕ Добавить задачу")]
+            [KeyboardButton(text="➕ Добавить задачу")],
+            [KeyboardButton(text="🗑 Корзина")]
         ],
         resize_keyboard=True,
         persistent=True
@@ -71,19 +95,91 @@ def generate_task_keyboard(task) -> InlineKeyboardMarkup:
         InlineKeyboardButton(
             text="🗑️ Удалить",
             callback_data=f"delete_{task.id}"
+        ),
+        InlineKeyboardButton(
+            text="⏰ Срок",
+            callback_data=f"due_{task.id}"
         )
     ]
-    return InlineKeyboardMarkup(inline_keyboard=[buttons])
+    move_buttons = [
+        InlineKeyboardButton(text="⬆️", callback_data=f"up_{task.id}"),
+        InlineKeyboardButton(text="⬇️", callback_data=f"down_{task.id}")
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[buttons, move_buttons])
 
 
 def generate_header_keyboard() -> InlineKeyboardMarkup:
     """Генерирует клавиатуру для заголовка списка задач"""
     return InlineKeyboardMarkup(inline_keyboard=[[
         InlineKeyboardButton(text="🔄 Обновить", callback_data="list_tasks"),
-        InlineKeyboardButton(text="➕ Добавить", callback_data="add_task")
+        InlineKeyboardButton(text="➕ Добавить", callback_data="add_task"),
+        InlineKeyboardButton(text="📦 Архив", callback_data="archive_0")
     ]])
 
 
+def generate_trash_view(tasks) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Генерирует текст и клавиатуру корзины"""
+    if not tasks:
+        return "🗑 <b>Корзина пуста</b>", None
+
+    text = (
+        f"🗑 <b>Корзина</b>\n"
+        f"<i>Последние удаленные задачи ({len(tasks)}). "
+        f"Нажмите на задачу, чтобы восстановить ее.</i>"
+    )
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"♻️ {task.title[:TRASH_BUTTON_TITLE_LENGTH]}",
+            callback_data=f"restore_{task.id}"
+        )]
+        for task in tasks
+    ]
+    return text, InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def load_trash_view(user_id: int) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Загружает корзину пользователя и формирует ее отображение"""
+    with SessionLocal() as db:
+        tasks = crud.get_deleted_tasks(db, user_id, limit=TRASH_PAGE_SIZE)
+        return generate_trash_view(tasks)
+
+
+def generate_archive_view(tasks, offset: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Генерирует страницу архива; tasks может содержать на одну задачу больше страницы"""
+    has_next = len(tasks) > ARCHIVE_PAGE_SIZE
+    tasks = tasks[:ARCHIVE_PAGE_SIZE]
+
+    if not tasks and offset == 0:
+        text = "📦 <b>Архив пуст</b>\n<i>Сюда попадают давно выполненные задачи</i>"
+    else:
+        lines = [f"📦 <b>Архив выполненных задач</b> (с {offset + 1})"]
+        for task in tasks:
+            line = f"✅ {escape(task.title[:ARCHIVE_TITLE_LENGTH])}"
+            if task.done_by:
+                line += f" — <i>{escape(task.done_by)}</i>"
+            lines.append(line)
+        text = "\n".join(lines)
+
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton(
+            text="◀️ Назад", callback_data=f"archive_{max(offset - ARCHIVE_PAGE_SIZE, 0)}"
+        ))
+    if has_next:
+        buttons.append(InlineKeyboardButton(
+            text="Далее ▶️", callback_data=f"archive_{offset + ARCHIVE_PAGE_SIZE}"
+        ))
+    buttons.append(InlineKeyboardButton(text="✖️ Закрыть", callback_data="archive_close"))
+    return text, InlineKeyboardMarkup(inline_keyboard=[buttons])
+
+
+def load_archive_view(user_id: int, offset: int) -> tuple[str, InlineKeyboardMarkup]:
+    """Загружает страницу архива пользователя"""
+    with SessionLocal() as db:
+        tasks = crud.get_archived_tasks(db, user_id, limit=ARCHIVE_PAGE_SIZE + 1, offset=offset)
+        return generate_archive_view(tasks, offset)
+
+
 def generate_task_text(task, username: str = "") -> str:
     """Генерирует текст для отображения задачи"""
     status_icon = "✅" if task.done else "❌"
@@ -91,20 +187,101 @@ def generate_task_text(task, username: str = "") -> str:
 
     if task.done and task.done_by:
         text += f"\n👤 <i>Выполнил:</i> {escape(task.done_by)}"
+    elif not task.done and task.due_at:
+        text += f"\n📅 <i>Срок:</i> {format_due(task.due_at)}"
 
     return text
 
 
+def format_due(due_at: datetime) -> str:
+    """Срок в часовом поясе бота; время из БД без пояса - UTC"""
+    return crud.as_utc(due_at).astimezone(BOT_TZ).strftime("%d.%m.%Y %H:%M")
+
+
+def parse_due(text: str, now: Optional[datetime] = None) -> datetime:
+    """Разбирает срок, введенный пользователем (в часовом поясе бота); ValueError, если формат неизвестен"""
+    text = " ".join(text.lower().split())
+    now = (now or datetime.now(timezone.utc)).astimezone(BOT_TZ)
+
+    if match := DUE_DELTA_PATTERN.match(text):
+        amount, unit = int(match.group(1)), match.group(2)
+        return now + timedelta(**{DUE_DELTA_UNITS[unit[0]]: amount})
+
+    if match := DUE_DATE_PATTERN.match(text):
+        day, month, year, hour, minute = match.groups()
+        hour, minute = (int(hour), int(minute)) if hour else DEFAULT_DUE_TIME
+        due = datetime(int(year or now.year), int(month), int(day), hour, minute, tzinfo=BOT_TZ)
+        if not year and due < now:
+            due = due.replace(year=now.year + 1)
+        return due
+
+    if match := DUE_TIME_PATTERN.match(text):
+        day_word = match.group(1) or match.group(4)
+        hour, minute = (int(match.group(2)), int(match.group(3))) if match.group(2) else DEFAULT_DUE_TIME
+        due = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if day_word == "завтра" or (day_word is None and due < now):
+            due += timedelta(days=1)
+        return due
+
+    raise ValueError(text)
+
+
+def render_task(task: schemas.TaskView) -> tuple[str, InlineKeyboardMarkup]:
+    """Текст и клавиатура задачи; кэш только по показываемым полям.
+
+    position в ключ не входит: перемещения и перенумерация меняют ее у многих задач,
+    а вид задачи от нее не зависит.
+    """
+    return _render_task(task.id, task.title, task.done, task.done_by, task.due_at)
+
+
+@lru_cache(maxsize=RENDER_CACHE_SIZE)
+def _render_task(task_id: int, title: str, done: bool, done_by: Optional[str],
+                 due_at: Optional[datetime]) -> tuple[str, InlineKeyboardMarkup]:
+    task = schemas.TaskView(task_id, title, done, done_by, due_at)
+    return generate_task_text(task), generate_task_keyboard(task)
+
+
+def apply_pending_toggle(task: schemas.TaskView) -> schemas.TaskView:
+    """Учитывает отметку выполнения, еще не записанную в БД"""
+    pending = toggle_queue.pending(task.id)
+    if pending:
+        done, done_by = pending
+        return task._replace(done=done, done_by=done_by)
+    return task
+
+
 async def safe_delete_message(bot, chat_id: int, message_id: int) -> bool:
     """Безопасно удаляет сообщение"""
     try:
         await bot.delete_message(chat_id=chat_id, message_id=message_id)
         return True
     except TelegramAPIError as e:
-        logger.debug(f"Не удалось удалить сообщение {message_id}: {e}")
+        logger.debug("Не удалось удалить сообщение %s: %s", message_id, e)
         return False
 
 
+# Фоновые удаления подтверждений: ожидание не занимает слот обработки обновлений
+_delayed_deletions: set[asyncio.Task] = set()
+
+
+def delete_later(bot, chat_id: int, message_id: int, delay: float = CONFIRMATION_DISPLAY_TIME):
+    """Удаляет сообщение через delay секунд в фоне, не задерживая обработчик"""
+    async def delete():
+        await asyncio.sleep(delay)
+        await safe_delete_message(bot, chat_id, message_id)
+
+    task = asyncio.create_task(delete())
+    _delayed_deletions.add(task)
+    task.add_done_callback(_delayed_deletions.discard)
+
+
+async def flush_delayed_deletions():
+    """Дожидается фоновых удалений (при остановке бота, до закрытия сессии)"""
+    if _delayed_deletions:
+        await asyncio.gather(*_delayed_deletions, return_exceptions=True)
+
+
 async def safe_edit_message(bot, chat_id: int, message_id: int, text: str,
                             reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
     """Безопасно редактирует сообщение"""
@@ -121,13 +298,13 @@ async def safe_edit_message(bot, chat_id: int, message_id: int, text: str,
         if "message is not modified" in str(e).lower():
             return True  # Сообщение не изменилось - это нормально
         elif "message to edit not found" in str(e).lower():
-            logger.warning(f"Сообщение {message_id} не найдено для редактирования")
+            logger.warning("Сообщение %s не найдено для редактирования", message_id)
             return False
         else:
-            logger.error(f"Ошибка редактирования сообщения {message_id}: {e}")
+            logger.error("Ошибка редактирования сообщения %s: %s", message_id, e)
             return False
     except TelegramAPIError as e:
-        logger.error(f"API ошибка при редактировании сообщения {message_id}: {e}")
+        logger.error("API ошибка при редактировании сообщения %s: %s", message_id, e)
         return False
 
 
@@ -227,6 +404,28 @@ async def handle_add_task_button(message: types.Message, state: FSMContext):
     await state.update_data(prompt_message_id=prompt_msg.message_id)
 
 
+@router.message(lambda m: m.text == "🗑 Корзина")
+async def handle_trash_button(message: types.Message, state: FSMContext):
+    """Обработчик кнопки 'Корзина'"""
+    await cleanup_state_messages(
+        state, message.bot, message.chat.id,
+        ['trash_message_id']
+    )
+
+    # Удаляем сообщение пользователя
+    await safe_delete_message(message.bot, message.chat.id, message.message_id)
+
+    try:
+        text, markup = load_trash_view(message.chat.id)
+    except Exception as e:
+        logger.error("Ошибка загрузки корзины: %s", e)
+        await message.answer("❗ <b>Произошла ошибка при загрузке корзины.</b>", parse_mode="HTML")
+        return
+
+    trash_msg = await message.answer(text, reply_markup=markup, parse_mode="HTML")
+    await state.update_data(trash_message_id=trash_msg.message_id)
+
+
 @router.message(AddTaskStates.waiting_for_task_title)
 async def process_task_title(message: types.Message, state: FSMContext):
     """Обработка ввода названия новой задачи"""
@@ -257,7 +456,7 @@ async def process_task_title(message: types.Message, state: FSMContext):
             task_id = new_task.id
             task_title_saved = new_task.title
     except Exception as e:
-        logger.error(f"Ошибка создания задачи: {e}")
+        logger.error("Ошибка создания задачи: %s", e)
         await message.answer("❗ <b>Произошла ошибка при создании задачи.</b>", parse_mode="HTML")
         return
 
@@ -278,13 +477,22 @@ async def process_task_title(message: types.Message, state: FSMContext):
     )
 
     # Удаляем подтверждение через время
-    await asyncio.sleep(CONFIRMATION_DISPLAY_TIME)
-    await safe_delete_message(message.bot, message.chat.id, confirmation.message_id)
+    delete_later(message.bot, message.chat.id, confirmation.message_id)
 
     # Обновляем список задач
     await send_tasks_list(message, state)
 
 
+async def load_task_messages(state: FSMContext, data: dict) -> dict[int, int]:
+    """Сообщения задач чата; словарь из данных FSM (прежний формат) переносится в хранилище"""
+    legacy = data.pop("task_messages", None)
+    if legacy:
+        await task_message_store.set_many(state.key, {int(k): v for k, v in legacy.items()})
+    if legacy is not None:
+        await state.set_data(data)
+    return await task_message_store.get_all(state.key)
+
+
 async def send_tasks_list(message: types.Message | types.CallbackQuery, state: FSMContext):
     """Отправляет/обновляет список задач"""
     if isinstance(message, types.Message):
@@ -297,18 +505,10 @@ async def send_tasks_list(message: types.Message | types.CallbackQuery, state: F
     # Получаем задачи из БД
     try:
         with SessionLocal() as db:
-            tasks = crud.get_tasks(db, user_id=user_id)
-            # Преобразуем в обычные объекты, чтобы избежать DetachedInstanceError
-            tasks_data = []
-            for task in tasks:
-                tasks_data.append({
-                    'id': task.id,
-                    'title': task.title,
-                    'done': task.done,
-                    'done_by': task.done_by
-                })
+            tasks = await crud.get_tasks_async(db, user_id=user_id)
+        tasks = [apply_pending_toggle(task) for task in tasks]
     except Exception as e:
-        logger.error(f"Ошибка получения задач: {e}")
+        logger.error("Ошибка получения задач: %s", e)
         error_msg = "❗ <b>Произошла ошибка при загрузке задач.</b>"
         if isinstance(message, types.Message):
             await message.answer(error_msg, parse_mode="HTML")
@@ -316,19 +516,9 @@ async def send_tasks_list(message: types.Message | types.CallbackQuery, state: F
             await message.message.answer(error_msg, parse_mode="HTML")
         return
 
-    # Создаем временные объекты задач
-    class TempTask:
-        def __init__(self, data):
-            self.id = data['id']
-            self.title = data['title']
-            self.done = data['done']
-            self.done_by = data['done_by']
-
-    tasks = [TempTask(task_data) for task_data in tasks_data]
-
     # Получаем данные состояния
     data = await state.get_data()
-    task_messages = data.get("task_messages", {})
+    task_messages = await load_task_messages(state, data)
     header_message_id = data.get("header_message_id")
     chat_id = user_id
 
@@ -363,17 +553,13 @@ async def send_tasks_list(message: types.Message | types.CallbackQuery, state: F
             header_message_id = header.message_id
             await state.update_data(header_message_id=header_message_id)
         except TelegramAPIError as e:
-            logger.error(f"Ошибка отправки заголовка: {e}")
+            logger.error("Ошибка отправки заголовка: %s", e)
             return
 
     # Если задач нет, удаляем все сообщения задач и обновляем заголовок
     if not tasks:
-        for task_id, msg_id in list(task_messages.items()):
+        for msg_id in (await task_message_store.clear(state.key)).values():
             await safe_delete_message(bot, chat_id, msg_id)
-            task_messages.pop(task_id, None)
-
-        # Обновляем состояние с пустым списком сообщений задач
-        await state.update_data(task_messages=task_messages)
 
         # Проверяем, нужно ли обновить заголовок для пустого списка
         empty_header_text = f"📋 <b>Список задач на {date_str}</b>\n<i>Список пуст</i>"
@@ -390,87 +576,52 @@ async def send_tasks_list(message: types.Message | types.CallbackQuery, state: F
                 )
                 await state.update_data(header_message_id=header.message_id)
             except TelegramAPIError as e:
-                logger.error(f"Ошибка отправки заголовка для пустого списка: {e}")
+                logger.error("Ошибка отправки заголовка для пустого списка: %s", e)
 
         return
 
-    # Управление сообщениями задач
-    current_task_ids = set(task.id for task in tasks)
-    known_task_ids = set(task_messages.keys())
-
-    # Удаляем сообщения для удаленных задач
-    to_delete_ids = known_task_ids - current_task_ids
-    for task_id in to_delete_ids:
-        msg_id = task_messages.get(task_id)
-        if msg_id:
-            await safe_delete_message(bot, chat_id, msg_id)
-            task_messages.pop(task_id, None)
+    # Сообщения задач идут в чате по возрастанию message_id: раскладываем по ним задачи
+    # в порядке списка (так учитывается ручной порядок), лишние сообщения удаляем
+    message_ids = sorted(task_messages.values())
+    for message_id in message_ids[len(tasks):]:
+        await safe_delete_message(bot, chat_id, message_id)
 
-    # Обновляем/создаем сообщения задач
-    for task in tasks:
-        task_id = task.id
-        text = generate_task_text(task)
-        markup = generate_task_keyboard(task)
+    layout = {}
+    for i, task in enumerate(tasks):
+        text, markup = render_task(task)
 
-        if task_id in task_messages:
+        if i < len(message_ids):
             # Пытаемся обновить существующее сообщение
-            if not await safe_edit_message(bot, chat_id, task_messages[task_id], text, markup):
-                # Если не удалось обновить, создаем новое
-                try:
-                    msg = await bot.send_message(
-                        chat_id=chat_id,
-                        text=text,
-                        reply_markup=markup,
-                        parse_mode="HTML"
-                    )
-                    task_messages[task_id] = msg.message_id
-                except TelegramAPIError as e:
-                    logger.error(f"Ошибка отправки сообщения задачи: {e}")
-        else:
-            # Создаем новое сообщение
-            try:
-                msg = await bot.send_message(
-                    chat_id=chat_id,
-                    text=text,
-                    reply_markup=markup,
-                    parse_mode="HTML"
-                )
-                task_messages[task_id] = msg.message_id
-            except TelegramAPIError as e:
-                logger.error(f"Ошибка отправки нового сообщения задачи: {e}")
+            if await safe_edit_message(bot, chat_id, message_ids[i], text, markup):
+                layout[task.id] = message_ids[i]
+                continue
+
+        # Если сообщения нет или не удалось обновить, создаем новое
+        try:
+            msg = await bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                reply_markup=markup,
+                parse_mode="HTML"
+            )
+            layout[task.id] = msg.message_id
+        except TelegramAPIError as e:
+            logger.error("Ошибка отправки сообщения задачи: %s", e)
 
-    # Сохраняем обновленные данные
-    await state.update_data(task_messages=task_messages)
+    await task_message_store.clear(state.key)
+    await task_message_store.set_many(state.key, layout)
 
 
 async def update_task_message(callback: types.CallbackQuery, task_id: int, state: FSMContext):
     """Обновляет сообщение конкретной задачи"""
     try:
         with SessionLocal() as db:
-            task = crud.get_task(db, task_id)
-            if not task:
-                await callback.answer("❗ Задача не найдена!", show_alert=True)
-                return
+            task = crud.get_task_view(db, task_id)
+        if not task:
+            await callback.answer("❗ Задача не найдена!", show_alert=True)
+            return
 
-            # Сохраняем данные до закрытия сессии
-            task_data = {
-                'id': task.id,
-                'title': task.title,
-                'done': task.done,
-                'done_by': task.done_by
-            }
-
-        # Создаем временный объект для генерации текста и клавиатуры
-        class TempTask:
-            def __init__(self, data):
-                self.id = data['id']
-                self.title = data['title']
-                self.done = data['done']
-                self.done_by = data['done_by']
-
-        temp_task = TempTask(task_data)
-        new_text = generate_task_text(temp_task)
-        new_markup = generate_task_keyboard(temp_task)
+        new_text, new_markup = render_task(apply_pending_toggle(task))
 
         await safe_edit_message(
             callback.bot,
@@ -480,7 +631,7 @@ async def update_task_message(callback: types.CallbackQuery, task_id: int, state
             new_markup
         )
     except Exception as e:
-        logger.error(f"Ошибка обновления сообщения задачи {task_id}: {e}")
+        logger.error("Ошибка обновления сообщения задачи %s: %s", task_id, e)
 
 
 @router.callback_query(lambda c: c.data == "list_tasks")
@@ -501,10 +652,17 @@ async def inline_done_handler(callback: types.CallbackQuery, state: FSMContext):
 
     try:
         task_id = int(callback.data.split("_")[1])
+        user = callback.from_user
+        username = f"@{user.username}" if user.username else user.full_name
+
+        if settings.toggle_write_behind:
+            # Отвечаем сразу, запись в БД уйдет пачкой
+            toggle_queue.put(task_id, True, username)
+            await callback.answer("✅ Задача отмечена выполненной!")
+            await update_task_message(callback, task_id, state)
+            return
 
         with SessionLocal() as db:
-            user = callback.from_user
-            username = f"@{user.username}" if user.username else user.full_name
             crud.mark_task_done(db, task_id, done_by=username)
             db.commit()
 
@@ -514,7 +672,7 @@ async def inline_done_handler(callback: types.CallbackQuery, state: FSMContext):
     except (ValueError, IndexError):
         await callback.answer("❗ Неверный формат данных!", show_alert=True)
     except Exception as e:
-        logger.error(f"Ошибка отметки задачи {task_id} как выполненной: {e}")
+        logger.error("Ошибка отметки задачи %s как выполненной: %s", task_id, e)
         await callback.answer("❗ Произошла ошибка!", show_alert=True)
 
 
@@ -527,6 +685,13 @@ async def inline_undone_handler(callback: types.CallbackQuery, state: FSMContext
     try:
         task_id = int(callback.data.split("_")[1])
 
+        if settings.toggle_write_behind:
+            # Отвечаем сразу, запись в БД уйдет пачкой
+            toggle_queue.put(task_id, False)
+            await callback.answer("❌ Задача отмечена как невыполненная!")
+            await update_task_message(callback, task_id, state)
+            return
+
         with SessionLocal() as db:
             crud.mark_task_undone(db, task_id)
             db.commit()
@@ -537,7 +702,7 @@ async def inline_undone_handler(callback: types.CallbackQuery, state: FSMContext
     except (ValueError, IndexError):
         await callback.answer("❗ Неверный формат данных!", show_alert=True)
     except Exception as e:
-        logger.error(f"Ошибка отметки задачи {task_id} как невыполненной: {e}")
+        logger.error("Ошибка отметки задачи %s как невыполненной: %s", task_id, e)
         await callback.answer("❗ Произошла ошибка!", show_alert=True)
 
 
@@ -551,18 +716,14 @@ async def inline_delete_handler(callback: types.CallbackQuery, state: FSMContext
         task_id = int(callback.data.split("_")[1])
 
         with SessionLocal() as db:
-            task = crud.get_task(db, task_id)
-            if not task:
-                await callback.answer("❗ Задача не найдена!", show_alert=True)
-                return
-
-            task_title = task.title
-            crud.delete_task(db, task_id)
-            db.commit()
+            deleted = crud.delete_task(db, task_id)
+        if deleted is None:
+            await callback.answer("❗ Задача не найдена!", show_alert=True)
+            return
+        task_title = deleted[0].title
 
         # Удаляем сообщение задачи
-        data = await state.get_data()
-        task_messages = data.get("task_messages", {})
+        task_messages = await task_message_store.get_many(state.key, [task_id])
 
         if task_id in task_messages:
             await safe_delete_message(
@@ -570,15 +731,88 @@ async def inline_delete_handler(callback: types.CallbackQuery, state: FSMContext
                 callback.message.chat.id,
                 task_messages[task_id]
             )
-            task_messages.pop(task_id, None)
-            await state.update_data(task_messages=task_messages)
+            await task_message_store.remove(state.key, [task_id])
 
-        await callback.answer(f"🗑️ Задача удалена: {task_title}")
+        if settings.soft_delete:
+            await callback.answer(f"🗑️ Задача перемещена в корзину: {task_title}")
+        else:
+            await callback.answer(f"🗑️ Задача удалена: {task_title}")
 
     except (ValueError, IndexError):
         await callback.answer("❗ Неверный формат данных!", show_alert=True)
     except Exception as e:
-        logger.error(f"Ошибка удаления задачи {task_id}: {e}")
+        logger.error("Ошибка удаления задачи %s: %s", task_id, e)
+        await callback.answer("❗ Произошла ошибка!", show_alert=True)
+
+
+@router.callback_query(lambda c: c.data.startswith("restore_"))
+async def inline_restore_handler(callback: types.CallbackQuery, state: FSMContext):
+    """Обработчик восстановления задачи из корзины"""
+    if not await prevent_callback_spam(callback, state):
+        return
+
+    try:
+        task_id = int(callback.data.split("_")[1])
+
+        with SessionLocal() as db:
+            task = crud.restore_task(db, task_id)
+            if not task:
+                await callback.answer("❗ Задача не найдена в корзине!", show_alert=True)
+                return
+            task_title = task.title
+
+        # Обновляем корзину и список задач
+        text, markup = load_trash_view(callback.message.chat.id)
+        await safe_edit_message(
+            callback.bot, callback.message.chat.id, callback.message.message_id,
+            text, markup
+        )
+        await send_tasks_list(callback, state)
+
+        await callback.answer(f"♻️ Задача восстановлена: {task_title}")
+
+    except (ValueError, IndexError):
+        await callback.answer("❗ Неверный формат данных!", show_alert=True)
+    except Exception as e:
+        logger.error("Ошибка восстановления задачи: %s", e)
+        await callback.answer("❗ Произошла ошибка!", show_alert=True)
+
+
+@router.callback_query(lambda c: c.data.startswith("archive_"))
+async def inline_archive_handler(callback: types.CallbackQuery, state: FSMContext):
+    """Обработчик просмотра архива выполненных задач"""
+    if not await prevent_callback_spam(callback, state):
+        return
+
+    chat_id = callback.message.chat.id
+    data = await state.get_data()
+    archive_message_id = data.get("archive_message_id")
+
+    if callback.data == "archive_close":
+        await safe_delete_message(callback.bot, chat_id, callback.message.message_id)
+        await state.update_data(archive_message_id=None)
+        await callback.answer()
+        return
+
+    try:
+        offset = max(int(callback.data.split("_")[1]), 0)
+        text, markup = load_archive_view(chat_id, offset)
+
+        # Листаем страницы в том же сообщении, из заголовка списка открываем новое
+        if archive_message_id == callback.message.message_id:
+            await safe_edit_message(callback.bot, chat_id, archive_message_id, text, markup)
+        else:
+            if archive_message_id:
+                await safe_delete_message(callback.bot, chat_id, archive_message_id)
+            archive_msg = await callback.message.answer(text, reply_markup=markup, parse_mode="HTML")
+            await state.update_data(archive_message_id=archive_msg.message_id)
+
+        await callback.answer()
+
+    except (ValueError, IndexError):
+        await callback.answer("❗ Неверный формат данных!", show_alert=True)
+    except Exception as e:
+        logger.error("Ошибка загрузки архива: %s", e)
         await callback.answer("❗ Произошла ошибка!", show_alert=True)
 
 
@@ -619,7 +853,7 @@ async def edit_task_handler(callback: types.CallbackQuery, state: FSMContext):
     except (ValueError, IndexError):
         await callback.answer("❗ Неверный формат данных!", show_alert=True)
     except Exception as e:
-        logger.error(f"Ошибка начала редактирования задачи: {e}")
+        logger.error("Ошибка начала редактирования задачи: %s", e)
         await callback.answer("❗ Произошла ошибка!", show_alert=True)
 
 
@@ -653,7 +887,7 @@ async def process_edit_task(message: types.Message, state: FSMContext):
 
             crud.update_task(db, task_id, schemas.TaskUpdate(title=new_title))
             db.commit()
-            updated_task = crud.get_task(db, task_id)
+            updated_task = crud.get_task_view(db, task_id)
 
         # Очищаем состояние и временные сообщения
         await cleanup_state_messages(
@@ -664,8 +898,7 @@ async def process_edit_task(message: types.Message, state: FSMContext):
 
         # Обновляем сообщение задачи
         if message_id and updated_task:
-            new_text = generate_task_text(updated_task)
-            new_markup = generate_task_keyboard(updated_task)
+            new_text, new_markup = render_task(updated_task)
             await safe_edit_message(
                 message.bot, message.chat.id, message_id,
                 new_text, new_markup
@@ -680,14 +913,153 @@ async def process_edit_task(message: types.Message, state: FSMContext):
             parse_mode="HTML"
         )
 
-        await asyncio.sleep(CONFIRMATION_DISPLAY_TIME)
-        await safe_delete_message(message.bot, message.chat.id, confirmation.message_id)
+        delete_later(message.bot, message.chat.id, confirmation.message_id)
 
     except Exception as e:
-        logger.error(f"Ошибка обновления задачи {task_id}: {e}")
+        logger.error("Ошибка обновления задачи %s: %s", task_id, e)
         await message.answer("❗ <b>Произошла ошибка при обновлении задачи.</b>", parse_mode="HTML")
 
 
+@router.callback_query(lambda c: c.data.startswith(("up_", "down_")))
+async def inline_move_handler(callback: types.CallbackQuery, state: FSMContext):
+    """Перемещение задачи на одну позицию вверх или вниз: задача и сосед меняются сообщениями"""
+    if not await prevent_callback_spam(callback, state):
+        return
+
+    try:
+        direction, task_id = callback.data.split("_")
+        task_id = int(task_id)
+        up = direction == "up"
+
+        with SessionLocal() as db:
+            moved = crud.move_task_step(db, task_id, up=up)
+            if moved:
+                task, neighbor = (crud.get_task_view(db, item.id) for item in moved)
+        if not moved:
+            await callback.answer("⬆️ Задача уже первая" if up else "⬇️ Задача уже последняя")
+            return
+
+        messages = await task_message_store.get_many(state.key, [task.id, neighbor.id])
+        if len(messages) < 2:
+            # Сосед не показан в чате (например, добавлен через API): перестраиваем список
+            await send_tasks_list(callback, state)
+        else:
+            await task_message_store.set_many(state.key, {
+                task.id: messages[neighbor.id],
+                neighbor.id: messages[task.id]
+            })
+            for view, message_id in ((task, messages[neighbor.id]), (neighbor, messages[task.id])):
+                text, markup = render_task(apply_pending_toggle(view))
+                await safe_edit_message(callback.bot, callback.message.chat.id, message_id, text, markup)
+        await callback.answer()
+
+    except (ValueError, IndexError):
+        await callback.answer("❗ Неверный формат данных!", show_alert=True)
+    except Exception as e:
+        logger.error("Ошибка перемещения задачи %s: %s", callback.data, e)
+        await callback.answer("❗ Произошла ошибка!", show_alert=True)
+
+
+@router.callback_query(lambda c: c.data.startswith("due_"))
+async def due_task_handler(callback: types.CallbackQuery, state: FSMContext):
+    """Обработчик начала установки срока задачи"""
+    if not await prevent_callback_spam(callback, state):
+        return
+
+    try:
+        task_id = int(callback.data.split("_")[1])
+
+        with SessionLocal() as db:
+            task = crud.get_task_view(db, task_id)
+        if not task:
+            await callback.answer("❗ Задача не найдена!", show_alert=True)
+            return
+
+        await state.set_state(DueTaskStates.waiting_for_due)
+
+        current = format_due(task.due_at) if task.due_at else "не задан"
+        prompt_msg = await callback.message.answer(
+            f"⏰ <b>Срок задачи</b> {escape(task.title)}\n\n"
+            f"<b>Текущий срок:</b> {current}\n\n"
+            f"📝 <b>Введите срок</b> - в это время придет напоминание:\n"
+            f"<i>25.12 18:00, 25.12.2026, 18:00, завтра 10:00, через 2 ч; «-» - снять срок</i>",
+            parse_mode="HTML"
+        )
+
+        await state.update_data(
+            task_id=task_id,
+            message_id=callback.message.message_id,
+            prompt_message_id=prompt_msg.message_id
+        )
+
+        await callback.answer("⏰ Введите срок")
+
+    except (ValueError, IndexError):
+        await callback.answer("❗ Неверный формат данных!", show_alert=True)
+    except Exception as e:
+        logger.error("Ошибка начала установки срока задачи: %s", e)
+        await callback.answer("❗ Произошла ошибка!", show_alert=True)
+
+
+@router.message(DueTaskStates.waiting_for_due)
+async def process_due_task(message: types.Message, state: FSMContext):
+    """Обработка ввода срока задачи: срок и напоминание в одно время"""
+    value = message.text.strip() if message.text else ""
+    data = await state.get_data()
+    task_id = data.get("task_id")
+    message_id = data.get("message_id")
+
+    if value in ("-", "нет"):
+        due_at = None
+    else:
+        try:
+            due_at = parse_due(value)
+        except ValueError:
+            await message.answer(
+                "❗ <b>Не удалось разобрать срок.</b>\n"
+                "<i>Примеры: 25.12 18:00, 25.12.2026, 18:00, завтра 10:00, через 2 ч</i>",
+                parse_mode="HTML"
+            )
+            return
+        if due_at <= datetime.now(timezone.utc):
+            await message.answer("❗ <b>Срок уже прошел.</b> Введите время в будущем.", parse_mode="HTML")
+            return
+
+    try:
+        with SessionLocal() as db:
+            task = crud.update_task(db, task_id, schemas.TaskUpdate(due_at=due_at, remind_at=due_at))
+            updated_task = crud.get_task_view(db, task_id) if task else None
+        if not updated_task:
+            await message.answer("❗ <b>Задача не найдена!</b>", parse_mode="HTML")
+            return
+
+        await cleanup_state_messages(
+            state, message.bot, message.chat.id,
+            ['prompt_message_id']
+        )
+        await state.clear()
+
+        if message_id:
+            new_text, new_markup = render_task(apply_pending_toggle(updated_task))
+            await safe_edit_message(
+                message.bot, message.chat.id, message_id,
+                new_text, new_markup
+            )
+
+        await safe_delete_message(message.bot, message.chat.id, message.message_id)
+
+        confirmation = await message.answer(
+            f"⏰ <b>Срок:</b> {format_due(due_at)}" if due_at else "⏰ <b>Срок снят</b>",
+            parse_mode="HTML"
+        )
+
+        delete_later(message.bot, message.chat.id, confirmation.message_id)
+
+    except Exception as e:
+        logger.error("Ошибка установки срока задачи %s: %s", task_id, e)
+        await message.answer("❗ <b>Произошла ошибка при установке срока.</b>", parse_mode="HTML")
+
+
 @router.callback_query(lambda c: c.data == "add_task")
 async def inline_add_task(callback: types.CallbackQuery, state: FSMContext):
     """Обработчик инлайн-кнопки добавления задачи"""
@@ -722,14 +1094,16 @@ async def clear_command(message: types.Message, state: FSMContext):
         await safe_delete_message(message.bot, message.chat.id, header_message_id)
 
     # Удаляем все сообщения задач
-    task_messages = data.get("task_messages", {})
-    for task_id, msg_id in task_messages.items():
+    task_messages = await load_task_messages(state, data)
+    for msg_id in task_messages.values():
         await safe_delete_message(message.bot, message.chat.id, msg_id)
+    await task_message_store.clear(state.key)
 
-    # Удаляем приветственное сообщение
-    start_msg_id = data.get("start_message_id")
-    if start_msg_id:
-        await safe_delete_message(message.bot, message.chat.id, start_msg_id)
+    # Удаляем приветственное сообщение, корзину и архив
+    for key in ("start_message_id", "trash_message_id", "archive_message_id"):
+        msg_id = data.get(key)
+        if msg_id:
+            await safe_delete_message(message.bot, message.chat.id, msg_id)
 
     # Очищаем состояние
     await state.clear()
@@ -755,15 +1129,13 @@ async def refresh_command(message: types.Message, state: FSMContext):
     if header_message_id:
         await safe_delete_message(message.bot, message.chat.id, header_message_id)
 
-    task_messages = data.get("task_messages", {})
-    for task_id, msg_id in task_messages.items():
+    task_messages = await load_task_messages(state, data)
+    for msg_id in task_messages.values():
         await safe_delete_message(message.bot, message.chat.id, msg_id)
 
     # Очищаем данные сообщений из состояния
-    await state.update_data(
-        header_message_id=None,
-        task_messages={}
-    )
+    await task_message_store.clear(state.key)
+    await state.update_data(header_message_id=None)
 
     # Отправляем обновленный список
     await send_tasks_list(message, state)
@@ -809,7 +1181,7 @@ async def list_tasks_handler(message: types.Message, state: FSMContext):
                 parse_mode="HTML"
             )
         except Exception as e:
-            logger.error(f"Ошибка создания задачи через команду: {e}")
+            logger.error("Ошибка создания задачи через команду: %s", e)
             await message.answer("❗ <b>Произошла ошибка при создании задачи.</b>", parse_mode="HTML")
     else:
         prompt_msg = await message.answer(
@@ -826,7 +1198,8 @@ async def handle_unknown_message(message: types.Message, state: FSMContext):
     """Обработчик неизвестных сообщений"""
     current_state = await state.get_state()
 
-    if current_state in [AddTaskStates.waiting_for_task_title, EditTaskStates.waiting_for_new_title]:
+    if current_state in [AddTaskStates.waiting_for_task_title, EditTaskStates.waiting_for_new_title,
+                         DueTaskStates.waiting_for_due]:
         return
 
     help_text = (
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from aiogram import Bot
+from aiogram.fsm.storage.base import StorageKey
+from app import crud
+from app.config import SessionLocal, get_settings
+from app.telegram_bot.task_messages import task_message_store
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class LiveSync:
+    """Точечное обновление открытых списков задач после изменений через API.
+
+    Изменения копятся по чатам и применяются одним проходом через debounce
+    секунд после последнего изменения чата, но не позже max_delay секунд после
+    первого: редактируется только сообщение измененной задачи.
+    """
+
+    def __init__(self, debounce: float, max_delay: float):
+        self.debounce = debounce
+        self.max_delay = max(max_delay, debounce)
+        self._bot: Bot | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._pending: dict[int, set[int]] = {}
+        self._timers: dict[int, asyncio.Task] = {}
+        self._deadlines: dict[int, float] = {}
+
+    def attach(self, bot: Bot):
+        self._bot = bot
+        self._loop = asyncio.get_running_loop()
+
+    async def detach(self):
+        self._loop = None
+        timers = list(self._timers.values())
+        for timer in timers:
+            timer.cancel()
+        await asyncio.gather(*timers, return_exceptions=True)
+        self._pending.clear()
+        self._timers.clear()
+        self._deadlines.clear()
+        self._bot = None
+
+    def notify(self, chat_id: int | None, task_id: int):
+        """Планирует обновление сообщения задачи; можно вызывать из любого потока"""
+        loop = self._loop
+        if loop is None or chat_id is None:
+            return
+        loop.call_soon_threadsafe(self._schedule, chat_id, task_id)
+
+    def _schedule(self, chat_id: int, task_id: int):
+        self._pending.setdefault(chat_id, set()).add(task_id)
+        now = self._loop.time()
+        deadline = self._deadlines.setdefault(chat_id, now + self.max_delay)
+        # Каждое изменение откладывает проход на debounce, но не дальше deadline
+        timer = self._timers.pop(chat_id, None)
+        if timer:
+            timer.cancel()
+        delay = max(0.0, min(self.debounce, deadline - now))
+        self._timers[chat_id] = asyncio.create_task(self._sync_later(chat_id, delay))
+
+    async def _sync_later(self, chat_id: int, delay: float):
+        await asyncio.sleep(delay)
+        # Дальше таймер не отменяется: новые изменения ждут уже следующего прохода
+        self._timers.pop(chat_id, None)
+        self._deadlines.pop(chat_id, None)
+        task_ids = self._pending.pop(chat_id, set())
+        try:
+            await self._sync_chat(chat_id, task_ids)
+        except Exception as e:
+            logger.error("Ошибка синхронизации чата %s: %s", chat_id, e)
+
+    async def _sync_chat(self, chat_id: int, task_ids: set[int]):
+        from app.telegram_bot.handlers import render_task, safe_edit_message, safe_delete_message
+
+        bot = self._bot
+        key = StorageKey(bot_id=bot.id, chat_id=chat_id, user_id=chat_id)
+        affected = await task_message_store.get_many(key, task_ids)
+        if not affected:
+            return
+
+        tasks = await asyncio.to_thread(self._load_tasks, list(affected))
+
+        removed = []
+        for task_id, message_id in affected.items():
+            task = tasks.get(task_id)
+            if task is None:
+                await safe_delete_message(bot, chat_id, message_id)
+                removed.append(task_id)
+            else:
+                text, markup = render_task(task)
+                await safe_edit_message(bot, chat_id, message_id, text, markup)
+
+        await task_message_store.remove(key, removed)
+
+    @staticmethod
+    def _load_tasks(task_ids: list[int]) -> dict:
+        with SessionLocal() as db:
+            tasks = {}
+            for task_id in task_ids:
+                task = crud.get_task_view(db, task_id)
+                if task:
+                    tasks[task_id] = task
+            return tasks
+
+
+live_sync = LiveSync(
+    debounce=settings.live_sync_debounce_ms / 1000,
+    max_delay=settings.live_sync_max_delay_ms / 1000
+)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Синхронизация для процесса API без бота.
+
+    Сообщения списков задач хранятся рядом с FSM бота, поэтому нужен общий
+    FSM_REDIS_URL; без него процесс API не видит чаты и синхронизация выключена.
+    """
+    if not settings.fsm_redis_url:
+        yield
+        return
+
+    from app.telegram_bot.runner import create_bot
+    bot = create_bot()
+    live_sync.attach(bot)
+    try:
+        yield
+    finally:
+        await live_sync.detach()
+        await task_message_store.close()
+        await bot.session.close()
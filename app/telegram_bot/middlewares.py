@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import re
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update
+from app.idempotency import IdempotencyKeyInUse, update_dedup_store
+from app.logging_setup import bind_log_context
+from app.replicas import read_scope
+
+logger = logging.getLogger(__name__)
+
+OVERLOAD_TEXT = "⏳ Бот сейчас перегружен, повторите действие через несколько секунд"
+
+# ID задачи в callback_data вида done_123, edit_123, restore_123
+CALLBACK_TASK_ID = re.compile(r"^[a-z]+_(\d+)$")
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Добавляет update_id, chat_id, user_id и task_id обновления ко всем записям лога при его обработке"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        chat, user = data.get("event_chat"), data.get("event_from_user")
+        task_id = None
+        if isinstance(event, Update) and event.callback_query and event.callback_query.data:
+            match = CALLBACK_TASK_ID.match(event.callback_query.data)
+            if match:
+                task_id = int(match.group(1))
+
+        bind_log_context(
+            update_id=getattr(event, "update_id", None),
+            chat_id=chat.id if chat else None,
+            user_id=user.id if user else None,
+            task_id=task_id
+        )
+        return await handler(event, data)
+
+
+class ReadScopeMiddleware(BaseMiddleware):
+    """Одна область read-your-writes (app.replicas) на обновление: после записи чтения идут на primary"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        with read_scope():
+            return await handler(event, data)
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """Пропускает обновления, которые Telegram доставил повторно (по update_id)"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        key = f"update:{event.update_id}"
+        try:
+            if update_dedup_store.begin(key) is not None:
+                logger.info("Повторное обновление %s пропущено", event.update_id)
+                return None
+        except IdempotencyKeyInUse:
+            logger.info("Обновление %s уже обрабатывается", event.update_id)
+            return None
+
+        try:
+            result = await handler(event, data)
+        except Exception:
+            # Обработка не удалась - повторная доставка выполнится заново
+            update_dedup_store.release(key)
+            raise
+        update_dedup_store.complete(key, "", 200)
+        return result
+
+
+class AdmissionControlMiddleware(BaseMiddleware):
+    """Ограничение параллельной обработки обновлений.
+
+    Одновременно обрабатывается не больше max_concurrent обновлений, обновления
+    одного чата - строго по очереди. Если ждущих обновлений слишком много (всего
+    или в одном чате), новое отклоняется с коротким ответом пользователю.
+    """
+
+    def __init__(self, max_concurrent: int, max_pending: int, chat_max_pending: int):
+        self.max_pending = max_pending
+        self.chat_max_pending = chat_max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._chat_locks: dict[int, asyncio.Lock] = {}
+        self._chat_pending: dict[int, int] = {}
+        self.pending = 0
+        self.running = 0
+        self.shed = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        chat = data.get("event_chat")
+        chat_id = chat.id if chat else None
+
+        if self.pending >= self.max_pending or self._chat_pending.get(chat_id, 0) >= self.chat_max_pending:
+            self.shed += 1
+            logger.warning("Обновление отклонено: в обработке %d, в чате %s - %d",
+                           self.pending, chat_id, self._chat_pending.get(chat_id, 0))
+            await self._reject(event)
+            return None
+
+        self.pending += 1
+        self._chat_pending[chat_id] = self._chat_pending.get(chat_id, 0) + 1
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        try:
+            # Сначала очередь чата, потом общий лимит: ожидание своей очереди не занимает слот
+            async with lock, self._semaphore:
+                self.running += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.running -= 1
+        finally:
+            self.pending -= 1
+            self._chat_pending[chat_id] -= 1
+            if not self._chat_pending[chat_id]:
+                # Обновлений чата больше нет - никто не ждет и его блокировку
+                del self._chat_pending[chat_id]
+                del self._chat_locks[chat_id]
+
+    @staticmethod
+    async def _reject(event: TelegramObject):
+        if not isinstance(event, Update):
+            return
+        try:
+            if event.callback_query:
+                await event.callback_query.answer(OVERLOAD_TEXT)
+            elif event.message:
+                await event.message.answer(OVERLOAD_TEXT)
+        except TelegramAPIError as e:
+            logger.warning("Не удалось ответить на отклоненное обновление: %s", e)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "running": self.running,
+            "waiting": self.pending - self.running,
+            "chats": len(self._chat_pending),
+            "shed": self.shed,
+        }
@@ -0,0 +1,81 @@
+"""Отправка сообщений с учетом лимитов Telegram.
+
+Telegram ограничивает рассылку примерно 30 сообщениями в секунду на бота и одним
+сообщением в секунду в один чат, при превышении отвечает 429 с retry_after.
+Фоновые отправки (напоминания, рассылки) идут через send_limited: каждое
+сообщение заранее получает слот отправки, а 429 приостанавливает все отправки
+на retry_after секунд.
+"""
+import asyncio
+import logging
+from typing import Optional
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import Message
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Сколько записей о чатах держать до очистки устаревших
+CHAT_SLOTS_CLEANUP_SIZE = 10000
+
+
+class RateLimiter:
+    """Общий лимит rate сообщений в секунду и интервал chat_interval между сообщениями в чат"""
+
+    def __init__(self, rate: float, chat_interval: float):
+        self.interval = 1 / rate
+        self.chat_interval = chat_interval
+        self._next_slot = 0.0
+        self._chat_next: dict[int, float] = {}
+        self._paused_until = 0.0
+        self.waited = 0.0
+        self.retries = 0
+
+    async def acquire(self, chat_id: int):
+        """Ждет слот отправки в чат"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Слоты резервируются сразу (без await), поэтому одновременные вызовы не пересекаются
+        slot = max(now, self._next_slot, self._paused_until)
+        self._next_slot = slot + self.interval
+        slot = max(slot, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + self.chat_interval
+        if len(self._chat_next) > CHAT_SLOTS_CLEANUP_SIZE:
+            self._chat_next = {chat: at for chat, at in self._chat_next.items() if at > now}
+
+        while (delay := max(slot, self._paused_until) - loop.time()) > 0:
+            self.waited += delay
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Приостанавливает все отправки (ответ 429)"""
+        self.retries += 1
+        self._paused_until = max(self._paused_until, asyncio.get_running_loop().time() + seconds)
+
+    def stats(self) -> dict:
+        return {"waited_seconds": round(self.waited, 3), "retries": self.retries}
+
+
+rate_limiter = RateLimiter(settings.bot_send_rate, settings.bot_chat_send_interval)
+
+
+async def send_limited(bot: Bot, chat_id: int, text: str, **kwargs) -> Optional[Message]:
+    """Отправляет сообщение в пределах лимитов; None, если отправить не удалось"""
+    for attempt in range(settings.bot_send_max_retries + 1):
+        await rate_limiter.acquire(chat_id)
+        try:
+            return await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+        except TelegramRetryAfter as e:
+            rate_limiter.pause(e.retry_after)
+            logger.warning("Лимит Telegram, повтор через %s с", e.retry_after)
+        except TelegramForbiddenError:
+            logger.info("Чат %s недоступен: бот заблокирован", chat_id)
+            return None
+        except TelegramAPIError as e:
+            logger.error("Ошибка отправки сообщения в чат %s: %s", chat_id, e)
+            return None
+    logger.error("Сообщение в чат %s не отправлено: превышено число повторов", chat_id)
+    return None
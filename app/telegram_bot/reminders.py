@@ -0,0 +1,206 @@
+"""Планировщик напоминаний о задачах.
+
+В памяти держатся только напоминания ближайшего окна (window секунд) в куче по
+времени. Окно загружается по индексу ix_tasks_remind_at пачками и перечитывается
+раз в refresh секунд, поэтому напоминания, заданные другими процессами, попадают
+в расписание не позже чем через refresh секунд; изменения в этом процессе
+приходят сразу через шину изменений. Наступившее напоминание сначала занимается
+в БД (remind_at сбрасывается), затем отправляется с учетом лимитов Telegram.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from html import escape
+from typing import Optional
+from aiogram import Bot
+from app import crud, schemas
+from app.config import SessionLocal, get_settings
+from app.events import change_bus, TASK_ARCHIVED, TASK_DELETED, Subscription
+from app.telegram_bot.ratelimit import send_limited
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+ERROR_RETRY_DELAY = 5.0
+
+
+class ReminderScheduler:
+    def __init__(self, window: float, refresh: float, batch_size: int, max_scheduled: int):
+        self.window = timedelta(seconds=window)
+        self.refresh = refresh
+        self.batch_size = batch_size
+        self.max_scheduled = max_scheduled
+        self._heap: list[tuple[datetime, int]] = []
+        # task_id -> remind_at в том виде, как он хранится в БД; записи кучи без пары здесь устарели
+        self._scheduled: dict[int, datetime] = {}
+        self._horizon: Optional[datetime] = None
+        self._next_refresh = 0.0
+        self._loading: Optional[list[tuple[int, Optional[datetime]]]] = None
+        self._wakeup = asyncio.Event()
+        self._bot: Bot | None = None
+        self._subscription: Subscription | None = None
+        self._tasks: list[asyncio.Task] = []
+        self.sent = 0
+        self.loads = 0
+
+    async def start(self, bot: Bot):
+        if self._tasks:
+            return
+        self._bot = bot
+        self._subscription = change_bus.subscribe()
+        self._tasks = [
+            asyncio.create_task(self._run(), name="reminders"),
+            asyncio.create_task(self._listen(), name="reminders-events"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._subscription:
+            change_bus.unsubscribe(self._subscription)
+            self._subscription = None
+        self._heap.clear()
+        self._scheduled.clear()
+        self._horizon = None
+        self._next_refresh = 0.0
+        self._bot = None
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self._scheduled),
+            "horizon": self._horizon.isoformat() if self._horizon else None,
+            "sent": self.sent,
+            "loads": self.loads,
+        }
+
+    # --- расписание ---
+
+    def _schedule(self, task_id: int, remind_at: Optional[datetime]):
+        """Добавляет, переносит или снимает напоминание задачи"""
+        if self._loading is not None:
+            # Окно сейчас перечитывается: применим изменение и после загрузки
+            self._loading.append((task_id, remind_at))
+        at = crud.as_utc(remind_at)
+        if at is None or self._horizon is None or at > self._horizon:
+            # Старая запись в куче станет устаревшей; дальние напоминания загрузит следующее окно
+            self._scheduled.pop(task_id, None)
+            return
+        self._scheduled[task_id] = remind_at
+        heapq.heappush(self._heap, (at, task_id))
+        if self._heap[0] == (at, task_id):
+            self._wakeup.set()
+
+    async def _listen(self):
+        while True:
+            event = await self._subscription.get()
+            if self._subscription.take_dropped():
+                # Часть изменений потеряна: перечитываем окно
+                self._next_refresh = 0.0
+                self._wakeup.set()
+            remind_at = event.task.get("remind_at")
+            if event.type in (TASK_DELETED, TASK_ARCHIVED):
+                remind_at = None
+            self._schedule(event.task["id"], datetime.fromisoformat(remind_at) if remind_at else None)
+
+    async def _refresh(self):
+        loop = asyncio.get_running_loop()
+        self._next_refresh = loop.time() + self.refresh
+        horizon = datetime.now(timezone.utc) + self.window
+
+        self._loading = []
+        try:
+            reminders = await asyncio.to_thread(self._load, horizon)
+        finally:
+            changed, self._loading = self._loading, None
+        self.loads += 1
+
+        if len(reminders) >= self.max_scheduled:
+            # Окно не поместилось: сужаем его до последнего загруженного напоминания
+            horizon = crud.as_utc(reminders[-1][1])
+        self._horizon = horizon
+        self._scheduled = dict(reminders)
+        self._heap = [(crud.as_utc(remind_at), task_id) for task_id, remind_at in reminders]
+        heapq.heapify(self._heap)
+        for task_id, remind_at in changed:
+            self._schedule(task_id, remind_at)
+
+    def _load(self, horizon: datetime) -> list[tuple[int, datetime]]:
+        """Напоминания до horizon пачками по индексу (включая просроченные)"""
+        reminders: list[tuple[int, datetime]] = []
+        after = None
+        with SessionLocal() as db:
+            while len(reminders) < self.max_scheduled:
+                limit = min(self.batch_size, self.max_scheduled - len(reminders))
+                batch = crud.get_upcoming_reminders(db, horizon, limit, after)
+                reminders.extend(batch)
+                if len(batch) < limit:
+                    break
+                task_id, remind_at = batch[-1]
+                after = (remind_at, task_id)
+        return reminders
+
+    # --- отправка ---
+
+    def _take_due(self, now: datetime) -> list[tuple[int, datetime]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+            at, task_id = heapq.heappop(self._heap)
+            remind_at = self._scheduled.get(task_id)
+            if remind_at is None or crud.as_utc(remind_at) != at:
+                continue
+            del self._scheduled[task_id]
+            due.append((task_id, remind_at))
+        return due
+
+    @staticmethod
+    def _claim(due: list[tuple[int, datetime]]) -> list[schemas.Reminder]:
+        with SessionLocal() as db:
+            return crud.claim_reminders(db, due)
+
+    async def _send(self, reminder: schemas.Reminder):
+        from app.telegram_bot.handlers import format_due
+
+        text = f"⏰ <b>Напоминание</b>\n{escape(reminder.title)}"
+        if reminder.due_at:
+            text += f"\n📅 <i>Срок:</i> {format_due(reminder.due_at)}"
+        if await send_limited(self._bot, reminder.user_id, text):
+            self.sent += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if loop.time() >= self._next_refresh:
+                    await self._refresh()
+
+                due = self._take_due(datetime.now(timezone.utc))
+                if due:
+                    reminders = await asyncio.to_thread(self._claim, due)
+                    await asyncio.gather(*(self._send(reminder) for reminder in reminders))
+                    continue
+
+                delay = self._next_refresh - loop.time()
+                if self._heap:
+                    delay = min(delay, (self._heap[0][0] - datetime.now(timezone.utc)).total_seconds())
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                self._wakeup.clear()
+            except Exception:
+                logger.exception("Ошибка планировщика напоминаний")
+                self._next_refresh = 0.0
+                await asyncio.sleep(ERROR_RETRY_DELAY)
+
+
+reminder_scheduler = ReminderScheduler(
+    window=settings.reminder_window_seconds,
+    refresh=settings.reminder_refresh_seconds,
+    batch_size=settings.reminder_batch_size,
+    max_scheduled=settings.reminder_max_scheduled
+)
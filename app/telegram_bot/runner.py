@@ -2,43 +2,248 @@ import asyncio
 from contextlib import asynccontextmanager
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramAPIError
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
-from app.config import get_settings
+from aiogram.types import Update
+from app.config import get_settings, replica_pool
+from app.telegram_bot.digest import digest_scheduler
+from app.telegram_bot.live_sync import live_sync
+from app.telegram_bot.middlewares import AdmissionControlMiddleware
+from app.telegram_bot.ratelimit import rate_limiter
+from app.telegram_bot.reminders import reminder_scheduler
+from app.telegram_bot.task_messages import task_message_store
+from app.telegram_bot.write_behind import toggle_queue
 import logging
 
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
+# Константы
+POLLING_TIMEOUT = 30
+POLLING_RETRY_DELAY = 5.0
+DRAIN_TIMEOUT = 10.0
 
-@asynccontextmanager
-async def lifespan(app):
+# Запущенный в этом процессе бот (если есть)
+runtime: "BotRuntime | None" = None
+
+
+def create_bot() -> Bot:
+    """Создает экземпляр бота"""
+    session = None
+    if settings.telegram_api_base:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_base))
     bot = Bot(
         token=settings.telegram_bot_token,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    if settings.tracing_enabled:
+        from app.telegram_bot.tracing import TracingRequestMiddleware
+        bot.session.middleware(TracingRequestMiddleware())
+    return bot
+
 
-    storage = MemoryStorage()
+def create_storage() -> BaseStorage:
+    """Создает хранилище FSM: Redis, если задан адрес, иначе в памяти процесса"""
+    if settings.fsm_redis_url:
+        from aiogram.fsm.storage.redis import RedisStorage
+        storage = RedisStorage.from_url(settings.fsm_redis_url)
+    else:
+        storage = MemoryStorage()
+    if settings.tracing_enabled:
+        from app.telegram_bot.tracing import TracedStorage
+        storage = TracedStorage(storage)
+    return storage
+
+
+def create_dispatcher(storage: BaseStorage) -> Dispatcher:
+    """Создает диспетчер с обработчиками бота"""
     dp = Dispatcher(storage=storage)
 
     from app.telegram_bot.handlers import router
+    from app.telegram_bot.middlewares import LogContextMiddleware, ReadScopeMiddleware, UpdateDedupMiddleware
+    if settings.tracing_enabled:
+        from app.telegram_bot.tracing import TracingMiddleware
+        dp.update.outer_middleware(TracingMiddleware())
+    dp.update.outer_middleware(LogContextMiddleware())
+    dp.update.outer_middleware(UpdateDedupMiddleware())
+    if replica_pool is not None:
+        dp.update.outer_middleware(ReadScopeMiddleware())
     dp.include_router(router)
+    return dp
+
+
+class BotRuntime:
+    """Бот с общей очередью обновлений.
+
+    Обновления (из поллинга или вебхука) попадают в одну очередь. Задача-разборщик
+    запускает каждое обновление отдельной задачей, не дожидаясь его обработки, -
+    как start_polling aiogram, но принятых в обработку не больше
+    bot_max_pending_updates: остальные ждут в очереди, а полная очередь
+    останавливает поллинг и прием вебхуков. Параллельность ограничивает
+    AdmissionControlMiddleware: до max_concurrent обновлений одновременно,
+    обновления одного чата - по очереди.
+    """
+
+    def __init__(self, mode: str | None = None, max_concurrent: int | None = None):
+        self.mode = mode or settings.bot_mode
+        self.max_concurrent = max(1, max_concurrent or settings.bot_max_concurrent_updates)
+        self.bot = create_bot()
+        self.storage = create_storage()
+        self.dp = create_dispatcher(self.storage)
+        self.admission = AdmissionControlMiddleware(
+            max_concurrent=self.max_concurrent,
+            max_pending=settings.bot_max_pending_updates,
+            chat_max_pending=settings.bot_chat_max_pending
+        )
+        self.dp.update.outer_middleware(self.admission)
+        self.updates: asyncio.Queue[Update] = asyncio.Queue(maxsize=settings.bot_update_queue_size)
+        self._slots = asyncio.Semaphore(settings.bot_max_pending_updates)
+        self._poller: asyncio.Task | None = None
+        self._consumer: asyncio.Task | None = None
+        self._processing: set[asyncio.Task] = set()
+
+    @property
+    def workflow_data(self) -> dict:
+        return {"dispatcher": self.dp, "bots": [self.bot], **self.dp.workflow_data}
+
+    async def start(self):
+        await self.dp.emit_startup(bot=self.bot, **self.workflow_data)
+
+        if settings.toggle_write_behind:
+            await toggle_queue.start()
+
+        live_sync.attach(self.bot)
+        await reminder_scheduler.start(self.bot)
+        if settings.digest_enabled:
+            await digest_scheduler.start(self.bot)
+
+        self._consumer = asyncio.create_task(self._consume(), name="bot-consumer")
+
+        if self.mode == "polling":
+            await self.bot.delete_webhook()
+            self._poller = asyncio.create_task(self._poll(), name="bot-poller")
+            logger.info("Starting bot polling, up to %d concurrent updates...", self.max_concurrent)
+        else:
+            if not settings.webhook_url:
+                raise RuntimeError("Для режима webhook необходимо задать WEBHOOK_URL")
+            await self.bot.set_webhook(
+                url=settings.webhook_url,
+                secret_token=settings.webhook_secret,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+            logger.info("Webhook set to %s, up to %d concurrent updates", settings.webhook_url, self.max_concurrent)
+
+    async def stop(self):
+        # Сначала перестаем принимать новые обновления
+        if self._poller:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
 
-    await bot.delete_webhook()
-    logger.info("Starting bot polling...")
+        # Дорабатываем уже принятые
+        try:
+            await asyncio.wait_for(self.updates.join(), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Обработка обновлений не завершена: в очереди %d, в обработке %d",
+                           self.updates.qsize(), len(self._processing))
+
+        tasks = [*filter(None, [self._consumer]), *self._processing]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Удаляем показанные подтверждения, пока сессия бота открыта
+        from app.telegram_bot.handlers import flush_delayed_deletions
+        await flush_delayed_deletions()
+
+        # Записываем отложенные отметки выполнения
+        await toggle_queue.stop()
+        await live_sync.detach()
+        await reminder_scheduler.stop()
+        await digest_scheduler.stop()
+
+        await self.dp.emit_shutdown(bot=self.bot, **self.workflow_data)
+        await self.storage.close()
+        await task_message_store.close()
+        await self.bot.session.close()
+        logger.info("Bot stopped")
+
+    async def feed_raw_update(self, payload: dict):
+        """Принимает обновление из вебхука"""
+        update = Update.model_validate(payload, context={"bot": self.bot})
+        await self.updates.put(update)
+
+    async def _poll(self):
+        offset = None
+        allowed_updates = self.dp.resolve_used_update_types()
+
+        while True:
+            try:
+                updates = await self.bot.get_updates(
+                    offset=offset,
+                    timeout=POLLING_TIMEOUT,
+                    allowed_updates=allowed_updates,
+                    request_timeout=POLLING_TIMEOUT + 10
+                )
+            except TelegramAPIError as e:
+                logger.error("Ошибка получения обновлений: %s", e)
+                await asyncio.sleep(POLLING_RETRY_DELAY)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                await self.updates.put(update)
 
-    # Запускаем поллинг в фоновой задаче
-    polling_task = asyncio.create_task(dp.start_polling(bot))
+    async def _consume(self):
+        while True:
+            # Слот занимается до чтения из очереди: при перегрузке обновления копятся в ней
+            await self._slots.acquire()
+            update = await self.updates.get()
+            # Не ждем обработки: иначе обновления всех чатов шли бы по одному.
+            # Отдельная задача - свой контекст (contextvars) на каждое обновление
+            task = asyncio.create_task(self._process(update))
+            self._processing.add(task)
+            task.add_done_callback(self._processing.discard)
+
+    async def _process(self, update: Update):
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            logger.exception("Ошибка обработки обновления %s", update.update_id)
+        finally:
+            self._slots.release()
+            self.updates.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "max_concurrent": self.max_concurrent,
+            "queue": self.updates.qsize(),
+            **self.admission.stats(),
+            "reminders": reminder_scheduler.stats(),
+            "send_rate_limit": rate_limiter.stats(),
+        }
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Запускает бота внутри процесса API (режим combined)"""
+    global runtime
+
+    runtime = BotRuntime()
+    await runtime.start()
 
     try:
         yield
     finally:
         # Останавливаем бота при завершении приложения
-        polling_task.cancel()
-        try:
-            await polling_task
-        except asyncio.CancelledError:
-            pass
-        await bot.session.close()
-        logger.info("Bot stopped")
\ No newline at end of file
+        await runtime.stop()
+        runtime = None
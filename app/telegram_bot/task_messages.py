@@ -0,0 +1,150 @@
+"""Соответствие задача -> сообщение списка задач в чате.
+
+Хранится отдельно от данных FSM: get_data/update_data читают и записывают все
+данные чата целиком, а здесь изменение одной задачи - одна операция над одной
+записью (в Redis - поле hash).
+"""
+import bisect
+from array import array
+from typing import Iterable, Optional
+from aiogram.fsm.storage.base import StorageKey
+from app.config import get_settings
+
+settings = get_settings()
+
+
+class PackedTaskMessages:
+    """Пары (task_id, message_id) в двух отсортированных параллельных массивах int64"""
+    __slots__ = ("task_ids", "message_ids")
+
+    def __init__(self):
+        self.task_ids = array("q")
+        self.message_ids = array("q")
+
+    def __len__(self) -> int:
+        return len(self.task_ids)
+
+    def get(self, task_id: int) -> Optional[int]:
+        i = bisect.bisect_left(self.task_ids, task_id)
+        if i < len(self.task_ids) and self.task_ids[i] == task_id:
+            return self.message_ids[i]
+        return None
+
+    def set(self, task_id: int, message_id: int):
+        i = bisect.bisect_left(self.task_ids, task_id)
+        if i < len(self.task_ids) and self.task_ids[i] == task_id:
+            self.message_ids[i] = message_id
+        else:
+            self.task_ids.insert(i, task_id)
+            self.message_ids.insert(i, message_id)
+
+    def remove(self, task_id: int):
+        i = bisect.bisect_left(self.task_ids, task_id)
+        if i < len(self.task_ids) and self.task_ids[i] == task_id:
+            del self.task_ids[i]
+            del self.message_ids[i]
+
+    def items(self) -> dict[int, int]:
+        return dict(zip(self.task_ids, self.message_ids))
+
+
+class MemoryTaskMessages:
+    """Хранилище в памяти процесса (вместе с MemoryStorage)"""
+
+    def __init__(self):
+        self._chats: dict[StorageKey, PackedTaskMessages] = {}
+
+    async def get_all(self, key: StorageKey) -> dict[int, int]:
+        packed = self._chats.get(key)
+        return packed.items() if packed else {}
+
+    async def get_many(self, key: StorageKey, task_ids: Iterable[int]) -> dict[int, int]:
+        packed = self._chats.get(key)
+        if not packed:
+            return {}
+        found = {task_id: packed.get(task_id) for task_id in task_ids}
+        return {task_id: message_id for task_id, message_id in found.items() if message_id is not None}
+
+    async def set(self, key: StorageKey, task_id: int, message_id: int):
+        self._chats.setdefault(key, PackedTaskMessages()).set(task_id, message_id)
+
+    async def set_many(self, key: StorageKey, messages: dict[int, int]):
+        packed = self._chats.setdefault(key, PackedTaskMessages())
+        for task_id, message_id in messages.items():
+            packed.set(task_id, message_id)
+
+    async def remove(self, key: StorageKey, task_ids: Iterable[int]):
+        packed = self._chats.get(key)
+        if not packed:
+            return
+        for task_id in task_ids:
+            packed.remove(task_id)
+        if not packed:
+            del self._chats[key]
+
+    async def clear(self, key: StorageKey) -> dict[int, int]:
+        """Удаляет все записи чата и возвращает их"""
+        packed = self._chats.pop(key, None)
+        return packed.items() if packed else {}
+
+    async def close(self):
+        pass
+
+
+class RedisTaskMessages:
+    """Хранилище в Redis: hash на чат, поле - ID задачи, значение - ID сообщения"""
+
+    def __init__(self, url: str, prefix: str = "fsm"):
+        from redis.asyncio import Redis
+        self.redis = Redis.from_url(url)
+        self.prefix = prefix
+
+    def _name(self, key: StorageKey) -> str:
+        return f"{self.prefix}:{key.bot_id}:{key.chat_id}:{key.user_id}:task_messages"
+
+    async def get_all(self, key: StorageKey) -> dict[int, int]:
+        raw = await self.redis.hgetall(self._name(key))
+        return {int(task_id): int(message_id) for task_id, message_id in raw.items()}
+
+    async def get_many(self, key: StorageKey, task_ids: Iterable[int]) -> dict[int, int]:
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+        values = await self.redis.hmget(self._name(key), task_ids)
+        return {
+            task_id: int(message_id)
+            for task_id, message_id in zip(task_ids, values)
+            if message_id is not None
+        }
+
+    async def set(self, key: StorageKey, task_id: int, message_id: int):
+        await self.redis.hset(self._name(key), task_id, message_id)
+
+    async def set_many(self, key: StorageKey, messages: dict[int, int]):
+        if messages:
+            await self.redis.hset(self._name(key), mapping=messages)
+
+    async def remove(self, key: StorageKey, task_ids: Iterable[int]):
+        task_ids = list(task_ids)
+        if task_ids:
+            await self.redis.hdel(self._name(key), *task_ids)
+
+    async def clear(self, key: StorageKey) -> dict[int, int]:
+        """Удаляет все записи чата и возвращает их"""
+        name = self._name(key)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            raw, _ = await pipe.hgetall(name).delete(name).execute()
+        return {int(task_id): int(message_id) for task_id, message_id in raw.items()}
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_task_message_store() -> MemoryTaskMessages | RedisTaskMessages:
+    """Redis, если задан адрес хранилища FSM, иначе память процесса"""
+    if settings.fsm_redis_url:
+        return RedisTaskMessages(settings.fsm_redis_url)
+    return MemoryTaskMessages()
+
+
+task_message_store = create_task_message_store()
@@ -0,0 +1,66 @@
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+from app.tracing import trace_span
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Корневой спан на обработку обновления"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        attributes = {"update_id": event.update_id, "update_type": event.event_type}
+        if event.callback_query and event.callback_query.data:
+            attributes["callback_data"] = event.callback_query.data
+        with trace_span(f"bot.{event.event_type}", **attributes):
+            return await handler(event, data)
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Спан на каждый вызов Bot API"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        with trace_span(f"telegram.{method.__api_method__}"):
+            return await make_request(bot, method)
+
+
+class TracedStorage(BaseStorage):
+    """Хранилище FSM со спанами на каждую операцию"""
+
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        with trace_span("fsm.set_state"):
+            await self.storage.set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        with trace_span("fsm.get_state"):
+            return await self.storage.get_state(key)
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        with trace_span("fsm.set_data"):
+            await self.storage.set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        with trace_span("fsm.get_data"):
+            return await self.storage.get_data(key)
+
+    async def close(self) -> None:
+        await self.storage.close()
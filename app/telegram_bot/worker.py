@@ -0,0 +1,85 @@
+# запуск из корня:  python -m app.telegram_bot.worker [--mode polling|webhook] [--max-concurrent N]
+#
+# Polling допускает только один процесс на токен (иначе Telegram отвечает 409),
+# поэтому горизонтально масштабируется режим webhook: несколько процессов за
+# балансировщиком с общим хранилищем FSM (FSM_REDIS_URL).
+
+import argparse
+import asyncio
+import hmac
+import logging
+from aiohttp import web
+from contextlib import nullcontext
+from app.config import get_settings, replica_pool
+from app.event_relay import change_relay, relay_enabled
+from app.history import history_writer
+from app.logging_setup import setup_logging
+from app.tracing import setup_tracing
+from app.telegram_bot import runner
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+def create_webhook_app(runtime: runner.BotRuntime) -> web.Application:
+    """Создает aiohttp-приложение, принимающее обновления в очередь бота"""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if settings.webhook_secret:
+            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(token, settings.webhook_secret):
+                return web.Response(status=401)
+
+        await runtime.feed_raw_update(await request.json())
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_post(settings.webhook_path, handle_update)
+    return app
+
+
+async def run(mode: str, max_concurrent: int):
+    await history_writer.start()
+    if relay_enabled():
+        await change_relay.start()
+    runtime = runner.BotRuntime(mode=mode, max_concurrent=max_concurrent)
+    runner.runtime = runtime
+    await runtime.start()
+
+    site_runner = None
+    if mode == "webhook":
+        site_runner = web.AppRunner(create_webhook_app(runtime))
+        await site_runner.setup()
+        await web.TCPSite(site_runner, settings.webhook_host, settings.webhook_port).start()
+        logger.info("Webhook server listening on %s:%d", settings.webhook_host, settings.webhook_port)
+
+    try:
+        async with replica_pool.monitor() if replica_pool is not None else nullcontext():
+            await asyncio.Event().wait()
+    finally:
+        if site_runner:
+            await site_runner.cleanup()
+        await runtime.stop()
+        runner.runtime = None
+        await change_relay.stop()
+        await history_writer.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отдельный процесс Telegram-бота")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default=settings.bot_mode)
+    parser.add_argument("--max-concurrent", type=int, default=settings.bot_max_concurrent_updates,
+                        help="Сколько обновлений разных чатов обрабатывается одновременно")
+    args = parser.parse_args()
+
+    setup_logging()
+    setup_tracing()
+    try:
+        asyncio.run(run(args.mode, args.max_concurrent))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+from typing import Optional
+from app import crud
+from app.config import SessionLocal, get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+Toggle = tuple[bool, Optional[str]]  # (done, done_by)
+
+
+class ToggleQueue:
+    """Очередь отложенной записи отметок выполнения.
+
+    Повторные нажатия по одной задаче схлопываются: в БД попадает только
+    последнее состояние. Запись выполняется одной транзакцией раз в
+    flush_interval секунд или при накоплении max_items задач.
+    """
+
+    def __init__(self, flush_interval: float, max_items: int):
+        self.flush_interval = flush_interval
+        self.max_items = max_items
+        self._pending: dict[int, Toggle] = {}
+        self._inflight: dict[int, Toggle] = {}
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def put(self, task_id: int, done: bool, done_by: Optional[str] = None):
+        self._pending[task_id] = (done, done_by if done else None)
+        if len(self._pending) >= self.max_items:
+            self._wakeup.set()
+
+    def pending(self, task_id: int) -> Optional[Toggle]:
+        """Состояние задачи, еще не записанное в БД"""
+        return self._pending.get(task_id) or self._inflight.get(task_id)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="toggle-write-behind")
+
+    async def stop(self):
+        """Останавливает фоновую запись и сбрасывает остаток очереди"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+
+            self._inflight, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(self._write, self._inflight)
+            except Exception:
+                logger.exception("Ошибка записи %d отметок выполнения", len(self._inflight))
+                # Возвращаем в очередь то, что не успели перезаписать новыми нажатиями
+                for task_id, toggle in self._inflight.items():
+                    self._pending.setdefault(task_id, toggle)
+            finally:
+                self._inflight = {}
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    @staticmethod
+    def _write(toggles: dict[int, Toggle]):
+        with SessionLocal() as db:
+            crud.apply_toggles(db, toggles)
+
+
+toggle_queue = ToggleQueue(
+    flush_interval=settings.toggle_flush_interval_ms / 1000,
+    max_items=settings.toggle_flush_max_items
+)
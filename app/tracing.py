@@ -0,0 +1,266 @@
+"""Легковесная трассировка по спанам.
+
+Спан - именованный замер времени с атрибутами; вложенные спаны связываются
+через ContextVar, поэтому работают и в корутинах, и в asyncio.to_thread.
+Трасса (корневой спан со всеми вложенными) экспортируется целиком, если корневой
+спан длился не меньше TRACING_SLOW_MS: в JSONL-файл или в OTLP/HTTP (JSON)
+коллектор.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from sqlalchemy import Engine, event
+from .config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+SERVICE_NAME = "todolist"
+MAX_STATEMENT_LENGTH = 500
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    # Все спаны трассы; общий список у корневого и вложенных
+    trace: list["Span"] = field(default_factory=list, repr=False)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+def start_span(name: str, **attributes) -> Span:
+    parent = current_span.get()
+    span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else _new_id(16),
+        span_id=_new_id(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+        trace=parent.trace if parent else [],
+    )
+    span.trace.append(span)
+    return span
+
+
+def end_span(span: Span, error: Optional[BaseException] = None):
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    if span.parent_id is None and span.duration_ms >= settings.tracing_slow_ms:
+        exporter.export(span.trace)
+
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    """Спан на время блока; без включенной трассировки ничего не делает"""
+    if not settings.tracing_enabled:
+        yield None
+        return
+
+    span = start_span(name, **attributes)
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        end_span(span, e)
+        raise
+    else:
+        end_span(span)
+    finally:
+        current_span.reset(token)
+
+
+class SpanExporter:
+    """Отправка трасс из фонового потока: запись в JSONL-файл или POST в OTLP/HTTP коллектор"""
+
+    def __init__(self, kind: str, file_path: str, otlp_url: str):
+        self.kind = kind
+        self.file_path = file_path
+        self.otlp_url = otlp_url
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]):
+        self._ensure_started()
+        self._queue.put([span.to_dict() for span in spans])
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def close(self):
+        """Дописывает накопленные трассы"""
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join(timeout=5)
+                self._thread = None
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            # Забираем все, что накопилось, одной записью
+            stop = False
+            while not self._queue.empty():
+                more = self._queue.get()
+                if more is None:
+                    stop = True
+                    break
+                batch.extend(more)
+            try:
+                if self.kind == "otlp":
+                    self._post_otlp(batch)
+                else:
+                    self._write_file(batch)
+            except Exception as e:
+                logger.warning("Не удалось экспортировать трассы: %s", e)
+            if stop:
+                return
+
+    def _write_file(self, spans: list[dict]):
+        with open(self.file_path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+
+    def _post_otlp(self, spans: list[dict]):
+        body = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.tracing"},
+                    "spans": [_otlp_span(span) for span in spans],
+                }],
+            }],
+        }, default=str).encode()
+        request = urllib.request.Request(
+            self.otlp_url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_span(span: dict) -> dict:
+    start = span["start_ns"]
+    otlp = {
+        "traceId": span["trace_id"],
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(start + int(span["duration_ms"] * 1e6)),
+        "attributes": [_otlp_attribute(key, value) for key, value in span["attributes"].items()],
+        "status": {"code": 2, "message": span["error"]} if span["error"] else {"code": 1},
+    }
+    if span["parent_id"]:
+        otlp["parentSpanId"] = span["parent_id"]
+    return otlp
+
+
+exporter = SpanExporter(settings.tracing_exporter, settings.tracing_file, settings.tracing_otlp_url)
+
+
+_instrumented = False
+
+
+def setup_tracing():
+    """Включает спаны SQL-запросов (один раз на процесс)"""
+    global _instrumented
+    if not settings.tracing_enabled or _instrumented:
+        return
+    _instrumented = True
+    _instrument_sqlalchemy()
+
+
+def _instrument_sqlalchemy():
+    """Спан на каждый SQL-запрос всех движков"""
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_span.get() is None:
+            # Запросы вне HTTP-запроса или обновления бота (фоновые задания) не трассируем
+            return
+        span = start_span("db.query", statement=statement[:MAX_STATEMENT_LENGTH], db=conn.engine.url.database)
+        conn.info.setdefault("tracing_spans", []).append(span)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("tracing_spans")
+        if spans:
+            end_span(spans.pop())
+
+    @event.listens_for(Engine, "handle_error")
+    def _on_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("tracing_spans") if conn is not None else None
+        if spans:
+            end_span(spans.pop(), exception_context.original_exception)
+
+
+async def fastapi_middleware(request, call_next):
+    """Корневой спан на HTTP-запрос; имя - шаблон маршрута"""
+    with trace_span("http", method=request.method, path=request.url.path) as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        span.name = f"http {request.method} {route.path if route else request.url.path}"
+        span.set(status_code=response.status_code)
+        return response
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import pytest
+
+# Настройки читаются при импорте app.config: тесты работают только с временной базой,
+# переменные окружения и .env разработчика ее не переопределяют
+_tmp = tempfile.mkdtemp(prefix="todolist-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_tmp, 'test.db')}",
+    "SHARD_URLS": "[]",
+    "DATABASE_REPLICA_URLS": "[]",
+    "TELEGRAM_BOT_TOKEN": "123:test",
+    "APP_MODE": "api",
+    "RUN_BACKGROUND_JOBS": "false",
+})
+
+
+@pytest.fixture
+def db():
+    """Сессия на чистой базе со схемой из моделей"""
+    from app import models  # noqa: F401
+    from app.config import Base, SessionLocal, engine
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with SessionLocal() as session:
+        yield session
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta, timezone
+from app import crud, schemas
+from app.models import Task, TaskArchive
+
+LONG_AGO = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def _done_task(db, title: str, updated_at: datetime) -> int:
+    task = crud.create_task(db, schemas.TaskCreate(title=title, user_id=1))
+    task_id = task.id
+    db.query(Task).filter(Task.id == task_id).update({"done": True, "updated_at": updated_at})
+    db.commit()
+    return task_id
+
+
+def test_archive_moves_oldest_first(db):
+    newer = _done_task(db, "новее", LONG_AGO + timedelta(days=1))
+    older = _done_task(db, "старше", LONG_AGO)
+
+    assert crud.archive_done_tasks(db, datetime.now(timezone.utc), batch_size=1) == 1
+    assert crud.get_archived_task(db, older) is not None
+    assert crud.get_task(db, newer) is not None
+
+
+def test_archive_skips_ids_already_archived(db):
+    conflicting = _done_task(db, "конфликт", LONG_AGO)
+    other = _done_task(db, "обычная", LONG_AGO + timedelta(days=1))
+    db.add(TaskArchive(id=conflicting, title="старая задача с тем же ID", user_id=2))
+    db.commit()
+
+    done_before = datetime.now(timezone.utc)
+    assert crud.archive_done_tasks(db, done_before, batch_size=10) == 1
+    assert crud.get_archived_task(db, other) is not None
+    assert crud.get_task(db, conflicting) is not None
+    assert crud.get_archive_conflicts(db, done_before, limit=10) == [conflicting]
+    # Повторный запуск не падает на конфликте
+    assert crud.archive_done_tasks(db, done_before, batch_size=10) == 0
@@ -0,0 +1,41 @@
+import os
+import sqlite3
+from contextlib import closing
+from app import backups
+
+
+def _write(path: str, *titles: str):
+    with closing(sqlite3.connect(path)) as conn:
+        conn.executemany("INSERT INTO notes (title) VALUES (?)", [(title,) for title in titles])
+        conn.commit()
+
+
+def _titles(path: str) -> list[str]:
+    with closing(sqlite3.connect(path)) as conn:
+        return [title for (title,) in conn.execute("SELECT title FROM notes ORDER BY id")]
+
+
+def test_snapshot_restore_round_trip(tmp_path):
+    db_path, root = str(tmp_path / "app.db"), str(tmp_path / "backups")
+    with closing(sqlite3.connect(db_path)) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, title TEXT)")
+    _write(db_path, "первая")
+    full = backups.snapshot(db_path, root)
+    _write(db_path, *(f"запись {i}" for i in range(200)))
+    delta = backups.snapshot(db_path, root)
+    _write(db_path, "после снимков")
+
+    assert (full["kind"], delta["kind"]) == (backups.KIND_FULL, backups.KIND_DELTA)
+    backup_dir = backups.backup_dir_for(db_path, root)
+    restored = str(tmp_path / "restored.db")
+
+    backups.restore(backup_dir, delta["name"], restored)
+    assert _titles(restored) == ["первая"] + [f"запись {i}" for i in range(200)]
+    backups.restore(backup_dir, full["name"], restored)
+    assert _titles(restored) == ["первая"]
+
+    # Ни сборка, ни проверка снимка не оставляют журналов рядом с базой и в каталоге копий
+    leftovers = [name for name in os.listdir(tmp_path) + os.listdir(backup_dir)
+                 if name.endswith(("-wal", "-shm", "-journal", ".restore", ".tmp")) and not name.startswith("app.db")]
+    assert leftovers == []
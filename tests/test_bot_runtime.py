@@ -0,0 +1,30 @@
+import asyncio
+from aiogram.types import Update
+from app.telegram_bot import runner
+
+
+def test_consumer_bounds_updates_in_processing(monkeypatch):
+    monkeypatch.setattr(runner.settings, "bot_max_pending_updates", 2)
+
+    async def scenario():
+        runtime = runner.BotRuntime(mode="polling")
+        release = asyncio.Event()
+
+        async def feed_update(bot, update):
+            await release.wait()
+
+        monkeypatch.setattr(runtime.dp, "feed_update", feed_update)
+        consumer = asyncio.create_task(runtime._consume())
+        for update_id in range(5):
+            await runtime.updates.put(Update(update_id=update_id))
+        await asyncio.sleep(0.05)
+        # Сверх лимита обновления остаются в очереди, а не в задачах обработки
+        assert len(runtime._processing) == 2
+        assert runtime.updates.qsize() == 3
+
+        release.set()
+        await asyncio.wait_for(runtime.updates.join(), timeout=1)
+        consumer.cancel()
+        await runtime.bot.session.close()
+
+    asyncio.run(scenario())
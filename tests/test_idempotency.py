@@ -0,0 +1,36 @@
+import pytest
+from app import idempotency
+from app.idempotency import IdempotencyKeyInUse, IdempotencyKeyMismatch, IdempotencyStore
+
+
+def _process_store() -> IdempotencyStore:
+    """Хранилище отдельного процесса: общая только таблица idempotency_keys"""
+    return IdempotencyStore(max_size=100, ttl=3600, use_db=True)
+
+
+def test_db_claim_blocks_other_processes_until_complete(db):
+    first, second = _process_store(), _process_store()
+
+    assert first.begin("key", "fp") is None
+    with pytest.raises(IdempotencyKeyInUse):
+        second.begin("key", "fp")
+
+    first.complete("key", "fp", 201, '{"id": 1}')
+    stored = second.begin("key", "fp")
+    assert (stored.status_code, stored.body) == (201, '{"id": 1}')
+    with pytest.raises(IdempotencyKeyMismatch):
+        _process_store().begin("key", "other")
+
+
+def test_release_frees_db_claim(db):
+    first, second = _process_store(), _process_store()
+    assert first.begin("key", "fp") is None
+    first.release("key")
+    assert second.begin("key", "fp") is None
+
+
+def test_abandoned_claim_is_taken_over(db, monkeypatch):
+    assert _process_store().begin("key", "fp") is None
+    monkeypatch.setattr(idempotency, "PENDING_TIMEOUT", 0.0)
+    assert _process_store().begin("key", "fp") is None
+
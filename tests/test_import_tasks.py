@@ -0,0 +1,85 @@
+import importlib.util
+import json
+import os
+import pytest
+from sqlalchemy import text
+from app.config import engine, get_settings
+from app.models import Task
+
+_spec = importlib.util.spec_from_file_location(
+    "import_tasks", os.path.join(os.path.dirname(__file__), "..", "tools", "import_tasks.py")
+)
+import_tasks = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(import_tasks)
+
+
+def _run(path: str, rejects: str, **options):
+    params = dict(fmt="ndjson", target_urls=[get_settings().database_url], sharded=False, batch_size=2,
+                  commit_rows=2, keep_indexes=False, rejects_path=rejects, report_interval=3600)
+    params.update(options)
+    import_tasks.import_tasks(path, **params)
+
+
+def _index_names() -> set[str]:
+    # inspect() не отражает индексы по выражениям (ix_tasks_done_at)
+    with engine.connect() as conn:
+        return set(conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks' AND sql IS NOT NULL"
+        )).scalars())
+
+
+def test_malformed_ndjson_lines_are_rejected(db, tmp_path):
+    path, rejects = tmp_path / "tasks.ndjson", tmp_path / "tasks.rejects"
+    path.write_text(
+        '{"title": "первая", "user_id": 1}\n'
+        '{"title": "обрыв", "user_id"\n'
+        '["не", "объект"]\n'
+        '{"user_id": 1}\n'
+        '{"title": "вторая", "user_id": 1}\n'
+    )
+    _run(str(path), str(rejects))
+
+    assert [task.title for task in db.query(Task).order_by(Task.position)] == ["первая", "вторая"]
+    rejected = [json.loads(line) for line in rejects.read_text().splitlines()]
+    assert [entry["line"] for entry in rejected] == [2, 3, 4]
+    assert _index_names() == {index.name for index in Task.__table__.indexes}
+
+
+def test_indexes_restored_when_import_fails(db, tmp_path, monkeypatch):
+    path = tmp_path / "tasks.ndjson"
+    path.write_text("".join(json.dumps({"title": f"задача {i}", "user_id": 1}) + "\n" for i in range(10)))
+
+    def fail(self, tasks):
+        raise RuntimeError("сбой")
+
+    monkeypatch.setattr(import_tasks.Target, "insert", fail)
+    with pytest.raises(RuntimeError):
+        _run(str(path), str(tmp_path / "tasks.rejects"))
+    assert _index_names() == {index.name for index in Task.__table__.indexes}
+
+
+def test_interrupted_import_resumes_from_checkpoint(db, tmp_path, monkeypatch):
+    path, rejects = tmp_path / "tasks.ndjson", tmp_path / "tasks.rejects"
+    path.write_text("".join(json.dumps({"title": f"задача {i}", "user_id": 1}) + "\n" for i in range(10)))
+
+    insert = import_tasks.Target.insert
+    calls = 0
+
+    def fail_on_third_batch(self, tasks):
+        nonlocal calls
+        calls += 1
+        if calls == 3:
+            raise RuntimeError("сбой")
+        insert(self, tasks)
+
+    monkeypatch.setattr(import_tasks.Target, "insert", fail_on_third_batch)
+    with pytest.raises(RuntimeError):
+        _run(str(path), str(rejects))
+    checkpoint = import_tasks.Checkpoint(str(path))
+    assert (checkpoint.line, checkpoint.imported) == (4, 4)
+
+    monkeypatch.setattr(import_tasks.Target, "insert", insert)
+    _run(str(path), str(rejects))
+    titles = [task.title for task in db.query(Task).order_by(Task.position)]
+    assert titles == [f"задача {i}" for i in range(10)]
+    assert not os.path.exists(checkpoint.path)
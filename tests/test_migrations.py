@@ -0,0 +1,43 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _alembic_config() -> Config:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    return config
+
+
+def _index_names(engine) -> set[str]:
+    with engine.connect() as conn:
+        return set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'tasks'")).scalars())
+
+
+def test_upgrade_downgrade_upgrade_round_trip():
+    from app.config import Base, engine
+
+    Base.metadata.drop_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS alembic_version"))
+    config = _alembic_config()
+
+    # Позиции заполняются для задач, созданных до миграции с ордерингом
+    command.upgrade(config, "a41d83f0c2e7")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO tasks (title, user_id) VALUES ('a', 1), ('b', 2), ('c', 1)"))
+    command.upgrade(config, "head")
+    with engine.connect() as conn:
+        positions = conn.execute(text("SELECT user_id, position FROM tasks ORDER BY id")).all()
+    assert positions == [(1, "n0"), (2, "n0"), (1, "n1")]
+    head_indexes = _index_names(engine)
+    assert "ix_tasks_done_at" in head_indexes
+
+    command.downgrade(config, "base")
+    assert "tasks" not in inspect(engine).get_table_names()
+
+    command.upgrade(config, "head")
+    assert _index_names(engine) == head_indexes
@@ -0,0 +1,59 @@
+import sqlite3
+from sqlalchemy import create_engine
+from app.online_migration import OnlineTableRebuild
+
+PARENT_SQL = "CREATE TABLE {table} (id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, title VARCHAR NOT NULL, done BOOLEAN)"
+
+
+def _create_db(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE tasks (id INTEGER NOT NULL PRIMARY KEY, title VARCHAR NOT NULL);
+        CREATE INDEX ix_tasks_title ON tasks (title);
+        CREATE TABLE notes (id INTEGER PRIMARY KEY, task_id INTEGER REFERENCES tasks (id), text VARCHAR);
+        CREATE TABLE log (task_id INTEGER);
+        CREATE TRIGGER notes_log AFTER INSERT ON notes BEGIN
+            INSERT INTO log SELECT id FROM tasks WHERE id = NEW.task_id;
+        END;
+    """)
+    conn.executemany("INSERT INTO tasks (id, title) VALUES (?, ?)", [(i, f"task {i}") for i in range(1, rows + 1)])
+    conn.execute("INSERT INTO notes (task_id, text) VALUES (1, 'note')")
+    conn.commit()
+    conn.close()
+
+
+def test_rebuild_keeps_references_and_copies_concurrent_changes(tmp_path):
+    path = str(tmp_path / "db.sqlite")
+    _create_db(path, rows=50)
+    writer = sqlite3.connect(path, isolation_level=None)
+
+    def write_during_copy(progress):
+        if progress.stage == "copy" and progress.copied == 10:
+            writer.execute("INSERT INTO tasks (id, title) VALUES (100, 'new')")
+            writer.execute("UPDATE tasks SET title = 'changed' WHERE id = 40")
+            writer.execute("DELETE FROM tasks WHERE id = 45")
+
+    OnlineTableRebuild(
+        create_engine(f"sqlite:///{path}"), "tasks",
+        create_sql=PARENT_SQL,
+        columns={"id": "id", "title": "title", "done": "0"},
+        chunk_size=10, pause=0, progress=write_during_copy,
+    ).run()
+    writer.close()
+
+    conn = sqlite3.connect(path)
+    schema = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL").fetchall())
+    assert "_tasks_old" not in " ".join(schema.values())
+    assert "REFERENCES tasks" in schema["notes"]
+    assert "FROM tasks" in schema["notes_log"]
+    assert "AUTOINCREMENT" in schema["tasks"]
+    assert "ix_tasks_title" in schema
+
+    titles = dict(conn.execute("SELECT id, title FROM tasks").fetchall())
+    assert len(titles) == 50
+    assert titles[100] == "new" and titles[40] == "changed" and 45 not in titles
+
+    conn.execute("INSERT INTO notes (task_id, text) VALUES (2, 'note')")
+    assert conn.execute("SELECT task_id FROM log").fetchall() == [(1,), (2,)]
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    conn.close()
@@ -0,0 +1,54 @@
+import random
+import pytest
+from app.ordering import INTEGER_ZERO, key_between, sequential_keys
+
+
+def test_key_between_bounds():
+    assert key_between(None, None) == INTEGER_ZERO
+    after = key_between(INTEGER_ZERO, None)
+    before = key_between(None, INTEGER_ZERO)
+    assert before < INTEGER_ZERO < after
+    middle = key_between(INTEGER_ZERO, after)
+    assert INTEGER_ZERO < middle < after
+
+
+def test_appends_grow_logarithmically():
+    key, keys = None, []
+    for _ in range(5000):
+        key = key_between(key, None)
+        keys.append(key)
+    assert keys == sorted(keys)
+    assert len(keys[-1]) <= 4
+
+
+def test_random_inserts_keep_order():
+    rng = random.Random(7)
+    keys = [key_between(None, None)]
+    for _ in range(2000):
+        i = rng.randint(0, len(keys))
+        a = keys[i - 1] if i > 0 else None
+        b = keys[i] if i < len(keys) else None
+        key = key_between(a, b)
+        assert (a is None or a < key) and (b is None or key < b)
+        keys.insert(i, key)
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+
+
+def test_repeated_inserts_at_one_place_lengthen_fraction():
+    a, b = INTEGER_ZERO, key_between(INTEGER_ZERO, None)
+    for _ in range(100):
+        b = key_between(a, b)
+        assert a < b
+    assert len(b) > len(a)
+
+
+def test_sequential_keys_are_short_and_ascending():
+    keys = sequential_keys(1000)
+    assert keys == sorted(keys) and len(set(keys)) == 1000
+    assert max(len(key) for key in keys) <= 3
+
+
+@pytest.mark.parametrize("a, b", [("n1", "n0"), ("n0", "n0"), ("n10", None)])
+def test_invalid_keys_rejected(a, b):
+    with pytest.raises(ValueError):
+        key_between(a, b)
@@ -0,0 +1,71 @@
+import importlib.util
+import os
+import shutil
+from datetime import date, datetime, timezone
+from sqlalchemy import create_engine, func, select
+from app.config import Base
+from app.models import Task, TaskArchive, TaskDailyStats, TaskEvent
+from app.sharding import shard_index_for_user, shard_index_of_id
+
+_spec = importlib.util.spec_from_file_location(
+    "rebalance_shards", os.path.join(os.path.dirname(__file__), "..", "tools", "rebalance_shards.py")
+)
+rebalance_shards = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(rebalance_shards)
+
+NOW = datetime(2026, 10, 1, tzinfo=timezone.utc)
+USERS = (1, 2, 3)
+
+
+def _create(path) -> str:
+    url = f"sqlite:///{path}"
+    Base.metadata.create_all(create_engine(url))
+    return url
+
+
+def _fill_source(url: str):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        for user_id in USERS:
+            task_id = conn.execute(Task.__table__.insert().values(title=f"task {user_id}", user_id=user_id)).inserted_primary_key[0]
+            archived_id = task_id + 100
+            purged_id = task_id + 200
+            conn.execute(TaskArchive.__table__.insert().values(id=archived_id, title="old", user_id=user_id))
+            conn.execute(TaskEvent.__table__.insert(), [
+                {"task_id": event_task_id, "user_id": user_id, "type": "created", "created_at": NOW}
+                for event_task_id in (task_id, archived_id, purged_id)
+            ])
+            conn.execute(TaskDailyStats.__table__.insert().values(day=date(2026, 10, 1), user_id=user_id, created=3))
+
+
+def _counts(url: str, user_id: int) -> tuple[int, int, int, int]:
+    with create_engine(url).connect() as conn:
+        return tuple(
+            conn.execute(select(func.count()).select_from(table).where(table.c.user_id == user_id)).scalar()
+            for table in (Task.__table__, TaskArchive.__table__, TaskEvent.__table__, TaskDailyStats.__table__)
+        )
+
+
+def test_rebalance_moves_user_data_and_reruns_without_duplicates(tmp_path):
+    source = _create(tmp_path / "source.db")
+    targets = [_create(tmp_path / f"shard{i}.db") for i in range(2)]
+    _fill_source(source)
+    shutil.copy(tmp_path / "source.db", tmp_path / "source.backup")
+    mapping = str(tmp_path / "mapping.csv")
+
+    rebalance_shards.rebalance([source], targets, mapping, batch_size=1)
+    # Сбой между вставкой в целевой шард и удалением из исходного: исходные данные на месте
+    shutil.copy(tmp_path / "source.backup", tmp_path / "source.db")
+    rebalance_shards.rebalance([source], targets, mapping, batch_size=1)
+
+    for user_id in USERS:
+        index = shard_index_for_user(user_id, len(targets))
+        assert _counts(source, user_id) == (0, 0, 0, 0)
+        assert _counts(targets[index], user_id) == (1, 1, 3, 1)
+
+        with create_engine(targets[index]).connect() as conn:
+            task_ids = set(conn.execute(select(Task.id).where(Task.user_id == user_id)).scalars())
+            task_ids |= set(conn.execute(select(TaskArchive.id).where(TaskArchive.user_id == user_id)).scalars())
+            event_task_ids = set(conn.execute(select(TaskEvent.task_id).where(TaskEvent.user_id == user_id)).scalars())
+        assert task_ids < event_task_ids
+        assert all(shard_index_of_id(task_id) == index for task_id in event_task_ids)
@@ -0,0 +1,14 @@
+from app.schemas import TaskView
+from app.telegram_bot.handlers import _render_task, render_task
+
+
+def test_render_cache_ignores_position():
+    _render_task.cache_clear()
+    task = TaskView(id=1, title="задача", done=False, done_by=None, position="n0")
+
+    first = render_task(task)
+    moved = render_task(task._replace(position="n0V"))
+    assert moved == first
+    assert _render_task.cache_info().hits == 1
+
+    assert render_task(task._replace(done=True, done_by="user")) != first
@@ -0,0 +1,30 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app import crud, schemas
+from app.config import SessionLocal
+from app.singleflight import single_flight
+
+
+def test_read_after_own_write_does_not_join_earlier_flight(db):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_stale_read():
+        started.set()
+        release.wait(5)
+        return []
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        stale = pool.submit(single_flight.do, crud._tasks_flight_key(db, 1), slow_stale_read)
+        started.wait(5)
+        crud.create_task(db, schemas.TaskCreate(title="своя запись", user_id=1))
+
+        def read_own_write():
+            with SessionLocal() as session:
+                return crud.get_tasks_coalesced(session, 1)
+
+        fresh = pool.submit(read_own_write)
+        try:
+            assert [task.title for task in fresh.result(timeout=5)] == ["своя запись"]
+        finally:
+            release.set()
+        assert stale.result(timeout=5) == []
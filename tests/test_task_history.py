@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+from app import crud, schemas
+
+
+def test_task_ids_are_not_reused(db):
+    first = crud.create_task(db, schemas.TaskCreate(title="первая", user_id=1))
+    first_id = first.id
+    db.delete(first)
+    db.commit()
+
+    second = crud.create_task(db, schemas.TaskCreate(title="вторая", user_id=2))
+    assert second.id > first_id
+
+
+def test_history_is_scoped_by_owner(db):
+    task = crud.create_task(db, schemas.TaskCreate(title="задача", user_id=1))
+    crud.mark_task_done(db, task.id, done_by="user")
+
+    events = crud.get_task_events(db, task.id, user_id=1, limit=10)
+    assert [event["type"] for event in events] == ["done", "created"]
+    assert crud.get_task_events(db, task.id, user_id=2, limit=10) == []
+
+
+def test_purge_keeps_history(db):
+    task = crud.create_task(db, schemas.TaskCreate(title="задача", user_id=1))
+    task_id = task.id
+    crud.delete_task(db, task_id)
+
+    purged = crud.purge_deleted_tasks(db, datetime.now(timezone.utc) + timedelta(seconds=1), batch_size=10)
+    assert purged == 1
+    assert crud.get_task(db, task_id) is None
+    events = crud.get_task_events(db, task_id, user_id=1, limit=10)
+    assert [event["type"] for event in events] == ["purged", "deleted", "created"]
+
+
+def test_task_after_purge_gets_new_id_and_empty_history(db):
+    purged = crud.create_task(db, schemas.TaskCreate(title="старая", user_id=1))
+    purged_id = purged.id
+    crud.delete_task(db, purged_id)
+    crud.purge_deleted_tasks(db, datetime.now(timezone.utc) + timedelta(seconds=1), batch_size=10)
+
+    task = crud.create_task(db, schemas.TaskCreate(title="новая", user_id=2))
+    assert task.id != purged_id
+    assert [event["type"] for event in crud.get_task_events(db, task.id, user_id=2, limit=10)] == ["created"]
@@ -0,0 +1,67 @@
+# запуск из корня:
+#   python tools/backup.py snapshot                     # снимки всех SQLite-баз (DATABASE_URL или SHARD_URLS)
+#   python tools/backup.py list todolist.db
+#   python tools/backup.py verify todolist.db 20260101T030000000000Z
+#   python tools/backup.py restore todolist.db 20260101T030000000000Z --to ./todolist.db
+#
+# Снимки снимаются без остановки бота и API (app/backups.py), каталог - BACKUP_DIR.
+# verify собирает снимок во временный файл и проверяет его, restore после той же проверки
+# заменяет --to (бот и API на время восстановления нужно остановить).
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import backups
+from app.config import get_settings
+
+
+def print_snapshots(backup_dir: str):
+    snapshots = backups.load_manifest(backup_dir)
+    if not snapshots:
+        print(f"Снимков нет: {backup_dir}")
+        return
+    for s in snapshots:
+        size = s["changed_pages"] * s["page_size"] / 1024 / 1024
+        print(f"{s['name']}  {s['kind']:<5}  {s['changed_pages']:>8} из {s['page_count']:>8} страниц  "
+              f"{size:8.1f} МБ  цепочка {s['base']}")
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Резервные копии SQLite-баз задач")
+    parser.add_argument("--backup-dir", default=settings.backup_dir)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("snapshot", help="Снять снимки всех баз приложения")
+    for command in ("list", "verify", "restore"):
+        sub = commands.add_parser(command)
+        sub.add_argument("database", help="Файл базы, например todolist.db")
+        if command != "list":
+            sub.add_argument("name", help="Имя снимка из list")
+        if command == "restore":
+            sub.add_argument("--to", required=True, help="Куда восстановить (файл заменяется)")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        for entry in backups.backup_all(args.backup_dir):
+            print(f"📸 {entry['name']} ({entry['kind']}): {entry['changed_pages']} из {entry['page_count']} страниц")
+        sys.exit(0)
+
+    backup_dir = backups.backup_dir_for(args.database, args.backup_dir)
+    try:
+        if args.command == "list":
+            print_snapshots(backup_dir)
+        elif args.command == "verify":
+            with tempfile.TemporaryDirectory() as tmp:
+                backups.restore(backup_dir, args.name, os.path.join(tmp, "verify.db"))
+            print(f"✅ Снимок {args.name} цел")
+        else:
+            backups.restore(backup_dir, args.name, os.path.abspath(args.to))
+            print(f"✅ Снимок {args.name} проверен и восстановлен в {args.to}")
+    except backups.BackupError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
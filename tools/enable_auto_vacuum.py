@@ -0,0 +1,46 @@
+# запуск из корня:  python tools/enable_auto_vacuum.py [todolist.db ...]
+#
+# Однократный перевод SQLite-баз в режим auto_vacuum=INCREMENTAL: после этого
+# фоновое уплотнение (app/compaction.py) возвращает освободившиеся страницы
+# файловой системе небольшими порциями. Перевод требует полного VACUUM, который
+# перезаписывает файл и блокирует базу на все время работы, поэтому бот и API
+# на время выполнения нужно остановить. Без аргументов обрабатываются базы
+# из DATABASE_URL или SHARD_URLS.
+
+import argparse
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+SQLITE_AUTO_VACUUM_INCREMENTAL = 2
+
+
+def enable(path: str) -> bool:
+    """Переводит базу в incremental-режим; False - база уже в нем"""
+    with closing(sqlite3.connect(path, isolation_level=None)) as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == SQLITE_AUTO_VACUUM_INCREMENTAL:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+
+
+def configured_paths() -> list[str]:
+    from app.config import engines
+
+    return [engine.url.database for engine in engines if engine.dialect.name == "sqlite"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перевод SQLite-баз в режим auto_vacuum=INCREMENTAL")
+    parser.add_argument("paths", nargs="*")
+    args = parser.parse_args()
+
+    for path in args.paths or configured_paths():
+        if enable(path):
+            print(f"✅ {path}: auto_vacuum=INCREMENTAL")
+        else:
+            print(f"⏭ {path}: уже в режиме INCREMENTAL")
@@ -0,0 +1,247 @@
+# запуск из корня:  python tools/fake_telegram.py --port 8090 --latency-ms 20 200 --rate-limit 0.01 --not-found 0.01
+#
+# Локальная замена Telegram Bot API для нагрузочных тестов. Бот подключается к ней через
+# TELEGRAM_API_BASE=http://localhost:8090. Поддерживаются getUpdates, sendMessage,
+# editMessageText, editMessageReplyMarkup, deleteMessage и answerCallbackQuery, остальные
+# методы отвечают true. Случайно возвращаются 429 с retry_after и ошибки "message not found".
+#
+# Обновления от имени пользователей добавляются POST /fake/messages {"chat_id", "text"}
+# и POST /fake/callbacks {"chat_id", "message_id", "data"}; сообщения чата - GET /fake/chats/{chat_id},
+# счетчики - GET /fake/stats.
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from typing import Optional
+from aiohttp import web
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake Bot", "username": "fake_todo_bot"}
+RATE_LIMITED_METHODS = {"sendMessage", "editMessageText", "editMessageReplyMarkup", "deleteMessage"}
+
+
+class FakeTelegram:
+    def __init__(self, latency_ms: tuple[float, float] = (0, 0), rate_limit: float = 0.0,
+                 not_found: float = 0.0, retry_after: int = 1, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.rate_limit = rate_limit
+        self.not_found = not_found
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.chats: dict[int, dict[int, dict]] = {}
+        self._next_message_id: dict[int, int] = {}
+        self.updates: list[dict] = []
+        self._next_update_id = 1
+        self._new_updates = asyncio.Condition()
+
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.delivered_updates = 0
+
+    # --- обновления от пользователей ---
+
+    async def user_message(self, chat_id: int, text: str) -> dict:
+        sender = {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}
+        message = self._store_message(chat_id, text, sender=sender)
+        await self._push_update({"message": message})
+        return message
+
+    async def user_callback(self, chat_id: int, message_id: int, data: str):
+        message = self.chats.get(chat_id, {}).get(message_id)
+        if message is None:
+            return
+        await self._push_update({"callback_query": {
+            "id": str(self._next_update_id),
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+            "message": message,
+            "chat_instance": str(chat_id),
+            "data": data,
+        }})
+
+    async def _push_update(self, update: dict):
+        async with self._new_updates:
+            update["update_id"] = self._next_update_id
+            self._next_update_id += 1
+            self.updates.append(update)
+            self._new_updates.notify_all()
+
+    def _store_message(self, chat_id: int, text: str, sender: dict = BOT_USER,
+                       reply_markup: Optional[dict] = None) -> dict:
+        message_id = self._next_message_id.get(chat_id, 1)
+        self._next_message_id[chat_id] = message_id + 1
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": sender,
+            "text": text,
+        }
+        if reply_markup and "inline_keyboard" in reply_markup:
+            message["reply_markup"] = reply_markup
+        self.chats.setdefault(chat_id, {})[message_id] = message
+        return message
+
+    # --- Bot API ---
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        self.calls[method] += 1
+
+        if method != "getUpdates" and self.latency_ms[1] > 0:
+            await asyncio.sleep(self.random.uniform(*self.latency_ms) / 1000)
+
+        if method in RATE_LIMITED_METHODS and self.random.random() < self.rate_limit:
+            return self._error(429, f"Too Many Requests: retry after {self.retry_after}",
+                               parameters={"retry_after": self.retry_after})
+
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            return self._ok(True)
+        return await handler(params)
+
+    def _ok(self, result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    def _error(self, code: int, description: str, **extra) -> web.Response:
+        self.errors[f"{code} {description.split(':')[-1].strip()}" if code == 400 else str(code)] += 1
+        # aiogram выбирает тип исключения по HTTP-статусу ответа, как у настоящего Bot API
+        return web.json_response({"ok": False, "error_code": code, "description": description, **extra},
+                                 status=code)
+
+    def _find(self, params) -> Optional[dict]:
+        chat = self.chats.get(int(params.get("chat_id", 0)), {})
+        message = chat.get(int(params.get("message_id", 0)))
+        if message is not None and self.random.random() < self.not_found:
+            # Сообщение удалено пользователем
+            del chat[message["message_id"]]
+            return None
+        return message
+
+    @staticmethod
+    def _markup(params) -> Optional[dict]:
+        markup = params.get("reply_markup")
+        if isinstance(markup, str):
+            markup = json.loads(markup)
+        return markup
+
+    async def _api_getMe(self, params):
+        return self._ok(BOT_USER)
+
+    async def _api_getUpdates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        limit = int(params.get("limit") or 100)
+
+        async with self._new_updates:
+            # Подтвержденные обновления больше не нужны
+            self.updates = [update for update in self.updates if update["update_id"] >= offset]
+            if not self.updates and timeout:
+                try:
+                    await asyncio.wait_for(self._new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            batch = self.updates[:limit]
+
+        self.delivered_updates += len(batch)
+        return self._ok(batch)
+
+    async def _api_sendMessage(self, params):
+        message = self._store_message(int(params["chat_id"]), params.get("text", ""),
+                                      reply_markup=self._markup(params))
+        return self._ok(message)
+
+    async def _api_editMessageText(self, params):
+        message = self._find(params)
+        if message is None:
+            return self._error(400, "Bad Request: message to edit not found")
+        markup = self._markup(params)
+        if message["text"] == params.get("text") and message.get("reply_markup") == markup:
+            return self._error(400, "Bad Request: message is not modified")
+        message["text"] = params.get("text", "")
+        message.pop("reply_markup", None)
+        if markup and "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+        return self._ok(message)
+
+    async def _api_editMessageReplyMarkup(self, params):
+        message = self._find(params)
+        if message is None:
+            return self._error(400, "Bad Request: message to edit not found")
+        markup = self._markup(params)
+        message.pop("reply_markup", None)
+        if markup and "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+        return self._ok(message)
+
+    async def _api_deleteMessage(self, params):
+        message = self._find(params)
+        if message is None:
+            return self._error(400, "Bad Request: message to delete not found")
+        del self.chats[message["chat"]["id"]][message["message_id"]]
+        return self._ok(True)
+
+    async def close(self):
+        """Завершает ожидающие getUpdates, чтобы сервер мог остановиться"""
+        async with self._new_updates:
+            self._new_updates.notify_all()
+
+    # --- управление ---
+
+    async def fake_message(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        return web.json_response(await self.user_message(int(payload["chat_id"]), payload["text"]))
+
+    async def fake_callback(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        await self.user_callback(int(payload["chat_id"]), int(payload["message_id"]), payload["data"])
+        return web.json_response({"ok": True})
+
+    async def fake_chat(self, request: web.Request) -> web.Response:
+        chat = self.chats.get(int(request.match_info["chat_id"]), {})
+        return web.json_response(list(chat.values()))
+
+    async def fake_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> dict:
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "pending_updates": len(self.updates),
+            "delivered_updates": self.delivered_updates,
+            "chats": len(self.chats),
+            "messages": sum(len(chat) for chat in self.chats.values()),
+        }
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=10 * 1024 * 1024)
+        app.router.add_post("/fake/messages", self.fake_message)
+        app.router.add_post("/fake/callbacks", self.fake_callback)
+        app.router.add_get("/fake/chats/{chat_id}", self.fake_chat)
+        app.router.add_get("/fake/stats", self.fake_stats)
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=(0, 0), metavar=("MIN", "MAX"))
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--not-found", type=float, default=0.0, help="Доля сообщений, 'удаленных' пользователем")
+    args = parser.parse_args()
+
+    fake = FakeTelegram(tuple(args.latency_ms), args.rate_limit, args.not_found, args.retry_after)
+    print(f"🤖 Fake Bot API: http://{args.host}:{args.port}")
+    web.run_app(fake.app(), host=args.host, port=args.port, print=None)
@@ -0,0 +1,346 @@
+# запуск из корня (бот и API должны быть остановлены, миграции применены):
+#   python tools/import_tasks.py tasks.csv
+#   python tools/import_tasks.py tasks.ndjson --to sqlite:///./shard0.db sqlite:///./shard1.db
+#
+# Массовая загрузка задач из CSV (первая строка - заголовок) или NDJSON (объект на строку)
+# с полями schemas.TaskCreate: title, user_id, done, done_by, due_at, remind_at.
+#
+# Файл читается потоком, строки проверяются пачками одним вызовом TypeAdapter и вставляются
+# executemany в транзакциях по --commit-rows строк; память не зависит от размера файла.
+# На время загрузки вторичные индексы tasks удаляются и строятся заново в конце, в том числе если
+# загрузка прервана (--keep-indexes оставляет их). Задачи добавляются в конец списка пользователя и
+# учитываются в сводках app/analytics.py днем загрузки. Строки с ошибками (в том числе не JSON и не
+# JSON-объекты в NDJSON) пишутся в --rejects и не останавливают загрузку.
+#
+# После каждой транзакции позиция в файле сохраняется в <файл>.checkpoint: повторный запуск
+# продолжает с нее (при сбое между фиксацией транзакции и записью контрольной точки последняя
+# транзакция загрузится повторно, а отклоненные строки незавершенной транзакции повторятся в --rejects).
+# После успешного завершения контрольная точка удаляется.
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Callable, Iterator, Optional
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.schema import CreateIndex, DropIndex
+
+from app import analytics, ordering, schemas
+from app.config import create_db_engine, get_settings
+from app.crud import as_utc
+from app.models import Task, TaskIdSequence
+from app.sharding import make_task_id, shard_index_for_user
+
+# Индекс нужен для поиска последней позиции пользователя во время загрузки
+KEPT_INDEXES = {"ix_tasks_user_id_position"}
+# Последние позиции пользователей в памяти; остальные читаются из БД
+POSITION_CACHE_SIZE = 100_000
+
+tasks_adapter = TypeAdapter(list[schemas.TaskCreate])
+
+
+class Checkpoint:
+    def __init__(self, path: str):
+        self.path = path + ".checkpoint"
+        self.offset = 0
+        self.line = 0
+        self.imported = 0
+        self.rejected = 0
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.__dict__.update(json.load(f))
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"offset": self.offset, "line": self.line,
+                       "imported": self.imported, "rejected": self.rejected}, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# (номер строки, ошибки, исходная запись)
+RejectCallback = Callable[[int, list[str], object], None]
+
+
+class Reader:
+    """Записи файла с номером строки; offset - байтовая позиция после последней выданной записи.
+
+    Строки NDJSON, которые не разбираются как JSON-объект, передаются в reject и пропускаются.
+    """
+
+    def __init__(self, path: str, fmt: str, offset: int, line: int, reject: RejectCallback):
+        self.file = open(path, "rb")
+        self.fmt = fmt
+        self.reject = reject
+        self.offset = offset
+        self.line = line
+        self.header = None
+        if fmt == "csv":
+            self.header = next(csv.reader([self.file.readline().decode("utf-8-sig")]))
+            self.offset = max(offset, self.file.tell())
+            self.line = max(line, 1)
+        self.file.seek(self.offset)
+
+    def _lines(self) -> Iterator[str]:
+        for raw in self.file:
+            self.offset += len(raw)
+            self.line += 1
+            yield raw.decode("utf-8")
+
+    def __iter__(self) -> Iterator[tuple[int, dict]]:
+        if self.fmt == "ndjson":
+            for line in self._lines():
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.reject(self.line, [f"некорректный JSON: {e}"], line.rstrip("\r\n"))
+                    continue
+                if not isinstance(record, dict):
+                    self.reject(self.line, ["запись должна быть JSON-объектом"], record)
+                    continue
+                yield self.line, record
+            return
+        # csv.reader читает строки по мере надобности, поэтому offset после записи точен
+        for values in csv.reader(self._lines()):
+            if values:
+                yield self.line, {key: value for key, value in zip(self.header, values) if value != ""}
+
+    def close(self):
+        self.file.close()
+
+
+class Target:
+    """База (или шард) для загрузки"""
+
+    def __init__(self, url: str, shard_index: Optional[int]):
+        self.engine = create_db_engine(url)
+        self.shard_index = shard_index
+        self.conn = None
+        self.positions: OrderedDict[int, Optional[str]] = OrderedDict()
+
+    def begin(self):
+        self.conn = self.engine.connect()
+        self.transaction = self.conn.begin()
+
+    def commit(self):
+        self.transaction.commit()
+        self.conn.close()
+        self.conn = None
+
+    def rollback(self):
+        if self.conn is not None:
+            self.transaction.rollback()
+            self.conn.close()
+            self.conn = None
+
+    def drop_indexes(self):
+        with self.engine.begin() as conn:
+            for index in Task.__table__.indexes:
+                if index.name not in KEPT_INDEXES:
+                    conn.execute(DropIndex(index, if_exists=True))
+
+    def create_indexes(self):
+        with self.engine.begin() as conn:
+            for index in Task.__table__.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
+    def _load_positions(self, user_ids: set[int]):
+        missing = [user_id for user_id in user_ids if user_id not in self.positions]
+        if missing:
+            rows = self.conn.execute(
+                select(Task.user_id, func.max(Task.position))
+                .where(Task.user_id.in_(missing), Task.deleted_at.is_(None))
+                .group_by(Task.user_id)
+            ).all()
+            last = dict(rows)
+            for user_id in missing:
+                self.positions[user_id] = last.get(user_id)
+        for user_id in user_ids:
+            self.positions.move_to_end(user_id)
+        while len(self.positions) > POSITION_CACHE_SIZE:
+            self.positions.popitem(last=False)
+
+    def _reserve_ids(self, count: int) -> int:
+        """Резервирует count локальных номеров подряд; возвращает первый"""
+        task_id_seq = TaskIdSequence.__table__
+        first = self.conn.execute(insert(task_id_seq)).inserted_primary_key[0]
+        last = first + count - 1
+        if count > 1:
+            self.conn.execute(insert(task_id_seq).values(id=last))
+            if self.conn.dialect.name == "postgresql":
+                self.conn.execute(text("SELECT setval(pg_get_serial_sequence('task_id_seq', 'id'), :last)"),
+                                  {"last": last})
+        self.conn.execute(delete(task_id_seq).where(task_id_seq.c.id < last))
+        return first
+
+    def insert(self, tasks: list[schemas.TaskCreate]):
+        self._load_positions({task.user_id for task in tasks})
+        rows = []
+        for task in tasks:
+            position = ordering.key_between(self.positions[task.user_id], None)
+            self.positions[task.user_id] = position
+            rows.append({
+                "title": task.title, "user_id": task.user_id, "done": task.done, "done_by": task.done_by,
+                "due_at": as_utc(task.due_at), "remind_at": as_utc(task.remind_at), "position": position,
+            })
+        if self.shard_index is not None:
+            first = self._reserve_ids(len(rows))
+            for offset, row in enumerate(rows):
+                row["id"] = make_task_id(first + offset, self.shard_index)
+        self.conn.execute(insert(Task.__table__), rows)
+
+        events = [(task.user_id, analytics.CREATED, None) for task in tasks]
+        events += [(task.user_id, analytics.COMPLETED, task.done_by) for task in tasks if task.done]
+        for stmt, stats_rows in analytics.statements(events):
+            self.conn.execute(stmt, stats_rows)
+
+
+def validate(batch: list[tuple[int, dict]], reject: RejectCallback) -> list[schemas.TaskCreate]:
+    """Проверяет пачку одним вызовом; строки с ошибками передает в reject и отбрасывает"""
+    try:
+        return tasks_adapter.validate_python([record for _, record in batch])
+    except ValidationError as e:
+        bad = {}
+        for error in e.errors(include_url=False, include_context=False, include_input=False):
+            bad.setdefault(error["loc"][0], []).append(f"{'.'.join(map(str, error['loc'][1:]))}: {error['msg']}")
+    for i, messages in bad.items():
+        line, record = batch[i]
+        reject(line, messages, record)
+    return tasks_adapter.validate_python([record for i, (_, record) in enumerate(batch) if i not in bad])
+
+
+def restore_indexes(targets: list[Target]):
+    print("🔧 Восстановление индексов...")
+    for target in targets:
+        try:
+            target.create_indexes()
+        except Exception as e:
+            print(f"❌ ИНДЕКСЫ НЕ ВОССТАНОВЛЕНЫ в {target.engine.url}: {e}\n"
+                  f"   Запустите загрузку повторно или выполните alembic upgrade head до запуска бота и API",
+                  file=sys.stderr)
+
+
+def import_tasks(path: str, fmt: str, target_urls: list[str], sharded: bool, batch_size: int,
+                 commit_rows: int, keep_indexes: bool, rejects_path: str, report_interval: float):
+    targets = [Target(url, i if sharded else None) for i, url in enumerate(target_urls)]
+    checkpoint = Checkpoint(path)
+    if checkpoint.offset:
+        print(f"↪️ Продолжение с строки {checkpoint.line}: загружено {checkpoint.imported}")
+
+    rejects = open(rejects_path, "a")
+
+    def reject(line: int, errors: list[str], record: object):
+        rejects.write(json.dumps({"line": line, "errors": errors, "record": record}, ensure_ascii=False) + "\n")
+        checkpoint.rejected += 1
+
+    reader = Reader(path, fmt, checkpoint.offset, checkpoint.line, reject)
+    started = last_report = time.monotonic()
+    imported_before = checkpoint.imported
+    in_transaction = 0
+
+    def commit():
+        for target in targets:
+            target.commit()
+        checkpoint.offset, checkpoint.line = reader.offset, reader.line
+        checkpoint.save()
+
+    def flush(batch: list[tuple[int, dict]]):
+        nonlocal in_transaction
+        tasks = validate(batch, reject)
+        by_target: dict[int, list[schemas.TaskCreate]] = {}
+        for task in tasks:
+            index = shard_index_for_user(task.user_id, len(targets)) if sharded else 0
+            by_target.setdefault(index, []).append(task)
+        for index, target_tasks in by_target.items():
+            targets[index].insert(target_tasks)
+        checkpoint.imported += len(tasks)
+        in_transaction += len(batch)
+
+    try:
+        if not keep_indexes:
+            for target in targets:
+                target.drop_indexes()
+        for target in targets:
+            target.begin()
+        batch = []
+        for line, record in reader:
+            batch.append((line, record))
+            if len(batch) < batch_size:
+                continue
+            flush(batch)
+            batch = []
+            if in_transaction >= commit_rows:
+                commit()
+                in_transaction = 0
+                for target in targets:
+                    target.begin()
+
+            now = time.monotonic()
+            if now - last_report >= report_interval:
+                last_report = now
+                rate = (checkpoint.imported - imported_before) / (now - started)
+                print(f"   ├─ строка {reader.line}: загружено {checkpoint.imported}, "
+                      f"отклонено {checkpoint.rejected}, {rate:.0f} строк/с")
+        if batch:
+            flush(batch)
+        commit()
+    except BaseException:
+        for target in targets:
+            target.rollback()
+        print(f"⚠️ Загрузка прервана на строке {checkpoint.line}; повторный запуск продолжит с нее")
+        if not keep_indexes:
+            # Без индексов бот и API после запуска читали бы tasks полным перебором
+            restore_indexes(targets)
+        raise
+    finally:
+        reader.close()
+        rejects.close()
+
+    loaded_at = time.monotonic()
+    if not keep_indexes:
+        print("🔧 Построение индексов...")
+        for target in targets:
+            target.create_indexes()
+    checkpoint.remove()
+
+    elapsed = loaded_at - started
+    rate = (checkpoint.imported - imported_before) / elapsed if elapsed > 0 else 0.0
+    print(f"\n✅ Готово. Загружено: {checkpoint.imported}, отклонено: {checkpoint.rejected} ({rejects_path}), "
+          f"{rate:.0f} строк/с, индексы: {time.monotonic() - loaded_at:.1f} с")
+
+
+if __name__ == "__main__":
+    settings = get_settings()
+
+    parser = argparse.ArgumentParser(description="Массовая загрузка задач из CSV или NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="По умолчанию - по расширению файла")
+    parser.add_argument("--to", dest="target_urls", nargs="+",
+                        help="Базы (несколько - шарды); по умолчанию SHARD_URLS или DATABASE_URL")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Строк в пачке проверки и вставки")
+    parser.add_argument("--commit-rows", type=int, default=100_000, help="Строк в транзакции")
+    parser.add_argument("--keep-indexes", action="store_true", help="Не удалять индексы на время загрузки")
+    parser.add_argument("--rejects", help="NDJSON со строками с ошибками (по умолчанию <файл>.rejects)")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    target_urls = args.target_urls or settings.shard_urls or [settings.database_url]
+    # ID задачи в шарде кодирует номер шарда
+    sharded = len(target_urls) > 1 or (not args.target_urls and bool(settings.shard_urls))
+
+    import_tasks(args.path, fmt, target_urls, sharded, args.batch_size, args.commit_rows,
+                 args.keep_indexes, args.rejects or args.path + ".rejects", args.report_interval)
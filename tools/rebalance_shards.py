@@ -0,0 +1,228 @@
+# запуск из корня (бот и API должны быть остановлены, целевые шарды - с примененными миграциями):
+#   python tools/rebalance_shards.py --from sqlite:///./todolist.db --to sqlite:///./shard0.db sqlite:///./shard1.db
+#
+# Переносит данные каждого пользователя в шард, выбранный по хешу user_id для
+# нового списка шардов: задачи, архив, историю изменений (task_events) и дневные
+# сводки (task_daily_stats). ID задачи кодирует шард, поэтому перенесенные задачи
+# получают новые ID, история переписывается на них; соответствие старых и новых
+# ID пишется в CSV (--mapping).
+#
+# Перенос можно перезапускать после сбоя. Новый ID попадает в CSV до вставки
+# в целевой шард, и при повторном запуске задача получает тот же ID; копия, уже
+# вставленная в целевой шард, не вставляется второй раз. Из исходного шарда
+# данные удаляются только после записи в целевой. Для каждого нового
+# перераспределения нужен новый файл соответствия.
+
+import argparse
+import csv
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import Engine, MetaData, Table, create_engine, delete, insert, select, union
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.sharding import make_task_id, shard_index_for_user, shard_index_of_id
+
+# Таблицы шарда с задачами пользователя: ID строки - глобальный ID задачи
+TASK_TABLES = ("tasks", "tasks_archive")
+
+
+@dataclass
+class Shard:
+    url: str
+    engine: Engine
+    tables: dict[str, Table]
+
+
+def connect(url: str) -> Shard:
+    engine = create_engine(url)
+    metadata = MetaData()
+    names = (*TASK_TABLES, "task_events", "task_daily_stats", "task_id_seq")
+    return Shard(url, engine, {name: Table(name, metadata, autoload_with=engine) for name in names})
+
+
+class IdMapping:
+    """Соответствие (старый ID, user_id) -> новый ID; строки дописываются в CSV до вставки"""
+
+    def __init__(self, path: str):
+        self.ids: dict[tuple[int, int], int] = {}
+        if os.path.exists(path):
+            with open(path, newline="") as file:
+                for old_id, new_id, user_id in csv.reader(file):
+                    self.ids[(int(old_id), int(user_id))] = int(new_id)
+        self.file = open(path, "a", newline="")
+        self.writer = csv.writer(self.file)
+
+    def get(self, old_id: int, user_id: int):
+        return self.ids.get((old_id, user_id))
+
+    def add(self, pairs: list[tuple[int, int, int]]):
+        self.writer.writerows(pairs)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        for old_id, new_id, user_id in pairs:
+            self.ids[(old_id, user_id)] = new_id
+
+    def close(self):
+        self.file.close()
+
+
+def assign_ids(old_ids: list[int], user_id: int, target: Shard, target_index: int, mapping: IdMapping) -> dict[int, int]:
+    """Новые ID в целевом шарде; уже назначенные при прошлом запуске берутся из CSV"""
+    new_ids = {old_id: mapping.get(old_id, user_id) for old_id in old_ids}
+    missing = [old_id for old_id, new_id in new_ids.items() if new_id is None]
+    if missing:
+        task_id_seq = target.tables["task_id_seq"]
+        with target.engine.begin() as conn:
+            for old_id in missing:
+                local_id = conn.execute(insert(task_id_seq)).inserted_primary_key[0]
+                new_ids[old_id] = make_task_id(local_id, target_index)
+        mapping.add([(old_id, new_ids[old_id], user_id) for old_id in missing])
+    return new_ids
+
+
+def move_tasks(source: Shard, target: Shard, table_name: Optional[str], rows: list[dict], new_ids: dict[int, int]):
+    """Копирует строки задач (table_name=None - только историю) и их историю в целевой шард,
+    затем удаляет из исходного"""
+    source_events, target_events = source.tables["task_events"], target.tables["task_events"]
+    old_ids = list(new_ids)
+
+    with source.engine.connect() as conn:
+        events = conn.execute(
+            select(source_events).where(source_events.c.task_id.in_(old_ids)).order_by(source_events.c.id)
+        ).mappings().all()
+
+    with target.engine.begin() as conn:
+        if table_name is not None:
+            target_table = target.tables[table_name]
+            existing = set(conn.execute(
+                select(target_table.c.id).where(target_table.c.id.in_(list(new_ids.values())))
+            ).scalars())
+            new_rows = [{**row, "id": new_ids[row["id"]]} for row in rows if new_ids[row["id"]] not in existing]
+            if new_rows:
+                conn.execute(insert(target_table), new_rows)
+        # Новые ID выданы только этому переносу: их история в целевом шарде - копия прошлого запуска
+        conn.execute(delete(target_events).where(target_events.c.task_id.in_(list(new_ids.values()))))
+        if events:
+            conn.execute(insert(target_events), [
+                {**{key: value for key, value in event.items() if key != "id"}, "task_id": new_ids[event["task_id"]]}
+                for event in events
+            ])
+
+    with source.engine.begin() as conn:
+        conn.execute(delete(source_events).where(source_events.c.task_id.in_(old_ids)))
+        if table_name is not None:
+            source_table = source.tables[table_name]
+            conn.execute(delete(source_table).where(source_table.c.id.in_(old_ids)))
+
+
+def move_user(source: Shard, target: Shard, target_index: int, user_id: int, mapping: IdMapping,
+              batch_size: int) -> int:
+    same_db = target.url == source.url
+    moved = 0
+
+    def needs_move(task_id: int) -> bool:
+        # Задача на месте, если она в нужной базе и ее ID кодирует этот шард
+        return not (same_db and shard_index_of_id(task_id) == target_index)
+
+    for table_name in TASK_TABLES:
+        table = source.tables[table_name]
+        last_id = None
+        while True:
+            query = select(table).where(table.c.user_id == user_id).order_by(table.c.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(table.c.id > last_id)
+            with source.engine.connect() as conn:
+                rows = conn.execute(query).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+
+            to_move = [dict(row) for row in rows if needs_move(row["id"])]
+            if not to_move:
+                continue
+            new_ids = assign_ids([row["id"] for row in to_move], user_id, target, target_index, mapping)
+            move_tasks(source, target, table_name, to_move, new_ids)
+            moved += len(to_move)
+
+    # История задач, уже удаленных из корзины: переносится под новыми ID того же шарда
+    events = source.tables["task_events"]
+    with source.engine.connect() as conn:
+        existing_ids = union(*(
+            select(source.tables[name].c.id).where(source.tables[name].c.user_id == user_id)
+            for name in TASK_TABLES
+        ))
+        orphan_ids = [
+            task_id for task_id in conn.execute(
+                select(events.c.task_id).distinct()
+                .where(events.c.user_id == user_id, events.c.task_id.not_in(existing_ids))
+                .order_by(events.c.task_id)
+            ).scalars()
+            if needs_move(task_id)
+        ]
+    for start in range(0, len(orphan_ids), batch_size):
+        batch = orphan_ids[start:start + batch_size]
+        move_tasks(source, target, None, [],
+                   assign_ids(batch, user_id, target, target_index, mapping))
+
+    if not same_db:
+        move_daily_stats(source, target, user_id)
+    return moved
+
+
+def move_daily_stats(source: Shard, target: Shard, user_id: int):
+    """Дневные сводки пользователя: в целевом шарде заменяются сводками исходного"""
+    source_stats, target_stats = source.tables["task_daily_stats"], target.tables["task_daily_stats"]
+    with source.engine.connect() as conn:
+        rows = conn.execute(select(source_stats).where(source_stats.c.user_id == user_id)).mappings().all()
+    if not rows:
+        return
+    with target.engine.begin() as conn:
+        conn.execute(delete(target_stats).where(target_stats.c.user_id == user_id))
+        conn.execute(insert(target_stats), [dict(row) for row in rows])
+    with source.engine.begin() as conn:
+        conn.execute(delete(source_stats).where(source_stats.c.user_id == user_id))
+
+
+def user_ids_of(shard: Shard) -> list[int]:
+    query = union(
+        *(select(shard.tables[name].c.user_id) for name in (*TASK_TABLES, "task_events", "task_daily_stats"))
+    )
+    with shard.engine.connect() as conn:
+        return sorted(user_id for user_id in conn.execute(query).scalars() if user_id is not None)
+
+
+def rebalance(source_urls: list[str], target_urls: list[str], mapping_path: str, batch_size: int):
+    targets = [connect(url) for url in target_urls]
+    mapping = IdMapping(mapping_path)
+    moved_total = 0
+
+    try:
+        for source_url in source_urls:
+            source = connect(source_url)
+            print(f"📦 Шард {source_url}")
+
+            user_ids = user_ids_of(source)
+            for user_id in user_ids:
+                target_index = shard_index_for_user(user_id, len(targets))
+                moved_total += move_user(source, targets[target_index], target_index, user_id, mapping, batch_size)
+
+            print(f"   ├─ пользователей: {len(user_ids)}, перенесено задач всего: {moved_total}")
+    finally:
+        mapping.close()
+
+    print(f"\n✅ Готово. Перенесено задач: {moved_total}, соответствие ID: {mapping_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перераспределение задач по шардам")
+    parser.add_argument("--from", dest="source_urls", nargs="+", required=True, help="Текущие базы")
+    parser.add_argument("--to", dest="target_urls", nargs="+", required=True, help="Новый список шардов")
+    parser.add_argument("--mapping", default="shard_id_mapping.csv",
+                        help="CSV: старый ID, новый ID, user_id; при перезапуске укажите тот же файл")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    rebalance(args.source_urls, args.target_urls, args.mapping, args.batch_size)
@@ -0,0 +1,239 @@
+# запуск из корня:  python tools/soak_bot.py --users 1000 --duration 3600 --database-url sqlite:///./soak.db
+#
+# Нагрузочный прогон бота против локальной замены Bot API (tools/fake_telegram.py) в одном
+# процессе. Виртуальные пользователи открывают список, добавляют задачи и нажимают кнопки под
+# сообщениями бота (выполнено, изменить, удалить, архив...), как в handlers.py. Бот работает как
+# в режиме polling: получает обновления через getUpdates.
+#
+# Каждые --report-interval секунд печатаются: обновления и вызовы Bot API в секунду, ошибки
+# Bot API, очередь и отказы бота, рост памяти процесса и MemoryStorage, время SQL-запросов и
+# ошибки блокировки БД. База задается --database-url (таблицы создаются, если их нет).
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from aiohttp import web
+from sqlalchemy import event
+
+from tools.fake_telegram import FakeTelegram
+
+SLOW_QUERY_SECONDS = 0.1
+USER_CHAT_ID_BASE = 1_000_000
+
+# Действие пользователя -> вес
+ACTIONS = {"list": 1.0, "add": 2.0, "click": 6.0, "refresh": 0.3, "trash": 0.3}
+
+
+class DbMonitor:
+    """Время SQL-запросов и ошибки блокировки SQLite"""
+
+    def __init__(self, engines):
+        self.queries = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.slow = 0
+        self.lock_errors = 0
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self._before)
+            event.listen(engine, "after_cursor_execute", self._after)
+            event.listen(engine, "handle_error", self._error)
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["soak_started"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info.pop("soak_started", time.perf_counter())
+        self.queries += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        if elapsed >= SLOW_QUERY_SECONDS:
+            self.slow += 1
+
+    def _error(self, exception_context):
+        if "locked" in str(exception_context.original_exception):
+            self.lock_errors += 1
+
+
+async def simulate_user(fake: FakeTelegram, chat_id: int, think_time: float, stop_at: float, actions: Counter):
+    rng = random.Random(chat_id)
+    names, weights = list(ACTIONS), list(ACTIONS.values())
+    await fake.user_message(chat_id, "/start")
+
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(rng.expovariate(1 / think_time))
+        action = rng.choices(names, weights)[0]
+        actions[action] += 1
+
+        if action == "list":
+            await fake.user_message(chat_id, "📋 Список задач")
+        elif action == "add":
+            await fake.user_message(chat_id, "➕ Добавить задачу")
+            await asyncio.sleep(rng.uniform(0.5, 2.0))
+            await fake.user_message(chat_id, f"Задача {rng.randint(1, 10 ** 6)}")
+        elif action == "refresh":
+            await fake.user_message(chat_id, "/refresh")
+        elif action == "trash":
+            await fake.user_message(chat_id, "🗑 Корзина")
+        else:
+            # Нажимаем случайную кнопку под случайным сообщением бота
+            messages = [m for m in fake.chats.get(chat_id, {}).values() if "reply_markup" in m]
+            if not messages:
+                continue
+            message = rng.choice(messages)
+            buttons = [button for row in message["reply_markup"]["inline_keyboard"] for button in row]
+            data = rng.choice(buttons).get("callback_data")
+            if not data:
+                continue
+            await fake.user_callback(chat_id, message["message_id"], data)
+            if data.startswith("edit_") or data == "add_task":
+                await asyncio.sleep(rng.uniform(0.5, 2.0))
+                await fake.user_message(chat_id, f"Задача {rng.randint(1, 10 ** 6)}")
+
+
+def memory_storage_size(storage) -> int:
+    from aiogram.fsm.storage.memory import MemoryStorage
+    from app.telegram_bot.tracing import TracedStorage
+
+    if isinstance(storage, TracedStorage):
+        storage = storage.storage
+    return len(storage.storage) if isinstance(storage, MemoryStorage) else -1
+
+
+def report(started: float, fake: FakeTelegram, runtime, db: DbMonitor, actions: Counter, baseline: dict,
+           previous: dict) -> dict:
+    from app.telegram_bot.task_messages import task_message_store
+
+    now = time.monotonic()
+    interval = max(now - previous["at"], 1e-9)
+    stats = fake.stats()
+    api_calls = sum(stats["calls"].values()) - stats["calls"].get("getUpdates", 0)
+    current = {
+        "at": now,
+        "updates": fake.delivered_updates,
+        "api_calls": api_calls,
+        "queries": db.queries,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "traced_mb": tracemalloc.get_traced_memory()[0] / 2 ** 20 if tracemalloc.is_tracing() else 0.0,
+    }
+    baseline.setdefault("rss_mb", current["rss_mb"])
+    baseline.setdefault("traced_mb", current["traced_mb"])
+
+    bot = runtime.stats()
+    avg_query_ms = 1000 * db.total_time / db.queries if db.queries else 0.0
+    print(
+        f"⏱  {now - started:7.0f} с | "
+        f"обновлений/с: {(current['updates'] - previous['updates']) / interval:7.1f} | "
+        f"Bot API/с: {(current['api_calls'] - previous['api_calls']) / interval:7.1f} | "
+        f"SQL/с: {(current['queries'] - previous['queries']) / interval:7.1f}"
+    )
+    print(
+        f"   ├─ очередь: {bot['queue']}, в обработке: {bot['pending']}, отказов: {bot['shed']}, "
+        f"ждут getUpdates: {stats['pending_updates']}"
+    )
+    print(f"   ├─ ошибки Bot API: {stats['errors'] or 'нет'}")
+    print(
+        f"   ├─ SQL: среднее {avg_query_ms:.2f} мс, макс {1000 * db.max_time:.0f} мс, "
+        f"медленных: {db.slow}, блокировок БД: {db.lock_errors}"
+    )
+    print(
+        f"   ├─ память: пиковый RSS {current['rss_mb']:.0f} МБ (+{current['rss_mb'] - baseline['rss_mb']:.0f}), "
+        + (f"tracemalloc {current['traced_mb']:.1f} МБ (+{current['traced_mb'] - baseline['traced_mb']:.1f}), "
+           if tracemalloc.is_tracing() else "")
+        + f"FSM-записей: {memory_storage_size(runtime.storage)}, "
+          f"чатов со списками: {len(getattr(task_message_store, '_chats', ()))}"
+    )
+    print(f"   └─ действия: {dict(actions)}")
+    return current
+
+
+async def main(args):
+    from app import models  # noqa: F401  регистрирует таблицы
+    from app.config import Base, engines
+    from app.telegram_bot import runner
+
+    for engine in engines:
+        Base.metadata.create_all(bind=engine)
+    db = DbMonitor(engines)
+
+    fake = FakeTelegram(tuple(args.latency_ms), args.rate_limit, args.not_found, args.retry_after, seed=args.seed)
+    app_runner = web.AppRunner(fake.app())
+    await app_runner.setup()
+    await web.TCPSite(app_runner, "127.0.0.1", args.port).start()
+
+    runtime = runner.BotRuntime(mode="polling", max_concurrent=args.max_concurrent)
+    runner.runtime = runtime
+    await runtime.start()
+    print(f"🚀 Пользователей: {args.users}, длительность: {args.duration:.0f} с, одновременно: {runtime.max_concurrent}")
+
+    started = time.monotonic()
+    stop_at = started + args.duration
+    actions: Counter = Counter()
+    users = []
+    for i in range(args.users):
+        users.append(asyncio.create_task(
+            simulate_user(fake, USER_CHAT_ID_BASE + i, args.think_time, stop_at, actions)
+        ))
+        # Пользователи приходят постепенно
+        if args.ramp_up:
+            await asyncio.sleep(args.ramp_up / args.users)
+
+    baseline: dict = {}
+    previous = {"at": started, "updates": 0, "api_calls": 0, "queries": 0}
+    try:
+        while time.monotonic() < stop_at:
+            await asyncio.sleep(min(args.report_interval, max(stop_at - time.monotonic(), 0.1)))
+            previous = report(started, fake, runtime, db, actions, baseline, previous)
+    finally:
+        for user in users:
+            user.cancel()
+        await asyncio.gather(*users, return_exceptions=True)
+        await runtime.stop()
+        runner.runtime = None
+        await fake.close()
+        await app_runner.cleanup()
+
+    print("\n✅ Прогон завершен")
+    report(started, fake, runtime, db, actions, baseline, previous)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота против локальной замены Bot API")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=300, help="Длительность, с")
+    parser.add_argument("--think-time", type=float, default=5.0, help="Средняя пауза между действиями пользователя, с")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="Время подключения всех пользователей, с")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Одновременно обрабатываемых обновлений (по умолчанию BOT_MAX_CONCURRENT_UPDATES)")
+    parser.add_argument("--database-url", default="sqlite:///./soak.db")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, nargs=2, default=(20, 150), metavar=("MIN", "MAX"))
+    parser.add_argument("--rate-limit", type=float, default=0.01, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--not-found", type=float, default=0.01, help="Доля сообщений, 'удаленных' пользователем")
+    parser.add_argument("--report-interval", type=float, default=30.0)
+    parser.add_argument("--tracemalloc", action="store_true", help="Точный учет памяти Python (медленнее)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    # Настройки приложения читаются при импорте app, поэтому задаются до него
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{args.port}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:soak-test")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    from app.logging_setup import setup_logging
+    setup_logging()
+    asyncio.run(main(args))
@@ -0,0 +1,36 @@
+# запуск из корня:  python tools/sync_replicas.py todolist.db replica1.db replica2.db --interval 5
+#
+# Локальная замена репликации для проверки DATABASE_REPLICA_URLS: периодически
+# копирует primary-базу SQLite в файлы реплик через online backup API.
+
+import argparse
+import sqlite3
+import time
+
+
+def sync(primary_path: str, replica_paths: list[str]):
+    source = sqlite3.connect(primary_path)
+    try:
+        for replica_path in replica_paths:
+            target = sqlite3.connect(replica_path)
+            try:
+                source.backup(target, pages=256)
+            finally:
+                target.close()
+    finally:
+        source.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Копирование SQLite-базы в локальные реплики")
+    parser.add_argument("primary")
+    parser.add_argument("replicas", nargs="+")
+    parser.add_argument("--interval", type=float, default=0, help="Период синхронизации (0 - один раз)")
+    args = parser.parse_args()
+
+    while True:
+        sync(args.primary, args.replicas)
+        print(f"🔁 Реплики обновлены: {', '.join(args.replicas)}")
+        if not args.interval:
+            break
+        time.sleep(args.interval)